@@ -8,6 +8,8 @@ from typing import List, Dict, Any, Optional
 from enum import Enum
 import json
 
+from monitoring.metrics import RULE_EVALUATION_SECONDS
+
 class AnomalySeverity(Enum):
     LOW = "low"
     MEDIUM = "medium"
@@ -21,78 +23,115 @@ class AlertType(Enum):
     PH_LEVEL = "ph_level"
     LIGHT_INTENSITY = "light_intensity"
 
+# Display names computed once instead of per message
+ALERT_TYPE_LABELS = {
+    alert_type: alert_type.value.replace('_', ' ').title() for alert_type in AlertType
+}
+
+def alert_direction(current_value: float, threshold_value: float) -> str:
+    """'low' when the value is below its threshold, 'high' otherwise"""
+    return "low" if current_value < threshold_value else "high"
+
+def render_message(alert_type: AlertType, current_value: float, threshold_value: float) -> str:
+    """Generate human-readable alert message"""
+    direction = "below" if current_value < threshold_value else "above"
+    return f"{ALERT_TYPE_LABELS[alert_type]} is {direction} optimal range: {current_value:.2f}"
+
 @dataclass
 class AnomalyAlert:
     """Represents an anomaly detected by the agent"""
     alert_type: AlertType
     severity: AnomalySeverity
-    message: str
     current_value: float
     threshold_value: float
     timestamp: str
     recommendations: List[str]
+    
+    @property
+    def direction(self) -> str:
+        return alert_direction(self.current_value, self.threshold_value)
+    
+    @property
+    def message(self) -> str:
+        """Rendered on access, alerts that are only persisted never build it"""
+        return render_message(self.alert_type, self.current_value, self.threshold_value)
+
+# Default thresholds, used when no profile matches a plot
+DEFAULT_RULES = {
+    AlertType.TEMPERATURE: {
+        "min": 15,
+        "max": 35,
+        "critical_min": 10,
+        "critical_max": 40
+    },
+    AlertType.HUMIDITY: {
+        "min": 40,
+        "max": 80,
+        "critical_min": 20,
+        "critical_max": 95
+    },
+    AlertType.SOIL_MOISTURE: {
+        "min": 30,
+        "max": 80,
+        "critical_min": 15,
+        "critical_max": 90
+    },
+    AlertType.PH_LEVEL: {
+        "min": 6.0,
+        "max": 7.5,
+        "critical_min": 5.5,
+        "critical_max": 8.0
+    },
+    AlertType.LIGHT_INTENSITY: {
+        "min": 200,
+        "max": 1000,
+        "critical_min": 100,
+        "critical_max": 1200
+    }
+}
+
+# Row order of compiled threshold tables (see api.thresholds)
+ALERT_TYPES = list(AlertType)
+ALERT_TYPE_INDEX = {alert_type: i for i, alert_type in enumerate(ALERT_TYPES)}
 
 class RuleEngine:
     """Defines rules for anomaly detection"""
     
-    def __init__(self):
-        self.rules = {
-            AlertType.TEMPERATURE: {
-                "min": 15,
-                "max": 35,
-                "critical_min": 10,
-                "critical_max": 40
-            },
-            AlertType.HUMIDITY: {
-                "min": 40,
-                "max": 80,
-                "critical_min": 20,
-                "critical_max": 95
-            },
-            AlertType.SOIL_MOISTURE: {
-                "min": 30,
-                "max": 80,
-                "critical_min": 15,
-                "critical_max": 90
-            },
-            AlertType.PH_LEVEL: {
-                "min": 6.0,
-                "max": 7.5,
-                "critical_min": 5.5,
-                "critical_max": 8.0
-            },
-            AlertType.LIGHT_INTENSITY: {
-                "min": 200,
-                "max": 1000,
-                "critical_min": 100,
-                "critical_max": 1200
-            }
-        }
+    def __init__(self, rules: Optional[Dict[AlertType, Dict[str, float]]] = None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
     
-    def evaluate_value(self, alert_type: AlertType, value: float) -> Optional[Dict[str, Any]]:
+    def evaluate_value(self, alert_type: AlertType, value: float,
+                       thresholds=None) -> Optional[Dict[str, Any]]:
         """
         Evaluate a sensor value against defined rules
         Returns severity level and threshold info if anomaly detected
+        
+        thresholds: optional compiled (min, max, critical_min, critical_max)
+        rows indexed by ALERT_TYPE_INDEX, overriding the default rules
         """
-        if alert_type not in self.rules:
+        if thresholds is not None:
+            rule_min, rule_max, critical_min, critical_max = thresholds[ALERT_TYPE_INDEX[alert_type]]
+        elif alert_type in self.rules:
+            rule = self.rules[alert_type]
+            rule_min, rule_max = rule["min"], rule["max"]
+            critical_min, critical_max = rule["critical_min"], rule["critical_max"]
+        else:
             return None
         
-        rule = self.rules[alert_type]
-        
-        if value < rule["critical_min"] or value > rule["critical_max"]:
+        if value < critical_min or value > critical_max:
             return {
                 "severity": AnomalySeverity.CRITICAL,
-                "threshold": rule["critical_min"] if value < rule["min"] else rule["critical_max"]
+                "threshold": critical_min if value < rule_min else critical_max
             }
-        elif value < rule["min"] or value > rule["max"]:
+        elif value < rule_min or value > rule_max:
             return {
                 "severity": AnomalySeverity.HIGH,
-                "threshold": rule["min"] if value < rule["min"] else rule["max"]
+                "threshold": rule_min if value < rule_min else rule_max
             }
-        elif (value < rule["min"] + 3) or (value > rule["max"] - 3):
+        elif (value < rule_min + 3) or (value > rule_max - 3):
             return {
                 "severity": AnomalySeverity.MEDIUM,
-                "threshold": rule["min"] if value < rule["min"] else rule["max"]
+                "threshold": rule_min if value < rule_min else rule_max
             }
         
         return None
@@ -176,8 +215,8 @@ class RecommendationGenerator:
     @staticmethod
     def generate_recommendations(alert_type: AlertType, current_value: float, 
                                 threshold_value: float) -> List[str]:
-        """Generate recommendations based on anomaly type and direction"""
-        direction = "low" if current_value < threshold_value else "high"
+        """Generate recommendations based on anomaly type and direction (shared lists, do not mutate)"""
+        direction = alert_direction(current_value, threshold_value)
         
         if alert_type in RecommendationGenerator.RECOMMENDATION_TEMPLATES:
             templates = RecommendationGenerator.RECOMMENDATION_TEMPLATES[alert_type]
@@ -194,7 +233,7 @@ class CropMonitoringAgent:
         self.recommendation_gen = RecommendationGenerator()
     
     def analyze_sensor_data(self, sensor_data: Dict[str, float], 
-                        plot_id: str, timestamp: str) -> List[AnomalyAlert]:
+                        plot_id: str, timestamp: str, thresholds=None) -> List[AnomalyAlert]:
         """
         Analyze sensor data and generate alerts with recommendations
         
@@ -202,10 +241,15 @@ class CropMonitoringAgent:
             sensor_data: Dict with keys like temperature, humidity, soil_moisture, ph_level, light_intensity
             plot_id: ID of the monitoring plot
             timestamp: Timestamp of the measurement
+            thresholds: Compiled thresholds for the plot (see api.thresholds), defaults otherwise
         
         Returns:
             List of AnomalyAlert objects
         """
+        with RULE_EVALUATION_SECONDS.time():
+            return self._analyze(sensor_data, timestamp, thresholds)
+    
+    def _analyze(self, sensor_data: Dict[str, float], timestamp: str, thresholds) -> List[AnomalyAlert]:
         alerts = []
         
         for sensor_type_str, value in sensor_data.items():
@@ -214,7 +258,7 @@ class CropMonitoringAgent:
             except KeyError:
                 continue
             
-            rule_result = self.rule_engine.evaluate_value(sensor_type, value)
+            rule_result = self.rule_engine.evaluate_value(sensor_type, value, thresholds)
             
             if rule_result:
                 recommendations = self.recommendation_gen.generate_recommendations(
@@ -224,7 +268,6 @@ class CropMonitoringAgent:
                 alert = AnomalyAlert(
                     alert_type=sensor_type,
                     severity=rule_result["severity"],
-                    message=self._generate_message(sensor_type, value, rule_result["threshold"]),
                     current_value=value,
                     threshold_value=rule_result["threshold"],
                     timestamp=timestamp,
@@ -238,8 +281,7 @@ class CropMonitoringAgent:
     def _generate_message(alert_type: AlertType, current_value: float, 
                          threshold_value: float) -> str:
         """Generate human-readable alert message"""
-        direction = "below" if current_value < threshold_value else "above"
-        return f"{alert_type.value.replace('_', ' ').title()} is {direction} optimal range: {current_value:.2f}"
+        return render_message(alert_type, current_value, threshold_value)
     
     def get_alerts_summary(self, alerts: List[AnomalyAlert]) -> Dict[str, Any]:
         """Get summary statistics of alerts"""
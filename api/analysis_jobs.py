@@ -0,0 +1,161 @@
+"""
+Batch analysis jobs
+Collects alerts for every plot of a user in a background thread and
+persists them in bulk, one transaction per chunk of plots
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from monitoring.metrics import DB_WRITE_SECONDS, count_alerts
+from monitoring.models import Plot, SensorReading, Alert, AnalysisJob
+from .ai_agent_engine import CropMonitoringAgent, AlertType
+from .dashboard import invalidate_dashboard
+from .recommendations import to_db_alert
+from .streams import publish_alerts
+from .thresholds import get_threshold_table, thresholds_for_plot
+
+logger = logging.getLogger(__name__)
+
+SENSOR_TYPES = [alert_type.value for alert_type in AlertType]
+
+# Number of plots fetched (and alerts written) per round trip
+CHUNK_SIZE = getattr(settings, 'BATCH_ANALYSIS_CHUNK_SIZE', 500)
+
+# Background jobs die with their worker process: not started, or without a
+# heartbeat, for this long, they are failed
+JOB_TIMEOUT = getattr(settings, 'BATCH_ANALYSIS_TIMEOUT', 1800)
+
+
+def latest_readings(plots) -> Iterable[Tuple[Plot, Dict[str, float]]]:
+    """
+    Yield (plot, sensor_data) for each plot using one query per chunk
+    instead of one query per plot and sensor type
+    """
+    annotations = {
+        f"latest_{sensor_type}": Subquery(
+            SensorReading.objects.filter(
+                plot=OuterRef('pk'),
+                sensor_type=sensor_type
+            ).order_by('-timestamp').values('value')[:1]
+        )
+        for sensor_type in SENSOR_TYPES
+    }
+
+    for plot in plots.annotate(**annotations).iterator(chunk_size=CHUNK_SIZE):
+        sensor_data = {}
+        for sensor_type in SENSOR_TYPES:
+            value = getattr(plot, f"latest_{sensor_type}")
+            if value is not None:
+                sensor_data[sensor_type] = value
+        yield plot, sensor_data
+
+
+def build_alerts(agent: CropMonitoringAgent, plot: Plot, sensor_data: Dict[str, float],
+                 timestamp: str, thresholds=None) -> List[Alert]:
+    """Run the agent on one plot and return unsaved Alert instances"""
+    alerts = agent.analyze_sensor_data(
+        sensor_data=sensor_data,
+        plot_id=str(plot.id),
+        timestamp=timestamp,
+        thresholds=thresholds
+    )
+    return [
+        to_db_alert(plot, alert, timestamp=datetime.fromisoformat(alert.timestamp))
+        for alert in alerts
+    ]
+
+
+def run_batch_analysis(job: AnalysisJob) -> AnalysisJob:
+    """
+    Analyze every plot of the job owner. Alerts are written per chunk of
+    CHUNK_SIZE plots, each chunk in its own transaction, so memory stays
+    bounded on large accounts; a failed job keeps the chunks already written.
+    """
+    job.status = 'running'
+    job.started_at = job.heartbeat_at = timezone.now()
+    job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+
+    try:
+        agent = CropMonitoringAgent()
+        table = get_threshold_table()
+        timestamp = datetime.now().isoformat()
+        pending_alerts = []
+
+        for plot, sensor_data in latest_readings(Plot.objects.filter(user_id=job.user_id).with_planting_date()):
+            job.plots_analyzed += 1
+            if sensor_data:
+                thresholds = thresholds_for_plot(plot, table)
+                pending_alerts.extend(build_alerts(agent, plot, sensor_data, timestamp, thresholds))
+            if job.plots_analyzed % CHUNK_SIZE == 0:
+                _write_chunk(job, pending_alerts)
+                pending_alerts = []
+        _write_chunk(job, pending_alerts)
+        invalidate_dashboard([job.user_id])
+
+        job.status = 'completed'
+        logger.info("batch analysis completed", extra={
+            'job_id': str(job.id), 'plots': job.plots_analyzed, 'alerts': job.alerts_created
+        })
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        logger.exception("batch analysis failed", extra={'job_id': str(job.id)})
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'plots_analyzed', 'alerts_created', 'error', 'finished_at'])
+    return job
+
+
+def _write_chunk(job: AnalysisJob, alerts: List[Alert]):
+    """Save the alerts of one chunk, then record the progress as a heartbeat"""
+    with DB_WRITE_SECONDS.labels('batch_analysis').time(), transaction.atomic():
+        Alert.objects.bulk_create(alerts, batch_size=CHUNK_SIZE)
+        transaction.on_commit(lambda: publish_alerts(job.user_id, alerts))
+    count_alerts('batch_analysis', alerts)
+    job.alerts_created += len(alerts)
+    job.heartbeat_at = timezone.now()
+    AnalysisJob.objects.filter(pk=job.pk).update(
+        plots_analyzed=job.plots_analyzed, alerts_created=job.alerts_created, heartbeat_at=job.heartbeat_at
+    )
+
+
+def fail_stale_jobs(jobs) -> int:
+    """
+    Mark jobs of the queryset pending, or running without a heartbeat, for
+    JOB_TIMEOUT seconds as failed: their thread was lost with its worker process
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=JOB_TIMEOUT)
+    # Jobs sans battement (en attente, ou antérieurs au champ) : depuis leur création
+    return jobs.filter(status__in=['pending', 'running']).alias(
+        last_seen=Coalesce('heartbeat_at', 'created_at')
+    ).filter(last_seen__lt=cutoff).update(status='failed', error='Interrupted: the worker running the job stopped', finished_at=now)
+
+
+def _run_in_background(job_id):
+    try:
+        run_batch_analysis(AnalysisJob.objects.get(id=job_id))
+    finally:
+        # Worker threads get their own connection, don't leak it
+        connection.close()
+
+
+def start_batch_analysis(user) -> AnalysisJob:
+    """Create a batch analysis job for the user and run it in a background thread"""
+    plots_total = Plot.objects.filter(user=user).count()
+    job = AnalysisJob.objects.create(user=user, plots_total=plots_total)
+
+    # Start the thread only once the job row is visible to its connection
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_background, args=(job.id,), daemon=True).start()
+    )
+    return job
@@ -0,0 +1,44 @@
+"""
+Conditional GET for polled list endpoints
+The ETag of a list comes from a version stamp, one aggregate query over
+the rows it shows (row count and latest change), so an unchanged list
+is answered 304 Not Modified without loading or serializing the rows.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+class ConditionalListMixin:
+    """
+    list() with an ETag. Abstract: every view using it must implement
+    version_stamp(), an aggregate over its rows returning a dict, which is
+    checked when the view class is defined. No Last-Modified is sent: a
+    delete lowers the row count of a stamp but not its latest date, and
+    If-Modified-Since would answer it with a stale 304.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.version_stamp is ConditionalListMixin.version_stamp:
+            raise TypeError(f'{cls.__name__} must implement version_stamp()')
+
+    def version_stamp(self) -> dict:
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        stamp = self.version_stamp()
+        # Filtres et page font partie de l'URL, donc de l'ETag
+        fingerprint = repr((request.user.pk, request.get_full_path(), sorted(stamp.items())))
+        etag = quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        # Réponses propres à chaque utilisateur, toujours revalidées
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,116 @@
+"""
+Dashboard snapshot
+Plots with their latest readings and agronomic indices, the alert
+summary and recent alerts in one response, built with a fixed number of queries and cached per user.
+Ingestion and alert writes drop the cached snapshot of the plot owners.
+Invalidation goes through the Django cache, so it reaches other worker
+processes only with a shared backend (see CACHES in settings); with the
+per-process LocMem default they serve their copy until CACHE_TIMEOUT.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from monitoring.models import Plot, SensorReading, Alert, DailyAgronomy
+from .ai_agent_engine import AlertType, AnomalySeverity
+from .serializers import AlertSerializer, PlotSerializer
+
+CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+RECENT_ALERTS = 5
+RECENT_WINDOW = timedelta(hours=24)
+
+SENSOR_TYPES = [alert_type.value for alert_type in AlertType]
+SEVERITIES = [severity.value for severity in AnomalySeverity]
+
+
+def cache_key(user_id):
+    return f'dashboard:{user_id}'
+
+
+def invalidate_dashboard(user_ids):
+    """Drop the cached snapshots of these users"""
+    keys = [cache_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def latest_readings(plots):
+    """{plot_id: {sensor_type: {value, unit, timestamp}}} with two queries"""
+    annotations = {
+        f'latest_{sensor_type}': Subquery(
+            SensorReading.objects.filter(plot=OuterRef('pk'), sensor_type=sensor_type)
+            .order_by('-timestamp').values('id')[:1]
+        )
+        for sensor_type in SENSOR_TYPES
+    }
+    reading_ids = [
+        reading_id
+        for row in plots.annotate(**annotations).values(*annotations)
+        for reading_id in row.values() if reading_id is not None
+    ]
+
+    latest = {}
+    readings = SensorReading.objects.filter(id__in=reading_ids).values_list(
+        'plot_id', 'sensor_type', 'value', 'unit', 'timestamp'
+    )
+    for plot_id, sensor_type, value, unit, timestamp in readings:
+        latest.setdefault(plot_id, {})[sensor_type] = {'value': value, 'unit': unit, 'timestamp': timestamp}
+    return latest
+
+
+def latest_agronomy(user):
+    """{plot_id: indices of the last materialized day} for plots linked to a FieldPlot, one query"""
+    last_day = DailyAgronomy.objects.filter(plot=OuterRef('plot')).order_by('-day').values('day')[:1]
+    rows = DailyAgronomy.objects.filter(plot__sensor_plot__user=user, day=Subquery(last_day)).values(
+        'plot__sensor_plot_id', 'day', 'gdd_cumulative', 'et0', 'etc', 'water_balance_cumulative'
+    )
+    return {row.pop('plot__sensor_plot_id'): row for row in rows}
+
+
+def alert_summary(alerts):
+    """Same shape as /api/alerts/summary/, with one aggregate query"""
+    counts = alerts.aggregate(
+        total_alerts=Count('id'),
+        **{severity: Count('id', filter=Q(severity=severity)) for severity in SEVERITIES},
+        **{f'type_{alert_type}': Count('id', filter=Q(alert_type=alert_type)) for alert_type in SENSOR_TYPES}
+    )
+    summary = {key: counts[key] for key in ['total_alerts', *SEVERITIES]}
+    summary['by_type'] = {alert_type: counts[f'type_{alert_type}'] for alert_type in SENSOR_TYPES}
+    return summary
+
+
+def build_snapshot(user):
+    plots = Plot.objects.filter(user=user).order_by('id')
+    alerts = Alert.objects.filter(plot__user=user)
+    latest = latest_readings(plots)
+    agronomy = latest_agronomy(user)
+
+    plot_data = PlotSerializer(plots, many=True).data
+    for plot in plot_data:
+        readings = latest.get(plot['id'], {})
+        plot['latest_readings'] = {sensor_type: readings.get(sensor_type) for sensor_type in SENSOR_TYPES}
+        plot['agronomy'] = agronomy.get(plot['id'])
+
+    recent = alerts.filter(timestamp__gte=timezone.now() - RECENT_WINDOW) \
+        .select_related('plot').order_by('-timestamp')[:RECENT_ALERTS]
+
+    return {
+        'plots': plot_data,
+        'alert_summary': alert_summary(alerts),
+        'recent_alerts': AlertSerializer(recent, many=True).data,
+        'generated_at': timezone.now(),
+    }
+
+
+def get_snapshot(user):
+    """Cached snapshot, rebuilt after an invalidation or DASHBOARD_CACHE_TIMEOUT"""
+    key = cache_key(user.id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(user)
+        cache.set(key, snapshot, CACHE_TIMEOUT)
+    return snapshot
@@ -0,0 +1,133 @@
+"""
+Predictive soil moisture alerts
+Plots whose moisture is still in range but whose forecast
+(monitoring.forecasting) leaves it within the horizon get an alert
+before the readings themselves cross the threshold
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from monitoring.forecasting import STEP, forecast_moisture
+from monitoring.metrics import DB_WRITE_SECONDS, count_alerts
+from monitoring.models import Alert, Plot
+from .ai_agent_engine import ALERT_TYPE_INDEX, ALERT_TYPE_LABELS, AlertType, AnomalyAlert, AnomalySeverity
+from .dashboard import invalidate_dashboard
+from .recommendations import to_db_alert
+from .streams import publish_alerts
+from .thresholds import get_threshold_table, thresholds_for_plot
+
+logger = logging.getLogger(__name__)
+
+HORIZON_HOURS = getattr(settings, 'FORECAST_HORIZON_HOURS', 12)
+
+# Number of plots forecast (and alerts written) per round trip
+CHUNK_SIZE = getattr(settings, 'FORECAST_CHUNK_SIZE', 2000)
+
+SOIL_MOISTURE = ALERT_TYPE_INDEX[AlertType.SOIL_MOISTURE]
+
+
+def predicted_breaches(plots: List[Plot], hours: float = HORIZON_HOURS, now=None, table=None):
+    """
+    Unsaved Alert rows for plots whose forecast leaves the soil moisture
+    range within hours. A forecast crossing a critical threshold is a
+    HIGH alert, crossing min / max a MEDIUM one; plots already out of
+    range are left to the RuleEngine.
+    """
+    if not plots:
+        return []
+    table = table or get_threshold_table()
+    now = now or timezone.now()
+    today = now.date()
+    forecast = forecast_moisture([plot.id for plot in plots], now)
+    by_id = {plot.id: plot for plot in plots}
+    # min, max, critical_min, critical_max de chaque parcelle, dans l'ordre du forecast
+    limits = np.array([
+        thresholds_for_plot(by_id[int(plot_id)], table, today)[SOIL_MOISTURE] for plot_id in forecast.plot_ids
+    ]).reshape(-1, 4)
+    rule_min, rule_max, critical_min, critical_max = limits.T
+
+    path = forecast.path(hours)
+    if not path.shape[1]:
+        return []
+    in_range = (forecast.last >= rule_min) & (forecast.last <= rule_max) & ~np.isnan(path[:, -1])
+    low, high = path.min(axis=1), path.max(axis=1)
+    below = in_range & (low < rule_min)
+    above = in_range & ~below & (high > rule_max)
+
+    alerts = []
+    for index in np.flatnonzero(below | above):
+        if below[index]:
+            critical = low[index] < critical_min[index]
+            value = low[index]
+            threshold = critical_min[index] if critical else rule_min[index]
+            crossed = path[index] < threshold
+            verb = 'fall below'
+        else:
+            critical = high[index] > critical_max[index]
+            value = high[index]
+            threshold = critical_max[index] if critical else rule_max[index]
+            crossed = path[index] > threshold
+            verb = 'rise above'
+        eta = (np.argmax(crossed) + 1) * STEP / 3600
+        alert = AnomalyAlert(
+            alert_type=AlertType.SOIL_MOISTURE,
+            severity=AnomalySeverity.HIGH if critical else AnomalySeverity.MEDIUM,
+            current_value=float(value),
+            threshold_value=float(threshold),
+            timestamp=now.isoformat(),
+            recommendations=[],
+        )
+        message = (
+            f"{ALERT_TYPE_LABELS[AlertType.SOIL_MOISTURE]} forecast to {verb} {threshold:.2f} "
+            f"within {eta:.0f}h: {value:.2f} expected (now {forecast.last[index]:.2f})"
+        )
+        alerts.append(to_db_alert(by_id[int(forecast.plot_ids[index])], alert, message=message))
+    return alerts
+
+
+def raise_predictive_alerts(plots, hours: float = HORIZON_HOURS, now: Optional[datetime] = None,
+                            dry_run: bool = False) -> List[Alert]:
+    """
+    Forecast every plot of the queryset and save the predictive alerts,
+    skipping plots with an unresolved soil moisture alert from the last
+    hours so that a running forecast does not alert every pass
+    """
+    now = now or timezone.now()
+    table = get_threshold_table()
+    recent = set(Alert.objects.filter(
+        plot__in=plots, alert_type=AlertType.SOIL_MOISTURE.value, is_resolved=False,
+        timestamp__gte=now - timedelta(hours=hours)
+    ).values_list('plot_id', flat=True))
+
+    pending = []
+    chunk = []
+    for plot in plots.with_planting_date().order_by('pk').iterator(chunk_size=CHUNK_SIZE):
+        if plot.pk in recent:
+            continue
+        chunk.append(plot)
+        if len(chunk) == CHUNK_SIZE:
+            pending.extend(predicted_breaches(chunk, hours, now, table))
+            chunk = []
+    pending.extend(predicted_breaches(chunk, hours, now, table))
+    if dry_run or not pending:
+        return pending
+
+    by_user = defaultdict(list)
+    for alert in pending:
+        by_user[alert.plot.user_id].append(alert)
+    with DB_WRITE_SECONDS.labels('forecast').time(), transaction.atomic():
+        Alert.objects.bulk_create(pending, batch_size=CHUNK_SIZE)
+        for user_id, alerts in by_user.items():
+            transaction.on_commit(lambda user_id=user_id, alerts=alerts: publish_alerts(user_id, alerts))
+        transaction.on_commit(lambda: invalidate_dashboard(by_user))
+    count_alerts('forecast', pending)
+    logger.info("predictive alerts raised", extra={'alerts': len(pending), 'users': len(by_user)})
+    return pending
@@ -0,0 +1,173 @@
+"""
+Sensor gateway credentials
+Gateways send an API key "gw_<prefix>.<secret>" in the X-Gateway-Key
+header. Only an HMAC of the secret is stored. Active gateways and their
+plots are loaded into an in-process table keyed by prefix, so checking a
+key and the plots of a whole batch needs no query. The table is dropped
+when a gateway changes here, and reloaded every GATEWAY_CREDENTIALS_TTL
+seconds so revocations made by other processes are seen too.
+"""
+
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from monitoring.models import SensorGateway
+from .ingestion import IngestionError, PlotInfo, aget_plot_info, get_plot_info
+
+KEY_PREFIX = 'gw_'
+CREDENTIALS_TTL = getattr(settings, 'GATEWAY_CREDENTIALS_TTL', 60)
+ALLOW_ANONYMOUS = getattr(settings, 'INGESTION_ALLOW_ANONYMOUS', False)
+
+GatewayCredential = namedtuple('GatewayCredential', ['id', 'owner_id', 'name', 'key_hash', 'plot_ids'])
+
+
+def hash_secret(secret: str) -> str:
+    return hmac.new(settings.SECRET_KEY.encode(), secret.encode(), hashlib.sha256).hexdigest()
+
+
+def issue_key(gateway: SensorGateway) -> str:
+    """Give the gateway a new key, save it and return the key (shown only once)"""
+    gateway.key_prefix = secrets.token_hex(6)
+    secret = secrets.token_urlsafe(32)
+    gateway.key_hash = hash_secret(secret)
+    gateway.save()
+    return f'{KEY_PREFIX}{gateway.key_prefix}.{secret}'
+
+
+def load_credentials() -> Dict[str, GatewayCredential]:
+    """Active gateways by key prefix, with two queries"""
+    plot_ids = {}
+    links = SensorGateway.plots.through.objects.filter(sensorgateway__is_active=True)
+    for gateway_id, plot_id in links.values_list('sensorgateway_id', 'plot_id'):
+        plot_ids.setdefault(gateway_id, set()).add(plot_id)
+    gateways = SensorGateway.objects.filter(is_active=True).values_list(
+        'id', 'owner_id', 'name', 'key_prefix', 'key_hash'
+    )
+    return {
+        prefix: GatewayCredential(gateway_id, owner_id, name, key_hash, frozenset(plot_ids.get(gateway_id, ())))
+        for gateway_id, owner_id, name, prefix, key_hash in gateways
+    }
+
+
+_credentials = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def _stale():
+    return _credentials is None or time.monotonic() - _loaded_at > CREDENTIALS_TTL
+
+
+def get_credentials() -> Dict[str, GatewayCredential]:
+    global _credentials, _loaded_at
+    credentials = _credentials
+    if _stale():
+        with _lock:
+            if _stale():
+                _credentials = load_credentials()
+                _loaded_at = time.monotonic()
+            credentials = _credentials
+    return credentials
+
+
+async def aget_credentials() -> Dict[str, GatewayCredential]:
+    if _stale():
+        return await sync_to_async(get_credentials)()
+    return _credentials
+
+
+def invalidate_credentials(**kwargs):
+    global _credentials
+    _credentials = None
+
+
+def authenticate_key(key: str, credentials=None) -> Optional[GatewayCredential]:
+    """Credential of an API key, None for unknown, revoked or wrong keys"""
+    if not key.startswith(KEY_PREFIX) or '.' not in key:
+        return None
+    prefix, secret = key[len(KEY_PREFIX):].split('.', 1)
+    credential = (credentials if credentials is not None else get_credentials()).get(prefix)
+    if credential is None or not hmac.compare_digest(hash_secret(secret), credential.key_hash):
+        return None
+    return credential
+
+
+def gateway_key(request) -> Optional[str]:
+    """Key from X-Gateway-Key or "Authorization: Gateway <key>", for DRF and plain requests"""
+    key = request.headers.get('X-Gateway-Key')
+    if key is None:
+        scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+        if scheme == 'Gateway':
+            key = value
+    return key.strip() if key else None
+
+
+def authenticate_caller(key: Optional[str], user=None, credentials=None):
+    """
+    Who is writing: a GatewayCredential, an authenticated user, or None
+    for anonymous callers when INGESTION_ALLOW_ANONYMOUS is set.
+    Async callers pass the table from aget_credentials().
+    """
+    if key is not None:
+        credential = authenticate_key(key, credentials)
+        if credential is None:
+            raise IngestionError('Invalid gateway key', status=401)
+        return credential
+    if user is not None and user.is_authenticated:
+        return user
+    if ALLOW_ANONYMOUS:
+        return None
+    raise IngestionError('Gateway key or access token required', status=401)
+
+
+def authorize_plots(caller, plots: Iterable[PlotInfo], unknown: Iterable[int] = ()):
+    """
+    Check every plot of a batch at once, from the cached plot owners and
+    gateway bindings. Gateways may write to the plots bound to them that
+    their owner still owns, users to their own plots, admins to any plot.
+    Unknown plot ids are refused like foreign ones, so that callers cannot
+    tell which ids exist; only callers allowed everywhere get a 404.
+    """
+    unknown = set(unknown)
+    if caller is None or getattr(caller, 'role', None) == 'admin':
+        if unknown:
+            raise IngestionError(f'Plot(s) {sorted(unknown)} not found', status=404)
+        return
+    if isinstance(caller, GatewayCredential):
+        denied = {plot.id for plot in plots if plot.id not in caller.plot_ids or plot.user_id != caller.owner_id}
+    else:
+        denied = {plot.id for plot in plots if plot.user_id != caller.pk}
+    denied |= unknown
+    if denied:
+        raise IngestionError(f'Not allowed to write to plot(s) {sorted(denied)}', status=403)
+
+
+def authorized_plots(caller, plot_ids: Iterable[int]) -> List[PlotInfo]:
+    """Plots of a batch, once the caller is allowed to write to all of them"""
+    plots, unknown = [], []
+    for plot_id in plot_ids:
+        try:
+            plots.append(get_plot_info(plot_id))
+        except IngestionError:
+            unknown.append(plot_id)
+    authorize_plots(caller, plots, unknown)
+    return plots
+
+
+async def aauthorized_plots(caller, plot_ids: Iterable[int]) -> List[PlotInfo]:
+    plots, unknown = [], []
+    for plot_id in plot_ids:
+        try:
+            plots.append(await aget_plot_info(plot_id))
+        except IngestionError:
+            unknown.append(plot_id)
+    authorize_plots(caller, plots, unknown)
+    return plots
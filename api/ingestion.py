@@ -0,0 +1,322 @@
+"""
+Sensor reading ingestion
+Validation shared by the sync and async endpoints, and a batched writer
+that turns many small requests into few bulk inserts
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from monitoring.drift import record_histograms
+from monitoring.feature_store import record_readings
+from monitoring.metrics import DB_WRITE_SECONDS, INGEST_READINGS, INGEST_REJECTED, count_alerts
+from monitoring.models import Plot, SensorReading, Alert
+from monitoring.realtime import broker, publish
+from monitoring.signals import reading_event
+from .ai_agent_engine import CropMonitoringAgent, AnomalySeverity
+from .dashboard import invalidate_dashboard
+from .recommendations import to_db_alert
+from .streams import publish_alerts
+from .thresholds import get_threshold_table, thresholds_for_plot
+
+# Mappage des capteurs - correspond aux SENSOR_TYPES de SensorReading
+SENSOR_MAP = {
+    'moisture': ('soil_moisture', 'percentage'),
+    'soil_moisture': ('soil_moisture', 'percentage'),
+    'temperature': ('temperature', 'celsius'),
+    'air_temperature': ('temperature', 'celsius'),
+    'temp': ('temperature', 'celsius'),
+    'humidity': ('humidity', 'percentage'),
+    'hum': ('humidity', 'percentage'),
+    'ph': ('ph_level', 'ph'),
+    'ph_level': ('ph_level', 'ph'),
+    'light': ('light_intensity', 'lux'),
+    'light_intensity': ('light_intensity', 'lux'),
+}
+
+# Readings at these severities are reported back as anomalies and saved as alerts
+ANOMALY_SEVERITIES = {AnomalySeverity.HIGH, AnomalySeverity.CRITICAL}
+
+BATCH_SIZE = getattr(settings, 'INGESTION_BATCH_SIZE', 500)
+# Propriétaires de parcelles relus au plus tard après ce délai (réaffectations faites ailleurs)
+PLOT_CACHE_TTL = getattr(settings, 'INGESTION_PLOT_CACHE_TTL', 60)
+# Nombre de parcelles gardées, les plus anciennement chargées sortent en premier
+PLOT_CACHE_SIZE = getattr(settings, 'INGESTION_PLOT_CACHE_SIZE', 10000)
+FLUSH_INTERVAL = getattr(settings, 'INGESTION_FLUSH_INTERVAL', 0.05)
+
+logger = logging.getLogger(__name__)
+
+PlotInfo = namedtuple('PlotInfo', ['id', 'user_id', 'name', 'crop_type', 'planting_date'])
+# planting_date vient de la FieldPlot liée (stade de croissance des seuils)
+PLOT_INFO_FIELDS = ['id', 'user_id', 'name', 'crop_type', 'field_plot__planting_date']
+
+# (sensor_type, value, unit)
+ParsedReading = Tuple[str, float, str]
+
+
+class IngestionError(Exception):
+    """Invalid ingestion request, carries the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_payload(data) -> Tuple[int, List[ParsedReading], List[dict]]:
+    """
+    Validate {"plot_id": 1, "readings": [{"sensor": "moisture", "value": 42}]}
+    Returns the plot id, the valid readings and the rejected ones
+    """
+    if not isinstance(data, dict):
+        raise IngestionError('JSON object expected')
+
+    plot_id = data.get('plot_id')
+    readings = data.get('readings', [])
+    if not plot_id or not readings:
+        raise IngestionError('plot_id and readings are required')
+    if not isinstance(readings, list):
+        raise IngestionError('readings must be a list')
+
+    try:
+        plot_id = int(plot_id)
+    except (TypeError, ValueError):
+        raise IngestionError('plot_id must be a number')
+
+    parsed, rejected = [], []
+    for reading in readings:
+        sensor = reading.get('sensor') if isinstance(reading, dict) else None
+        value = reading.get('value') if isinstance(reading, dict) else None
+        mapped = SENSOR_MAP.get(str(sensor).lower().strip()) if sensor else None
+        if mapped is None or value is None:
+            rejected.append({'reading': reading, 'reason': 'unknown sensor or missing value'})
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            rejected.append({'reading': reading, 'reason': 'value is not a number'})
+            continue
+        sensor_type, unit = mapped
+        parsed.append((sensor_type, value, unit))
+
+    if rejected:
+        INGEST_REJECTED.inc(len(rejected))
+    return plot_id, parsed, rejected
+
+
+def parse_batch_payload(data) -> List[Tuple[int, List[ParsedReading], List[dict]]]:
+    """
+    The single plot payload, or {"plots": [{"plot_id": 1, "readings": [...]}, ...]}
+    for gateways serving several plots. One parse_payload result per plot.
+    """
+    if isinstance(data, dict) and 'plots' in data:
+        entries = data['plots']
+        if not isinstance(entries, list) or not entries:
+            raise IngestionError('plots must be a non-empty list')
+        return [parse_payload(entry) for entry in entries]
+    return [parse_payload(data)]
+
+
+# plot_id -> (PlotInfo, chargé à), les entrées expirent après PLOT_CACHE_TTL
+_plot_cache: Dict[int, Tuple[PlotInfo, float]] = OrderedDict()
+_plot_lock = threading.Lock()
+
+
+def _cached_plot(plot_id: int):
+    entry = _plot_cache.get(plot_id)
+    if entry is None or time.monotonic() - entry[1] > PLOT_CACHE_TTL:
+        return None
+    return entry[0]
+
+
+def _cache_plot(plot_id: int, row) -> PlotInfo:
+    if row is None:
+        forget_plot(plot_id)
+        raise IngestionError(f'Plot {plot_id} not found', status=404)
+    info = PlotInfo(*row)
+    with _plot_lock:
+        _plot_cache.pop(plot_id, None)
+        _plot_cache[plot_id] = (info, time.monotonic())
+        while len(_plot_cache) > PLOT_CACHE_SIZE:
+            _plot_cache.popitem(last=False)
+    return info
+
+
+def get_plot_info(plot_id: int) -> PlotInfo:
+    """
+    Owner, crop and planting date of a plot, cached since they rarely change. Entries
+    are dropped by this process's signals and reloaded after
+    PLOT_CACHE_TTL seconds, so changes made by other workers are seen too.
+    At most PLOT_CACHE_SIZE plots are kept.
+    """
+    info = _cached_plot(plot_id)
+    if info is None:
+        info = _cache_plot(plot_id, Plot.objects.filter(id=plot_id).values_list(*PLOT_INFO_FIELDS).first())
+    return info
+
+
+async def aget_plot_info(plot_id: int) -> PlotInfo:
+    info = _cached_plot(plot_id)
+    if info is None:
+        info = _cache_plot(
+            plot_id, await Plot.objects.filter(id=plot_id).values_list(*PLOT_INFO_FIELDS).afirst()
+        )
+    return info
+
+
+def forget_plot(plot_id):
+    with _plot_lock:
+        _plot_cache.pop(plot_id, None)
+
+
+def detect_alerts(plot: PlotInfo, readings: List[ParsedReading], timestamp: datetime,
+                  agent=None, table=None) -> List[Alert]:
+    """Unsaved alerts for the latest value of each sensor that is out of range"""
+    agent = agent or CropMonitoringAgent()
+    table = table or get_threshold_table()
+    latest = {sensor_type: value for sensor_type, value, _ in readings}
+    alerts = agent.analyze_sensor_data(
+        sensor_data=latest,
+        plot_id=str(plot.id),
+        timestamp=timestamp.isoformat(),
+        thresholds=thresholds_for_plot(plot, table, timestamp.date())
+    )
+    return [
+        to_db_alert(Plot(id=plot.id, user_id=plot.user_id, name=plot.name), alert)
+        for alert in alerts if alert.severity in ANOMALY_SEVERITIES
+    ]
+
+
+def store_readings(batch: List[Tuple[PlotInfo, List[ParsedReading]]]) -> Tuple[int, List[Alert]]:
+    """
+    Insert the readings of one or more requests with a single bulk insert,
+    save the alerts they raise and push both to live streams
+    """
+    now = timezone.now()
+    agent = CropMonitoringAgent()
+    table = get_threshold_table()
+
+    rows, alerts = [], []
+    for plot, readings in batch:
+        rows.extend(
+            SensorReading(plot_id=plot.id, sensor_type=sensor_type, value=value, unit=unit, timestamp=now)
+            for sensor_type, value, unit in readings
+        )
+        alerts.extend(detect_alerts(plot, readings, now, agent, table))
+
+    with DB_WRITE_SECONDS.labels('ingestion').time(), transaction.atomic():
+        SensorReading.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        Alert.objects.bulk_create(alerts, batch_size=BATCH_SIZE)
+        record_readings(rows)
+        record_histograms(rows)
+    INGEST_READINGS.inc(len(rows))
+    count_alerts('ingestion', alerts)
+    invalidate_dashboard(plot.user_id for plot, _ in batch)
+
+    if broker.subscriber_count():
+        plot_owner = {plot.id: plot.user_id for plot, _ in batch}
+        readings_by_user = defaultdict(list)
+        for row in rows:
+            readings_by_user[plot_owner[row.plot_id]].append(reading_event(row))
+        for user_id, events in readings_by_user.items():
+            publish(user_id, 'readings', events)
+        alerts_by_user = defaultdict(list)
+        for alert in alerts:
+            alerts_by_user[plot_owner[alert.plot_id]].append(alert)
+        for user_id, user_alerts in alerts_by_user.items():
+            publish_alerts(user_id, user_alerts)
+
+    return len(rows), alerts
+
+
+class BatchedWriter:
+    """
+    Background thread that drains submitted readings and writes them with
+    store_readings, at most BATCH_SIZE readings or FLUSH_INTERVAL seconds
+    per transaction
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.written = 0
+        self.failed = 0
+        self.last_error = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, plot: PlotInfo, readings: List[ParsedReading]):
+        """Queue readings for writing, never blocks on the database"""
+        if self._thread is None:
+            self._start()
+        self.queue.put((plot, readings))
+
+    def flush(self):
+        """Block until everything submitted so far is written"""
+        self.queue.join()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ingestion-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        count = len(batch[0][1])
+        while count < self.batch_size:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item[1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                close_old_connections()
+                self._write(batch)
+            except Exception as e:
+                self.failed += sum(len(readings) for _, readings in batch)
+                self.last_error = str(e)
+                logger.exception("ingestion batch failed", extra={'requests': len(batch)})
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        try:
+            written, _ = store_readings(batch)
+            self.written += written
+            logger.debug("ingestion batch written", extra={'requests': len(batch), 'readings': written})
+        except IntegrityError:
+            # A plot was deleted since it was cached, retry without it
+            existing = set(Plot.objects.filter(id__in=[plot.id for plot, _ in batch]).values_list('id', flat=True))
+            for plot, _ in batch:
+                if plot.id not in existing:
+                    forget_plot(plot.id)
+            kept = [(plot, readings) for plot, readings in batch if plot.id in existing]
+            dropped = sum(len(readings) for plot, readings in batch if plot.id not in existing)
+            self.failed += dropped
+            logger.warning("ingestion dropped readings of deleted plots", extra={'dropped': dropped})
+            if kept:
+                written, _ = store_readings(kept)
+                self.written += written
+
+
+writer = BatchedWriter()
@@ -0,0 +1,97 @@
+"""
+Recommendation catalogue
+Alerts reference a RecommendationSet by id instead of storing the
+recommendation strings, and messages are rendered when alerts are read.
+The catalogue is cached in-process and reloaded after edits, at once in
+the editing process and within CACHE_STAMP_INTERVAL seconds in the others
+"""
+
+import threading
+from typing import Dict, List, Tuple
+
+from monitoring.models import Alert, RecommendationSet
+from .ai_agent_engine import AnomalyAlert, AlertType, RecommendationGenerator, render_message
+from .stamps import TableStamp
+
+_ids: Dict[Tuple[str, str], int] = {}
+_recommendations: Dict[int, List[str]] = {}
+_lock = threading.RLock()
+_stamp = TableStamp(RecommendationSet)
+
+
+def _check_stamp():
+    """Forget the cached catalogue when another process edited it"""
+    if _stamp.changed():
+        invalidate_catalogue()
+
+
+def _load_catalogue():
+    for rec_set in RecommendationSet.objects.all():
+        _ids[(rec_set.alert_type, rec_set.direction)] = rec_set.id
+        _recommendations[rec_set.id] = rec_set.recommendations
+
+
+def recommendation_set_id(alert_type: AlertType, direction: str) -> int:
+    """Catalogue id for an alert type and direction, created from the templates if missing"""
+    _check_stamp()
+    key = (alert_type.value, direction)
+    set_id = _ids.get(key)
+    if set_id is None:
+        with _lock:
+            _load_catalogue()
+            if key not in _ids:
+                templates = RecommendationGenerator.RECOMMENDATION_TEMPLATES.get(alert_type, {})
+                rec_set, _ = RecommendationSet.objects.get_or_create(
+                    alert_type=alert_type.value,
+                    direction=direction,
+                    defaults={'recommendations': templates.get(direction, [])}
+                )
+                _ids[key] = rec_set.id
+                _recommendations[rec_set.id] = rec_set.recommendations
+            set_id = _ids[key]
+    return set_id
+
+
+def recommendations_for(set_id: int) -> List[str]:
+    """Recommendation strings of a catalogue entry"""
+    _check_stamp()
+    recommendations = _recommendations.get(set_id)
+    if recommendations is None:
+        with _lock:
+            _load_catalogue()
+        recommendations = _recommendations.get(set_id, [])
+    return recommendations
+
+
+def invalidate_catalogue(**kwargs):
+    """Forget cached catalogue entries, they are reloaded on next access"""
+    with _lock:
+        _ids.clear()
+        _recommendations.clear()
+
+
+def to_db_alert(plot, alert: AnomalyAlert, **fields) -> Alert:
+    """Unsaved Alert referencing the catalogue, without a stored message"""
+    return Alert(
+        plot=plot,
+        alert_type=alert.alert_type.value,
+        severity=alert.severity.value,
+        current_value=alert.current_value,
+        threshold_value=alert.threshold_value,
+        recommendation_set_id=recommendation_set_id(alert.alert_type, alert.direction),
+        **fields
+    )
+
+
+def alert_message(alert: Alert) -> str:
+    """Stored message for legacy rows, rendered from the values otherwise"""
+    if alert.message:
+        return alert.message
+    return render_message(AlertType(alert.alert_type), alert.current_value, alert.threshold_value)
+
+
+def alert_recommendations(alert: Alert) -> List[str]:
+    """Catalogue recommendations, or the inline list stored on legacy rows"""
+    if alert.recommendation_set_id:
+        return recommendations_for(alert.recommendation_set_id)
+    return alert.recommendations
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from monitoring.models import FarmProfile, FieldPlot, SensorReading, AnomalyEvent, AgentRecommendation, WeatherData, IrrigationLog, HarvestRecord
+from monitoring.models import FarmProfile, FieldPlot, SensorReading, AnomalyEvent, AgentRecommendation, WeatherData, IrrigationLog, HarvestRecord, DailyAgronomy
 
 class FarmProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,6 +31,11 @@ class WeatherDataSerializer(serializers.ModelSerializer):
         model = WeatherData
         fields = '__all__'
 
+class DailyAgronomySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyAgronomy
+        exclude = ['id', 'updated_at']
+
 class IrrigationLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = IrrigationLog
@@ -41,7 +46,8 @@ class HarvestRecordSerializer(serializers.ModelSerializer):
         model = HarvestRecord
         fields = '__all__'
 from rest_framework import serializers
-from monitoring.models import Plot, SensorReading, Alert, AlertHistory
+from monitoring.models import Plot, SensorReading, Alert, AlertHistory, AnalysisJob
+from .recommendations import alert_message, alert_recommendations
 
 
 class PlotSerializer(serializers.ModelSerializer):
@@ -69,6 +75,8 @@ class AlertHistorySerializer(serializers.ModelSerializer):
 
 class AlertDetailSerializer(serializers.ModelSerializer):
     plot_name = serializers.CharField(source='plot.name', read_only=True)
+    message = serializers.SerializerMethodField()
+    recommendations = serializers.SerializerMethodField()
     history = AlertHistorySerializer(many=True, read_only=True)
     
     class Meta:
@@ -79,10 +87,18 @@ class AlertDetailSerializer(serializers.ModelSerializer):
             'is_resolved', 'resolved_at', 'timestamp', 'history'
         ]
         read_only_fields = ['timestamp', 'resolved_at']
+    
+    def get_message(self, obj):
+        return alert_message(obj)
+    
+    def get_recommendations(self, obj):
+        return alert_recommendations(obj)
 
 
 class AlertSerializer(serializers.ModelSerializer):
     plot_name = serializers.CharField(source='plot.name', read_only=True)
+    message = serializers.SerializerMethodField()
+    recommendations = serializers.SerializerMethodField()
     
     class Meta:
         model = Alert
@@ -91,4 +107,22 @@ class AlertSerializer(serializers.ModelSerializer):
             'current_value', 'threshold_value', 'recommendations',
             'is_resolved', 'timestamp'
         ]
-        read_only_fields = ['timestamp']
\ No newline at end of file
+        read_only_fields = ['timestamp']
+    
+    def get_message(self, obj):
+        return alert_message(obj)
+    
+    def get_recommendations(self, obj):
+        return alert_recommendations(obj)
+
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+    
+    class Meta:
+        model = AnalysisJob
+        fields = [
+            'job_id', 'status', 'plots_total', 'plots_analyzed', 'alerts_created',
+            'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
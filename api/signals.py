@@ -0,0 +1,62 @@
+# api/signals.py
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from monitoring.drift import record_histograms
+from monitoring.feature_store import record_readings
+from monitoring.models import FieldPlot, Plot, SensorReading, Alert, ThresholdProfile, RecommendationSet, SensorGateway
+from .dashboard import invalidate_dashboard
+from .gateways import invalidate_credentials
+from .ingestion import IngestionError, forget_plot, get_plot_info
+from .recommendations import invalidate_catalogue
+from .thresholds import invalidate_threshold_table
+
+@receiver(post_save, sender=ThresholdProfile)
+@receiver(post_delete, sender=ThresholdProfile)
+def threshold_profile_changed(sender, instance, **kwargs):
+    """Recompile the threshold lookup table after any profile edit"""
+    invalidate_threshold_table()
+
+@receiver(post_save, sender=RecommendationSet)
+@receiver(post_delete, sender=RecommendationSet)
+def recommendation_set_changed(sender, instance, **kwargs):
+    """Reload the recommendation catalogue after any edit"""
+    invalidate_catalogue()
+
+@receiver(post_save, sender=Plot)
+@receiver(post_delete, sender=Plot)
+def plot_changed(sender, instance, **kwargs):
+    """Owner or crop may have changed, drop the ingestion cache entry"""
+    forget_plot(instance.id)
+    invalidate_dashboard([instance.user_id])
+
+@receiver(post_save, sender=FieldPlot)
+@receiver(post_delete, sender=FieldPlot)
+def field_plot_changed(sender, instance, **kwargs):
+    """Planting date of the sensor plot may have changed, drop its cache entry"""
+    if instance.sensor_plot_id is not None:
+        forget_plot(instance.sensor_plot_id)
+
+@receiver(post_save, sender=SensorReading)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def plot_data_changed(sender, instance, **kwargs):
+    """Single reading or alert writes, bulk writes invalidate explicitly"""
+    try:
+        invalidate_dashboard([get_plot_info(instance.plot_id).user_id])
+    except IngestionError:
+        # Plot deleted with its alerts, plot_changed handles it
+        pass
+
+@receiver(post_save, sender=SensorReading)
+def reading_saved(sender, instance, created, **kwargs):
+    """Single reading writes, store_readings folds its bulk inserts itself"""
+    if created:
+        record_readings([instance])
+        record_histograms([instance])
+
+@receiver(post_save, sender=SensorGateway)
+@receiver(post_delete, sender=SensorGateway)
+@receiver(m2m_changed, sender=SensorGateway.plots.through)
+def gateway_changed(sender, instance, **kwargs):
+    """Key, active flag or plots changed, reload the credential table"""
+    invalidate_credentials()
@@ -0,0 +1,43 @@
+"""
+Version stamps of in-process caches
+Caches compiled from a table are dropped by signals in the process that
+edits it; other workers compare a cheap stamp of the table (row count
+and latest updated_at) at most every CACHE_STAMP_INTERVAL seconds and
+reload when it changed.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+STAMP_INTERVAL = getattr(settings, 'CACHE_STAMP_INTERVAL', 5)
+
+
+class TableStamp:
+    """Count and latest updated_at of a model, compared to the last value seen"""
+
+    def __init__(self, model, interval=STAMP_INTERVAL):
+        self.model = model
+        self.interval = interval
+        self._seen = None
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def read(self):
+        stamp = self.model.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+        return stamp['count'], stamp['updated']
+
+    def changed(self) -> bool:
+        """True once when the table changed since the previous check, queries at most every interval"""
+        if time.monotonic() - self._checked_at < self.interval:
+            return False
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.interval:
+                return False
+            stamp = self.read()
+            self._checked_at = time.monotonic()
+            changed = self._seen is not None and stamp != self._seen
+            self._seen = stamp
+            return changed
@@ -0,0 +1,72 @@
+"""
+Live updates over Server-Sent Events
+Served as an async view under ASGI, one long-lived response per client
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from monitoring.realtime import broker, publish
+from .serializers import AlertSerializer
+
+KEEPALIVE_SECONDS = getattr(settings, 'REALTIME_KEEPALIVE_SECONDS', 15)
+
+
+def publish_alerts(user_id, alerts):
+    """Push newly saved alerts to the user's live streams"""
+    if alerts and broker.subscriber_count(user_id):
+        publish(user_id, 'alerts', AlertSerializer(alerts, many=True).data)
+
+
+def stream_user_id(request):
+    """
+    User id from the access token, in the Authorization header or the
+    ?token= query parameter (EventSource cannot send headers)
+    """
+    token = request.GET.get('token')
+    header = request.headers.get('Authorization', '')
+    if not token and ' ' in header:
+        token = header.split(' ', 1)[1]
+    if not token:
+        return None
+    try:
+        user_id = AccessToken(token)[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+    # The claim is serialized as a string, publishers use the pk value
+    return get_user_model()._meta.pk.to_python(user_id)
+
+
+async def stream_frames(user_id, keepalive=KEEPALIVE_SECONDS):
+    """SSE frames for a user, with comment lines to keep proxies from timing out"""
+    subscription = broker.subscribe(user_id)
+    try:
+        yield b": connected\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(subscription.next_frame(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def event_stream(request):
+    """
+    GET /api/stream/?token=<access token>
+    events: readings, alerts, resync
+    """
+    user_id = stream_user_id(request)
+    if user_id is None:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    response = StreamingHttpResponse(stream_frames(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
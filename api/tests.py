@@ -1,3 +1,424 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.generics import ListAPIView
+from rest_framework.test import APIClient
+
+from monitoring.models import (
+    AgentRecommendation, Alert, AnalysisJob, AnomalyEvent, FarmProfile, FieldPlot, Plot, RecommendationSet, SensorGateway, SensorReading,
+    ThresholdProfile,
+)
+from api import analysis_jobs, dashboard, ingestion, recommendations, thresholds
+from api.conditional import ConditionalListMixin
+from api.gateways import issue_key
+from api.stamps import STAMP_INTERVAL
+from api.ai_agent_engine import ALERT_TYPE_INDEX, AlertType
+
+
+class ThresholdTableTests(TestCase):
+    """Edits made by another process reach the compiled table through its stamp"""
+
+    def setUp(self):
+        thresholds.invalidate_threshold_table()
+        thresholds._stamp.interval = 0
+        self.profile = ThresholdProfile.objects.create(
+            crop_type='wheat', alert_type='soil_moisture', min_value=25, max_value=70, critical_min=10, critical_max=85
+        )
+
+    def tearDown(self):
+        thresholds._stamp.interval = STAMP_INTERVAL
+        thresholds.invalidate_threshold_table()
+
+    def soil_moisture_min(self):
+        return thresholds.get_threshold_table().lookup('wheat')[ALERT_TYPE_INDEX[AlertType.SOIL_MOISTURE]][0]
+
+    def test_edit_without_local_signal_recompiles(self):
+        self.assertEqual(self.soil_moisture_min(), 25)
+        # queryset.update() n'envoie pas de signal, comme une écriture d'un autre worker
+        ThresholdProfile.objects.filter(pk=self.profile.pk).update(min_value=35, updated_at=timezone.now())
+        self.assertEqual(self.soil_moisture_min(), 35)
+
+    def test_delete_without_local_signal_recompiles(self):
+        self.assertEqual(self.soil_moisture_min(), 25)
+        ThresholdProfile.objects.filter(pk=self.profile.pk)._raw_delete(ThresholdProfile.objects.db)
+        self.assertEqual(self.soil_moisture_min(), 30)
+
+
+class GrowthStageAlertTests(TestCase):
+    """Alert paths pick the growth stage of the FieldPlot linked to the sensor plot"""
+
+    def setUp(self):
+        thresholds.invalidate_threshold_table()
+        recommendations.invalidate_catalogue()
+        ingestion._plot_cache.clear()
+        self.user = get_user_model().objects.create_user('owner', password='x')
+        self.plot = Plot.objects.create(user=self.user, name='p', location='l', crop_type='wheat', size=1)
+        farm = FarmProfile.objects.create(owner=self.user, name='f', location='l', size=1, soil_type='loam')
+        FieldPlot.objects.create(
+            farm=farm, name='fp', crop_type='wheat', crop_variety='v', size=1, sensor_plot=self.plot,
+            planting_date=date.today() - timedelta(days=10), expected_harvest_date=date.today() + timedelta(days=100),
+        )
+        # Semis : 40 % d'humidité du sol est critique, acceptable pour le profil par défaut
+        ThresholdProfile.objects.create(
+            crop_type='wheat', growth_stage='seedling', alert_type='soil_moisture',
+            min_value=50, max_value=80, critical_min=45, critical_max=90,
+        )
+        SensorReading.objects.create(plot=self.plot, sensor_type='soil_moisture', value=40, unit='percentage')
+
+    def tearDown(self):
+        thresholds.invalidate_threshold_table()
+        ingestion._plot_cache.clear()
+
+    def test_ingestion_uses_the_seedling_thresholds(self):
+        _, alerts = ingestion.store_readings([
+            (ingestion.get_plot_info(self.plot.id), [('soil_moisture', 40.0, 'percentage')])
+        ])
+        self.assertEqual([(alert.alert_type, alert.severity) for alert in alerts], [('soil_moisture', 'critical')])
+
+    def test_batch_analysis_uses_the_seedling_thresholds(self):
+        job = analysis_jobs.run_batch_analysis(AnalysisJob.objects.create(user=self.user))
+        self.assertEqual(job.alerts_created, 1)
+        self.assertEqual(Alert.objects.get().severity, 'critical')
+
+    def test_unlinked_plot_uses_the_default_thresholds(self):
+        FieldPlot.objects.update(sensor_plot=None)
+        job = analysis_jobs.run_batch_analysis(AnalysisJob.objects.create(user=self.user))
+        self.assertEqual(job.alerts_created, 0)
+
+
+class RecommendationCatalogueTests(TestCase):
+    """Catalogue edits made by another process are picked up through its stamp"""
+
+    def setUp(self):
+        recommendations.invalidate_catalogue()
+        recommendations._stamp.interval = 0
+
+    def tearDown(self):
+        recommendations._stamp.interval = STAMP_INTERVAL
+        recommendations.invalidate_catalogue()
+
+    def test_edit_without_local_signal_reloads(self):
+        set_id = recommendations.recommendation_set_id(AlertType.SOIL_MOISTURE, 'low')
+        self.assertTrue(recommendations.recommendations_for(set_id))
+        RecommendationSet.objects.filter(pk=set_id).update(recommendations=['Open the valve'],
+                                                           updated_at=timezone.now())
+        self.assertEqual(recommendations.recommendations_for(set_id), ['Open the valve'])
+
+
+class SensorAddAuthorizationTests(TestCase):
+    """sensor_add refuses foreign and unknown plots alike, from a plot cache that expires"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user('owner', password='x')
+        self.other = User.objects.create_user('other', password='x')
+        self.plot = Plot.objects.create(user=self.owner, name='p', location='l', crop_type='wheat', size=1)
+        self.client = APIClient()
+        self.url = reverse('api:sensor-add')
+
+    def post(self, user, plot_id):
+        self.client.force_authenticate(user)
+        return self.client.post(self.url, {'plot_id': plot_id, 'readings': [{'sensor': 'moisture', 'value': 40}]},
+                                format='json')
+
+    def test_unknown_and_foreign_plots_get_the_same_403(self):
+        foreign = self.post(self.other, self.plot.id)
+        unknown = self.post(self.other, self.plot.id + 1000)
+        self.assertEqual(foreign.status_code, 403)
+        self.assertEqual(unknown.status_code, 403)
+
+    def test_gateway_only_writes_to_its_bound_plots(self):
+        unbound = Plot.objects.create(user=self.owner, name='q', location='l', crop_type='wheat', size=1)
+        gateway = SensorGateway.objects.create(owner=self.owner, name='g')
+        key = issue_key(gateway)
+        gateway.plots.add(self.plot)
+        client = APIClient(HTTP_X_GATEWAY_KEY=key)
+        for plot_id, status in ((self.plot.id, 200), (unbound.id, 403)):
+            response = client.post(self.url, {'plot_id': plot_id, 'readings': [{'sensor': 'moisture', 'value': 40}]},
+                                   format='json')
+            self.assertEqual(response.status_code, status)
+
+    def test_cross_user_reading_create_is_refused(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.post(reverse('api:sensor-reading-create'), {
+            'plot': self.plot.id, 'sensor_type': 'soil_moisture', 'value': 40, 'unit': 'percentage',
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(SensorReading.objects.exists())
+
+    def test_reassignment_by_another_worker_is_seen_after_the_ttl(self):
+        self.assertEqual(self.post(self.owner, self.plot.id).status_code, 200)
+        # update() sans signal, comme une réaffectation faite par un autre worker
+        Plot.objects.filter(pk=self.plot.pk).update(user=self.other)
+        with patch.object(ingestion, 'PLOT_CACHE_TTL', -1):
+            self.assertEqual(self.post(self.owner, self.plot.id).status_code, 403)
+            self.assertEqual(self.post(self.other, self.plot.id).status_code, 200)
+
+    def test_plot_cache_keeps_the_latest_plots(self):
+        second = Plot.objects.create(user=self.owner, name='q', location='l', crop_type='wheat', size=1)
+        with patch.object(ingestion, 'PLOT_CACHE_SIZE', 1):
+            ingestion.get_plot_info(self.plot.id)
+            ingestion.get_plot_info(second.id)
+            self.assertEqual(list(ingestion._plot_cache), [second.id])
+
+
+class BatchedWriterTests(TransactionTestCase):
+    """The writer thread batches by size and interval, and drops only readings of deleted plots"""
+
+    def setUp(self):
+        ingestion._plot_cache.clear()
+        recommendations.invalidate_catalogue()
+        user = get_user_model().objects.create_user('owner', password='x')
+        self.plots = [
+            ingestion.get_plot_info(Plot.objects.create(user=user, name=name, location='l', crop_type='wheat',
+                                                        size=1).id)
+            for name in 'ab'
+        ]
+        self.readings = [('soil_moisture', 40.0, 'percentage'), ('temperature', 20.0, 'celsius')]
+
+    def tearDown(self):
+        ingestion._plot_cache.clear()
+        recommendations.invalidate_catalogue()
+
+    def write(self, writer, submissions):
+        with patch.object(ingestion, 'store_readings', wraps=ingestion.store_readings) as store:
+            for plot in submissions:
+                writer.submit(plot, self.readings)
+            writer.flush()
+        return [len(call.args[0]) for call in store.call_args_list]
+
+    def test_batches_by_size(self):
+        writer = ingestion.BatchedWriter(batch_size=4, flush_interval=1)
+        self.assertEqual(self.write(writer, [self.plots[0]] * 3), [2, 1])
+        self.assertEqual((writer.written, writer.failed), (6, 0))
+        self.assertEqual(SensorReading.objects.count(), 6)
+
+    def test_flush_writes_a_partial_batch_after_the_interval(self):
+        writer = ingestion.BatchedWriter(batch_size=100, flush_interval=0.01)
+        self.assertEqual(self.write(writer, [self.plots[0]]), [1])
+        self.assertEqual(SensorReading.objects.count(), 2)
+
+    def test_readings_of_a_deleted_plot_are_dropped(self):
+        kept, deleted = self.plots
+        Plot.objects.filter(pk=deleted.id).delete()
+        writer = ingestion.BatchedWriter(batch_size=100, flush_interval=0.5)
+        self.write(writer, [kept, deleted])
+        self.assertEqual((writer.written, writer.failed), (2, 2))
+        self.assertEqual(set(SensorReading.objects.values_list('plot_id', flat=True)), {kept.id})
+
+
+class DashboardCacheTests(TestCase):
+    """Snapshots are served from the cache until a write of the owner drops them"""
+
+    def setUp(self):
+        cache.clear()
+        ingestion._plot_cache.clear()
+        recommendations.invalidate_catalogue()
+        User = get_user_model()
+        self.owner = User.objects.create_user('owner', password='x')
+        self.other = User.objects.create_user('other', password='x')
+        self.plot = Plot.objects.create(user=self.owner, name='p', location='l', crop_type='wheat', size=1)
+
+    def tearDown(self):
+        cache.clear()
+
+    def moisture(self, user):
+        return dashboard.get_snapshot(user)['plots'][0]['latest_readings']['soil_moisture']
+
+    def test_second_read_is_a_cache_hit(self):
+        dashboard.get_snapshot(self.owner)
+        with self.assertNumQueries(0):
+            dashboard.get_snapshot(self.owner)
+
+    def test_reading_writes_drop_the_owner_snapshot_only(self):
+        Plot.objects.create(user=self.other, name='q', location='l', crop_type='wheat', size=1)
+        self.assertIsNone(self.moisture(self.owner))
+        dashboard.get_snapshot(self.other)
+
+        SensorReading.objects.create(plot=self.plot, sensor_type='soil_moisture', value=40, unit='percentage')
+        self.assertEqual(self.moisture(self.owner)['value'], 40)
+        ingestion.store_readings([(ingestion.get_plot_info(self.plot.id), [('soil_moisture', 45.0, 'percentage')])])
+        self.assertEqual(self.moisture(self.owner)['value'], 45)
+        with self.assertNumQueries(0):
+            dashboard.get_snapshot(self.other)
+
+    def test_invalidate_dashboard(self):
+        dashboard.get_snapshot(self.owner)
+        dashboard.invalidate_dashboard([self.owner.id, self.owner.id])
+        self.assertIsNone(cache.get(dashboard.cache_key(self.owner.id)))
+
+
+class JobStatusTests(TestCase):
+    """Job ids are UUIDs, and jobs whose worker died do not stay running"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_non_uuid_ids_are_not_found(self):
+        self.assertEqual(self.client.get('/api/analysis/jobs/abc-123/').status_code, 404)
+
+    def test_interrupted_jobs_are_reported_failed(self):
+        job = AnalysisJob.objects.create(user=self.user, status='running')
+        AnalysisJob.objects.filter(pk=job.pk).update(
+            created_at=timezone.now() - timedelta(seconds=analysis_jobs.JOB_TIMEOUT + 1)
+        )
+        response = self.client.get(f'/api/analysis/jobs/{job.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'failed')
+
+    def test_long_running_job_with_a_heartbeat_is_kept(self):
+        old = timezone.now() - timedelta(seconds=analysis_jobs.JOB_TIMEOUT + 1)
+        job = AnalysisJob.objects.create(user=self.user, status='running')
+        AnalysisJob.objects.filter(pk=job.pk).update(created_at=old, started_at=old, heartbeat_at=timezone.now())
+        self.assertEqual(self.client.get(f'/api/analysis/jobs/{job.pk}/').json()['status'], 'running')
+
+    def test_small_accounts_run_in_the_background(self):
+        Plot.objects.create(user=self.user, name='p', location='l', crop_type='wheat', size=1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/analysis/batch_analyze/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(len(callbacks), 1)
+
+
+class BatchAnalysisChunkTests(TestCase):
+    """Alerts are written per chunk of plots, each chunk is a heartbeat"""
+
+    def setUp(self):
+        recommendations.invalidate_catalogue()
+        self.user = get_user_model().objects.create_user('owner', password='x')
+        for name in 'abc':
+            plot = Plot.objects.create(user=self.user, name=name, location='l', crop_type='wheat', size=1)
+            SensorReading.objects.create(plot=plot, sensor_type='soil_moisture', value=2, unit='percentage')
+
+    def test_alerts_are_written_per_chunk(self):
+        job = AnalysisJob.objects.create(user=self.user, plots_total=3)
+        with patch.object(analysis_jobs, 'CHUNK_SIZE', 2), \
+                patch.object(Alert.objects, 'bulk_create', wraps=Alert.objects.bulk_create) as bulk_create:
+            analysis_jobs.run_batch_analysis(job)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [2, 1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.plots_analyzed, job.alerts_created), ('completed', 3, 3))
+        self.assertIsNotNone(job.heartbeat_at)
+        self.assertEqual(Alert.objects.count(), 3)
+
+
+class OwnedByTests(TestCase):
+    """owned_by() keeps the rows of the user's own farms and plots only"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user('owner', password='x')
+        self.other = User.objects.create_user('other', password='x')
+        self.admin = User.objects.create_user('admin', password='x', role='admin')
+        self.events = {user: self.anomaly(user) for user in (self.owner, self.other)}
+
+    def anomaly(self, user):
+        farm = FarmProfile.objects.create(owner=user, name='f', location='l', size=1, soil_type='loam')
+        field_plot = FieldPlot.objects.create(
+            farm=farm, name='fp', crop_type='wheat', crop_variety='v', size=1,
+            planting_date=date(2025, 3, 1), expected_harvest_date=date(2025, 7, 1),
+        )
+        return AnomalyEvent.objects.create(
+            plot=field_plot, anomaly_type='moisture_drop', severity='high', detected_value=10,
+            normal_range_min=25, normal_range_max=70, model_confidence=0.8,
+        )
+
+    def test_querysets(self):
+        for model in (FarmProfile, FieldPlot, AnomalyEvent):
+            self.assertEqual(model.objects.owned_by(self.owner).count(), 1)
+            self.assertEqual(model.objects.owned_by(self.admin).count(), 2)
+            self.assertFalse(model.objects.owned_by(AnonymousUser()).exists())
+        self.assertEqual(list(AnomalyEvent.objects.owned_by(self.owner)), [self.events[self.owner]])
+
+    def test_list_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        response = client.get(reverse('api:anomaly-list'))
+        self.assertEqual([row['id'] for row in response.data['results']], [self.events[self.other].id])
+
+
+class AlertListConditionalTests(TestCase):
+    """The alerts list ETag follows edits and deletes, Last-Modified cannot hide a delete"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner', password='x')
+        plot = Plot.objects.create(user=self.user, name='p', location='l', crop_type='wheat', size=1)
+        self.alerts = [
+            Alert.objects.create(plot=plot, alert_type='soil_moisture', severity='high', current_value=10,
+                                 threshold_value=25)
+            for _ in range(2)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api:alert-list')
+
+    def test_etag_changes_on_edit_and_delete(self):
+        first = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', first)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        self.alerts[0].message = 'edited'
+        self.alerts[0].save()
+        edited = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(edited.status_code, 200)
+
+        self.alerts[1].delete()
+        deleted = self.client.get(self.url, HTTP_IF_NONE_MATCH=edited['ETag'],
+                                  HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(deleted.status_code, 200)
+
+    def test_etag_changes_on_catalogue_edit(self):
+        recommendations.invalidate_catalogue()
+        set_id = recommendations.recommendation_set_id(AlertType.SOIL_MOISTURE, 'low')
+        Alert.objects.update(recommendation_set_id=set_id)
+        first = self.client.get(self.url)
+        RecommendationSet.objects.filter(pk=set_id).update(recommendations=['Open the valve'],
+                                                           updated_at=timezone.now())
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class RecommendationListConditionalTests(TestCase):
+    """Any edit of a recommendation changes the list ETag"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('owner', password='x')
+        farm = FarmProfile.objects.create(owner=self.user, name='f', location='l', size=1, soil_type='loam')
+        field_plot = FieldPlot.objects.create(
+            farm=farm, name='fp', crop_type='wheat', crop_variety='v', size=1,
+            planting_date=date(2025, 3, 1), expected_harvest_date=date(2025, 7, 1),
+        )
+        anomaly = AnomalyEvent.objects.create(
+            plot=field_plot, anomaly_type='moisture_drop', severity='high', detected_value=10,
+            normal_range_min=25, normal_range_max=70, model_confidence=0.8,
+        )
+        self.recommendation = AgentRecommendation.objects.create(
+            anomaly_event=anomaly, recommended_action='irrigation', action_details='Irrigate',
+            explanation_text='Dry', confidence='medium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api:recommendation-list')
+
+    def test_etag_changes_on_notes_edit(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.recommendation.implementation_notes = 'Done on the north side'
+        self.recommendation.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class ConditionalListMixinTests(SimpleTestCase):
+    """version_stamp() is required when a view is defined"""
+
+    def test_view_without_version_stamp_is_refused(self):
+        with self.assertRaises(TypeError):
+            type('View', (ConditionalListMixin, ListAPIView), {})
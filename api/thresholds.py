@@ -0,0 +1,125 @@
+"""
+Threshold profiles per crop type and growth stage
+Profiles are compiled once into a NumPy lookup table, cached in-process
+and invalidated whenever a ThresholdProfile is edited: at once in the
+editing process, within CACHE_STAMP_INTERVAL seconds in the others
+"""
+
+import threading
+from datetime import date
+from typing import Iterable, Optional
+
+import numpy as np
+
+from monitoring.models import ThresholdProfile
+from .ai_agent_engine import DEFAULT_RULES, ALERT_TYPES, ALERT_TYPE_INDEX, AlertType
+from .stamps import TableStamp
+
+STAGES = [stage for stage, _ in ThresholdProfile.GROWTH_STAGES]
+STAGE_INDEX = {stage: i for i, stage in enumerate(STAGES)}
+
+# Days after planting at which each stage ends, the last stage is open ended
+STAGE_BOUNDARIES = [
+    (21, 'seedling'),
+    (60, 'vegetative'),
+    (100, 'flowering'),
+]
+
+
+def growth_stage(planting_date: Optional[date], today: Optional[date] = None) -> str:
+    """Growth stage of a crop planted on planting_date ('any' when unknown)"""
+    if planting_date is None:
+        return 'any'
+    days = ((today or date.today()) - planting_date).days
+    for end_day, stage in STAGE_BOUNDARIES:
+        if days < end_day:
+            return stage
+    return 'maturity'
+
+
+class ThresholdTable:
+    """
+    Compiled thresholds, values[crop, stage, alert_type] is a
+    (min, max, critical_min, critical_max) row
+    """
+
+    def __init__(self, crop_types, values: np.ndarray):
+        self.crop_index = {crop_type: i for i, crop_type in enumerate(crop_types)}
+        self.values = values
+
+    def lookup(self, crop_type: Optional[str], stage: str = 'any') -> np.ndarray:
+        """Thresholds for every alert type, unknown crops fall back to the default profile"""
+        crop = self.crop_index.get((crop_type or '').lower(), 0)
+        return self.values[crop, STAGE_INDEX.get(stage, 0)]
+
+
+def compile_threshold_table(profiles: Iterable[ThresholdProfile]) -> ThresholdTable:
+    """
+    Build the lookup table from profiles. More specific profiles win:
+    default/any < default/stage < crop/any < crop/stage
+    """
+    profiles = list(profiles)
+    default_crop = ThresholdProfile.DEFAULT_CROP
+    crop_types = [default_crop] + sorted(
+        {p.crop_type.lower() for p in profiles} - {default_crop}
+    )
+    crop_index = {crop_type: i for i, crop_type in enumerate(crop_types)}
+
+    defaults = np.array([
+        [rule["min"], rule["max"], rule["critical_min"], rule["critical_max"]]
+        for rule in (DEFAULT_RULES[alert_type] for alert_type in ALERT_TYPES)
+    ], dtype=float)
+    values = np.broadcast_to(
+        defaults, (len(crop_types), len(STAGES), len(ALERT_TYPES), 4)
+    ).copy()
+
+    def specificity(profile):
+        return (profile.crop_type.lower() != default_crop, profile.growth_stage != 'any')
+
+    for profile in sorted(profiles, key=specificity):
+        crop_type = profile.crop_type.lower()
+        crops = slice(None) if crop_type == default_crop else crop_index[crop_type]
+        stages = slice(None) if profile.growth_stage == 'any' else STAGE_INDEX[profile.growth_stage]
+        alert_type = ALERT_TYPE_INDEX[AlertType(profile.alert_type)]
+        values[crops, stages, alert_type] = [
+            profile.min_value, profile.max_value, profile.critical_min, profile.critical_max
+        ]
+
+    return ThresholdTable(crop_types, values)
+
+
+_table = None
+_lock = threading.Lock()
+_stamp = TableStamp(ThresholdProfile)
+
+
+def get_threshold_table() -> ThresholdTable:
+    """Return the compiled table, compiling it on first use or after an edit in any process"""
+    global _table
+    if _stamp.changed():
+        _table = None
+    table = _table
+    if table is None:
+        with _lock:
+            if _table is None:
+                _table = compile_threshold_table(ThresholdProfile.objects.all())
+            table = _table
+    return table
+
+
+def invalidate_threshold_table(**kwargs):
+    """Drop the compiled table, the next lookup recompiles it"""
+    global _table
+    _table = None
+
+
+def thresholds_for_plot(plot, table: Optional[ThresholdTable] = None,
+                        today: Optional[date] = None) -> np.ndarray:
+    """
+    Thresholds for a FieldPlot, a PlotInfo or a Plot from
+    Plot.objects.with_planting_date(), based on its crop type and planting
+    date. A Plot without a planting date gets the 'any' stage.
+    """
+    table = table or get_threshold_table()
+    stage = growth_stage(getattr(plot, 'planting_date', None), today)
+    return table.lookup(plot.crop_type, stage)
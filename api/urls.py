@@ -11,15 +11,21 @@ router.register(r'analysis', SensorReadingAnalysisViewSet, basename='analysis')
 urlpatterns = [
     path('', include(router.urls)),]
 # api/urls.py
-from django.urls import path
+from django.urls import path, include
 from .views import (
     api_root,
     sensor_add,  # <-- AJOUTE CET IMPORT
+    sensor_add_async,
+    dashboard_snapshot,
+    drift_report,
+    moisture_forecast,
     SensorReadingCreateView,
     SensorReadingListView,
     AnomalyEventListView,
-    AgentRecommendationListView
+    AgentRecommendationListView,
+    DailyAgronomyListView
 )
+from .streams import event_stream
 
 app_name = "api"
 
@@ -30,6 +36,18 @@ urlpatterns = [
     # Batch endpoint pour ajouter plusieurs lectures (NOUVEAU)
     path("sensors/", sensor_add, name="sensor-add"),
     
+    # Même format, async sous ASGI : écritures groupées en arrière-plan
+    path("sensors/async/", sensor_add_async, name="sensor-add-async"),
+    
+    # Snapshot de la page Dashboard, en cache par utilisateur
+    path("dashboard/", dashboard_snapshot, name="dashboard"),
+
+    # Dérive des entrées du modèle d'anomalies par parcelle (PSI / KS)
+    path("drift/", drift_report, name="drift-report"),
+
+    # Humidité du sol prévue par parcelle (lissage exponentiel amorti)
+    path("forecast/", moisture_forecast, name="moisture-forecast"),
+    
     # Sensor readings
     path("sensor-readings/create/", SensorReadingCreateView.as_view(), name="sensor-reading-create"),
     path("sensor-readings/", SensorReadingListView.as_view(), name="sensor-reading-list"),
@@ -39,4 +57,13 @@ urlpatterns = [
 
     # Recommendations
     path("recommendations/", AgentRecommendationListView.as_view(), name="recommendation-list"),
+
+    # Indices agronomiques journaliers (GDD, ET0, bilan hydrique)
+    path("agronomy/", DailyAgronomyListView.as_view(), name="agronomy-list"),
+
+    # Live readings and alerts (Server-Sent Events, served under ASGI)
+    path("stream/", event_stream, name="event-stream"),
+
+    # Alerts, plots and analysis jobs (router defined above)
+    path("", include(router.urls)),
 ]
\ No newline at end of file
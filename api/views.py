@@ -4,20 +4,38 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from datetime import datetime, timedelta
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 
-from monitoring.models import Plot, SensorReading, Alert
+from monitoring.metrics import count_alerts
+from monitoring.models import Plot, SensorReading, Alert, AnalysisJob
 from .ai_agent_engine import CropMonitoringAgent, AnomalySeverity
-from .serializers import PlotSerializer, AlertSerializer, SensorReadingSerializer
+from .analysis_jobs import fail_stale_jobs, start_batch_analysis
+from .conditional import ConditionalListMixin
+from .recommendations import to_db_alert
+from .streams import publish_alerts
+from .thresholds import thresholds_for_plot
+from .serializers import PlotSerializer, AlertSerializer, SensorReadingSerializer, AnalysisJobSerializer
 
 
-class AlertViewSet(viewsets.ModelViewSet):
+class AlertViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    serializer_class = AlertSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
         user = self.request.user
         return Alert.objects.filter(plot__user=user).order_by('-timestamp')
     
+    def version_stamp(self):
+        # Renommages de parcelle (plot_name) et entrées du catalogue (message,
+        # recommandations rendus à la lecture) changent aussi la liste
+        return self.get_queryset().aggregate(
+            count=Count('id'),
+            updated=Max('updated_at'),
+            plot_updated=Max('plot__updated_at'),
+            catalogue_updated=Max('recommendation_set__updated_at'),
+        )
+    
     @action(detail=False, methods=['get'])
     def recent(self, request):
         cutoff_time = datetime.now() - timedelta(hours=24)
@@ -75,7 +93,7 @@ class SensorReadingAnalysisViewSet(viewsets.ViewSet):
             )
         
         try:
-            plot = Plot.objects.get(id=plot_id, user=request.user)
+            plot = Plot.objects.with_planting_date().get(id=plot_id, user=request.user)
         except Plot.DoesNotExist:
             return Response(
                 {"error": "Plot not found"},
@@ -107,23 +125,18 @@ class SensorReadingAnalysisViewSet(viewsets.ViewSet):
         alerts = agent.analyze_sensor_data(
             sensor_data=sensor_data,
             plot_id=str(plot_id),
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            thresholds=thresholds_for_plot(plot)
         )
         
         # Save alerts to database
         saved_alerts = []
         for alert in alerts:
-            db_alert = Alert.objects.create(
-                plot=plot,
-                alert_type=alert.alert_type.value,
-                severity=alert.severity.value,
-                message=alert.message,
-                current_value=alert.current_value,
-                threshold_value=alert.threshold_value,
-                recommendations=alert.recommendations,
-                timestamp=datetime.fromisoformat(alert.timestamp)
-            )
+            db_alert = to_db_alert(plot, alert, timestamp=datetime.fromisoformat(alert.timestamp))
+            db_alert.save()
             saved_alerts.append(db_alert)
+        count_alerts('analyze_latest', saved_alerts)
+        publish_alerts(request.user.id, saved_alerts)
         
         serializer = AlertSerializer(saved_alerts, many=True)
         return Response({
@@ -133,59 +146,31 @@ class SensorReadingAnalysisViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'])
     def batch_analyze(self, request):
-        """Analyze all plots"""
-        plots = Plot.objects.filter(user=request.user)
-        all_alerts = []
-        
-        agent = CropMonitoringAgent()
-        
-        for plot in plots:
-            sensor_types = ['temperature', 'humidity', 'soil_moisture', 'ph_level', 'light_intensity']
-            sensor_data = {}
-            
-            for sensor_type in sensor_types:
-                try:
-                    latest = SensorReading.objects.filter(
-                        plot=plot,
-                        sensor_type=sensor_type
-                    ).latest('timestamp')
-                    sensor_data[sensor_type] = latest.value
-                except SensorReading.DoesNotExist:
-                    continue
-            
-            if sensor_data:
-                alerts = agent.analyze_sensor_data(
-                    sensor_data=sensor_data,
-                    plot_id=str(plot.id),
-                    timestamp=datetime.now().isoformat()
-                )
-                
-                for alert in alerts:
-                    Alert.objects.create(
-                        plot=plot,
-                        alert_type=alert.alert_type.value,
-                        severity=alert.severity.value,
-                        message=alert.message,
-                        current_value=alert.current_value,
-                        threshold_value=alert.threshold_value,
-                        recommendations=alert.recommendations,
-                        timestamp=datetime.fromisoformat(alert.timestamp)
-                    )
-                    all_alerts.extend(alerts)
-        
-        return Response({
-            "total_alerts_generated": len(all_alerts),
-            "plots_analyzed": plots.count()
-        })
+        """Start a batch analysis of all plots, returns the job to poll"""
+        job = start_batch_analysis(request.user)
+        serializer = AnalysisJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'],
+            url_path=r'jobs/(?P<job_id>[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})')
+    def job_status(self, request, job_id=None):
+        """Poll the status of a batch analysis job"""
+        fail_stale_jobs(AnalysisJob.objects.filter(id=job_id, user=request.user))
+        job = get_object_or_404(AnalysisJob, id=job_id, user=request.user)
+        serializer = AnalysisJobSerializer(job)
+        return Response(serializer.data)
 
 
-class PlotViewSet(viewsets.ModelViewSet):
+class PlotViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = PlotSerializer
     
     def get_queryset(self):
         return Plot.objects.filter(user=self.request.user)
     
+    def version_stamp(self):
+        return self.get_queryset().aggregate(count=Count('id'), updated=Max('updated_at'))
+    
     @action(detail=True, methods=['get'])
     def sensor_data_summary(self, request, pk=None):
         plot = self.get_object()
@@ -218,17 +203,34 @@ class PlotViewSet(viewsets.ModelViewSet):
 from rest_framework import generics, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 
-from monitoring.models import SensorReading, AnomalyEvent, AgentRecommendation, FieldPlot
+import json
+import logging
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from monitoring import drift
+from monitoring.forecasting import forecast_moisture
+from monitoring.ml import DRIFT_REFERENCE_FILE
+from monitoring.models import SensorReading, AnomalyEvent, AgentRecommendation, DailyAgronomy
+from .dashboard import get_snapshot
+from .forecast_alerts import HORIZON_HOURS
+from .gateways import aauthorized_plots, aget_credentials, authenticate_caller, authorize_plots, authorized_plots, gateway_key
+from .ingestion import IngestionError, parse_batch_payload, get_plot_info, store_readings, writer
 from .serializers import (
     SensorReadingSerializer,
     AnomalyEventSerializer,
-    AgentRecommendationSerializer
+    AgentRecommendationSerializer,
+    DailyAgronomySerializer
 )
 
+logger = logging.getLogger(__name__)
+
 # ============================================================================
 # 1. VUE RACINE DE L'API
 # ============================================================================
@@ -252,7 +254,13 @@ def api_root(request):
             },
             'anomalies': 'GET /api/anomalies/',
             'recommendations': 'GET /api/recommendations/',
-            'sensors': 'POST /api/sensors/'
+            'sensors': 'POST /api/sensors/',
+            'sensors_async': 'POST /api/sensors/async/',
+            'sensors_field': 'POST /api/sensors/field/',
+            'dashboard': 'GET /api/dashboard/',
+            'drift': 'GET /api/drift/?days=7',
+            'forecast': 'GET /api/forecast/?hours=12',
+            'agronomy': 'GET /api/agronomy/?plot=1&day__gte=2025-01-01'
         },
         'note': 'Use the endpoints above to interact with the system'
     })
@@ -265,169 +273,190 @@ def api_root(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def sensor_add(request):
-    """Endpoint batch pour ajouter plusieurs lectures"""
-    print("\n" + "="*60)
-    print("🔄 sensor_add() CALLED")
-    
+    """
+    Endpoint batch pour ajouter plusieurs lectures, d'une ou plusieurs parcelles.
+    Passerelle (X-Gateway-Key) ou utilisateur JWT, autorisés par parcelle.
+    """
+    plot_id = None
     try:
-        data = request.data
-        print(f"📦 Data received: {data}")
-        
-        plot_id = data.get('plot_id')
-        readings = data.get('readings', [])
-        
-        print(f"📍 plot_id: {plot_id}")
-        print(f"📊 readings count: {len(readings)}")
-        
-        if not plot_id or not readings:
-            print("❌ ERROR: plot_id or readings missing")
-            return Response(
-                {'error': 'plot_id and readings are required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Convert plot_id to int
-        try:
-            plot_id_int = int(plot_id)
-        except:
-            print(f"❌ Invalid plot_id: {plot_id}")
-            return Response(
-                {'error': 'plot_id must be a number'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Vérifie que le plot existe
         try:
-            plot = FieldPlot.objects.get(id=plot_id_int)
-            print(f"✅ Plot exists: {plot.name}")
-        except FieldPlot.DoesNotExist:
-            print(f"❌ Plot {plot_id_int} does not exist")
-            return Response(
-                {'error': f'Plot {plot_id_int} not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # Mappage des capteurs - correspond aux SENSOR_TYPES dans models.py
-        sensor_map = {
-            'moisture': ('moisture', 'percentage'),
-            'soil_moisture': ('moisture', 'percentage'),
-            'temperature': ('temperature', 'celsius'),
-            'air_temperature': ('temperature', 'celsius'),
-            'temp': ('temperature', 'celsius'),
-            'humidity': ('humidity', 'percentage'),
-            'hum': ('humidity', 'percentage'),
-            'ph': ('ph', 'ph'),
-            'nitrogen': ('nitrogen', 'ppm')
-        }
+            caller = authenticate_caller(gateway_key(request), request.user)
+            parsed = parse_batch_payload(request.data)
+            plot_id = parsed[0][0] if len(parsed) == 1 else [entry[0] for entry in parsed]
+            plots = authorized_plots(caller, [entry[0] for entry in parsed])
+        except IngestionError as e:
+            logger.info("sensor_add refused: %s", e.message, extra={'plot_id': plot_id, 'status': e.status})
+            return Response({'error': e.message}, status=e.status)
         
-        created_count = 0
-        anomaly_detected = False
+        rejected = [item for _, _, plot_rejected in parsed for item in plot_rejected]
+        batch = [(plot, readings) for plot, (_, readings, _) in zip(plots, parsed) if readings]
         
-        for i, reading in enumerate(readings):
-            print(f"\n📝 Processing reading {i}: {reading}")
-            
-            sensor = reading.get('sensor')
-            value = reading.get('value')
-            
-            print(f"  sensor: '{sensor}'")
-            print(f"  value: {value}")
-            
-            if sensor and value is not None:
-                sensor_lower = str(sensor).lower().strip()
-                print(f"  sensor_lower: '{sensor_lower}'")
-                
-                if sensor_lower in sensor_map:
-                    print(f"  ✅ Sensor recognized")
-                    
-                    try:
-                        value_float = float(value)
-                        
-                        # 🔧 BUG FIX: Déstructurer le tuple AVANT create()
-                        sensor_type, unit = sensor_map[sensor_lower]
-                        
-                        # Crée la lecture avec TOUS les champs requis
-                        sensor_reading = SensorReading.objects.create(
-                            plot=plot,
-                            sensor_type=sensor_type,
-                            value=value_float,       # 🔧 CORRIGÉ: ce champ manquait!
-                            unit=unit
-                        )
-                        created_count += 1
-                        print(f"  ✅ SensorReading created: ID {sensor_reading.id}")
-                        
-                        # Détection d'anomalie simple
-                        if sensor_lower in ['moisture', 'soil_moisture'] and value_float < 30:
-                            anomaly_detected = True
-                            print(f"  ⚠️ ANOMALY DETECTED: moisture={value_float}")
-                            
-                            # Crée l'anomalie
-                            anomaly = AnomalyEvent.objects.create(
-                                plot=plot,
-                                anomaly_type='moisture_drop',
-                                severity='high',
-                                detected_value=value_float,
-                                normal_range_min=30,
-                                normal_range_max=80,
-                                model_confidence=0.9
-                            )
-                            print(f"  ✅ AnomalyEvent created: ID {anomaly.id}")
-                            
-                            # Crée la recommandation
-                            recommendation = AgentRecommendation.objects.create(
-                                anomaly_event=anomaly,
-                                recommended_action='irrigation',
-                                action_details='Increase irrigation immediately',
-                                explanation_text=f'Soil moisture ({value_float}%) is critically low (below 30%)',
-                                confidence='high'
-                            )
-                            print(f"  ✅ AgentRecommendation created: ID {recommendation.id}")
-                            
-                    except ValueError:
-                        print(f"  ❌ Cannot convert value to float: {value}")
-                    except Exception as e:
-                        print(f"  ❌ Error creating reading: {e}")
-                        import traceback
-                        traceback.print_exc()
-                else:
-                    print(f"  ❌ Sensor '{sensor_lower}' not recognized")
-                    print(f"     Available: {list(sensor_map.keys())}")
-            else:
-                print(f"  ❌ Sensor or value missing")
+        # Une seule insertion groupée pour toutes les lectures
+        created_count, alerts = store_readings(batch) if batch else (0, [])
+        anomaly_detected = bool(alerts)
         
-        print(f"\n📊 FINAL: {created_count} readings added, anomaly: {anomaly_detected}")
-        print("="*60)
+        logger.info("sensor_add", extra={
+            'plot_id': plot_id,
+            'readings': created_count,
+            'rejected': len(rejected),
+            'reject_reasons': sorted({item['reason'] for item in rejected}),
+            'anomaly_detected': anomaly_detected,
+        })
         
-        return Response({
+        response = {
             'status': 'success',
             'message': f'{created_count} reading(s) added',
             'anomaly_detected': anomaly_detected,
-            'plot_id': plot_id
-        })
+            'plot_id': request.data.get('plot_id')
+        }
+        if len(plots) > 1:
+            response['plot_ids'] = [plot.id for plot in plots]
+        return Response(response)
         
     except Exception as e:
-        print(f"🔥 EXCEPTION: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("sensor_add failed", extra={'plot_id': plot_id})
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
+@csrf_exempt
+@require_POST
+async def sensor_add_async(request):
+    """
+    Version async de sensor_add pour les passerelles (ASGI).
+    Valide sans bloquer, confie l'écriture au writer batché et répond 202.
+    """
+    try:
+        # Clé de passerelle uniquement : pas de JWT sur cette vue Django simple
+        key = gateway_key(request)
+        caller = authenticate_caller(key, credentials=await aget_credentials() if key else None)
+        data = json.loads(request.body)
+        parsed = parse_batch_payload(data)
+        plots = await aauthorized_plots(caller, [entry[0] for entry in parsed])
+    except IngestionError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    for plot, (_, readings, _) in zip(plots, parsed):
+        if readings:
+            writer.submit(plot, readings)
+    
+    response = {
+        'status': 'accepted',
+        'accepted': sum(len(readings) for _, readings, _ in parsed),
+        'rejected': sum(len(rejected) for _, _, rejected in parsed),
+        'plot_id': parsed[0][0] if len(parsed) == 1 else None
+    }
+    if len(parsed) > 1:
+        response['plot_ids'] = [plot.id for plot in plots]
+    return JsonResponse(response, status=202)
+
+
 # ============================================================================
-# 3. VUES EXISTANTES (INCHANGÉES)
+# 3. TABLEAU DE BORD
 # ============================================================================
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def dashboard_snapshot(request):
+    """
+    Tout ce que la page Dashboard affiche en une requête :
+    plots (avec latest_readings), alert_summary, recent_alerts
+    """
+    return Response(get_snapshot(request.user))
+
+
+# ============================================================================
+# 4. DÉRIVE DES ENTRÉES DU MODÈLE
+# ============================================================================
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def drift_report(request):
+    """
+    PSI / KS des capteurs de chaque parcelle de l'utilisateur sur les
+    derniers jours, par rapport aux données d'entraînement du modèle
+    """
+    reference = drift.DriftReference.load(DRIFT_REFERENCE_FILE)
+    if reference is None:
+        return Response({'error': 'No drift reference, train the model first'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        days = int(request.query_params.get('days', drift.WINDOW_DAYS))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= drift.WINDOW_DAYS:
+        return Response({'error': f'days must be between 1 and {drift.WINDOW_DAYS}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    plots = list(Plot.objects.owned_by(request.user).order_by('pk').values_list('pk', 'name'))
+    return Response(drift.drift_report(plots, reference, days))
+
+
+# ============================================================================
+# 5. PRÉVISION DE L'HUMIDITÉ DU SOL
+# ============================================================================
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def moisture_forecast(request):
+    """
+    Humidité du sol prévue à hours heures pour chaque parcelle de
+    l'utilisateur, avec la demi-largeur de l'intervalle à 90 %
+    """
+    try:
+        hours = float(request.query_params.get('hours', HORIZON_HOURS))
+    except ValueError:
+        hours = 0
+    if not 0 < hours <= 48:
+        return Response({'error': 'hours must be between 0 and 48'}, status=status.HTTP_400_BAD_REQUEST)
+    names = dict(Plot.objects.owned_by(request.user).values_list('pk', 'name'))
+    forecast = forecast_moisture(names)
+    predicted = forecast.predict(hours)
+    interval = forecast.interval(hours)
+
+    def number(value):
+        return None if value != value else round(float(value), 2)
+
+    return Response({'hours': hours, 'plots': [
+        {'plot_id': int(plot_id), 'plot_name': names[int(plot_id)], 'last': number(forecast.last[i]),
+         'predicted': number(predicted[i]), 'interval': number(interval[i]), 'points': int(forecast.points[i])}
+        for i, plot_id in enumerate(forecast.plot_ids)
+    ]})
+
+
+# ============================================================================
+# 6. VUES EXISTANTES
+# Listes limitées aux données de l'utilisateur : filtre propriétaire joint
+# en SQL (OwnedQuerySet), aucun contrôle par ligne
+# ============================================================================
+
+class OwnedListMixin:
+    """Scope queryset to the rows owned by request.user (all rows for admins)"""
+
+    def get_queryset(self):
+        return super().get_queryset().owned_by(self.request.user)
+
+
 class SensorReadingCreateView(generics.CreateAPIView):
     queryset = SensorReading.objects.all()
     serializer_class = SensorReadingSerializer
-    permission_classes = [AllowAny]
+    permission_classes = [IsAuthenticated]
 
+    def perform_create(self, serializer):
+        try:
+            plot = get_plot_info(serializer.validated_data['plot'].id)
+            authorize_plots(self.request.user, [plot])
+        except IngestionError as e:
+            raise PermissionDenied(e.message)
+        serializer.save()
 
-class SensorReadingListView(generics.ListAPIView):
+
+class SensorReadingListView(OwnedListMixin, generics.ListAPIView):
     queryset = SensorReading.objects.all().order_by("-timestamp")
     serializer_class = SensorReadingSerializer
-    permission_classes = [AllowAny]
+    permission_classes = [IsAuthenticated]
 
     filter_backends = [
         DjangoFilterBackend,
@@ -441,10 +470,10 @@ class SensorReadingListView(generics.ListAPIView):
     ordering = ["-timestamp"]
 
 
-class AnomalyEventListView(generics.ListAPIView):
+class AnomalyEventListView(OwnedListMixin, generics.ListAPIView):
     queryset = AnomalyEvent.objects.all().order_by("-detected_at")
     serializer_class = AnomalyEventSerializer
-    permission_classes = [AllowAny]
+    permission_classes = [IsAuthenticated]
 
     filter_backends = [
         DjangoFilterBackend,
@@ -453,15 +482,18 @@ class AnomalyEventListView(generics.ListAPIView):
     ]
 
     filterset_fields = ["plot", "severity"]
-    search_fields = ["anomaly_type", "details"]
+    search_fields = ["anomaly_type", "description"]
     ordering_fields = ["detected_at", "severity"]
     ordering = ["-detected_at"]
 
 
-class AgentRecommendationListView(generics.ListAPIView):
+class AgentRecommendationListView(ConditionalListMixin, OwnedListMixin, generics.ListAPIView):
     queryset = AgentRecommendation.objects.all().order_by("-generated_at")
     serializer_class = AgentRecommendationSerializer
-    permission_classes = [AllowAny]
+    permission_classes = [IsAuthenticated]
+
+    def version_stamp(self):
+        return self.get_queryset().aggregate(count=Count('id'), updated=Max('updated_at'))
 
     filter_backends = [
         DjangoFilterBackend,
@@ -473,3 +505,22 @@ class AgentRecommendationListView(generics.ListAPIView):
     search_fields = ["recommended_action", "explanation_text"]
     ordering_fields = ["generated_at", "confidence"]
     ordering = ["-generated_at"]
+
+
+class DailyAgronomyListView(ConditionalListMixin, OwnedListMixin, generics.ListAPIView):
+    """GDD, ET0 et bilan hydrique journaliers, matérialisés par update_agronomy"""
+    queryset = DailyAgronomy.objects.all().order_by("plot", "-day")
+    serializer_class = DailyAgronomySerializer
+    permission_classes = [IsAuthenticated]
+
+    def version_stamp(self):
+        return self.get_queryset().aggregate(count=Count('id'), updated=Max('updated_at'))
+
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.OrderingFilter,
+    ]
+
+    filterset_fields = {"plot": ["exact"], "day": ["exact", "gte", "lte"]}
+    ordering_fields = ["day", "gdd_cumulative", "water_balance_cumulative"]
+    ordering = ["plot", "-day"]
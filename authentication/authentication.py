@@ -0,0 +1,104 @@
+"""
+JWT authentication without a user query per request
+
+JWT_AUTH_MODE = 'cached' (default): users are loaded once and kept in an
+in-process cache for AUTH_USER_CACHE_TTL seconds, dropped when the user is
+saved or deleted in this process.
+
+JWT_AUTH_MODE = 'stateless': request.user is built from the id, role and
+username claims of the access token. Users changed in this process fall
+back to the cached lookup while their token still has the old role; in
+other processes the old role lasts until the access token expires, since
+refreshing re-reads it (see tokens.RoleTokenRefreshSerializer).
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import CustomUser
+from .tokens import ROLE_CLAIM, USERNAME_CLAIM
+
+MODE = getattr(settings, 'JWT_AUTH_MODE', 'cached')
+USER_CACHE_TTL = getattr(settings, 'AUTH_USER_CACHE_TTL', 30)
+
+_users = {}
+# user id -> (expiry, role, is_active) after a change seen by this process,
+# kept while access tokens issued before the change can still be valid
+_changed = {}
+_pruned_at = float('-inf')
+_lock = threading.Lock()
+
+
+def _prune(now):
+    """Drop expired entries of both caches, at most once per USER_CACHE_TTL, under _lock"""
+    global _pruned_at
+    if now - _pruned_at < USER_CACHE_TTL:
+        return
+    _pruned_at = now
+    for cache in (_users, _changed):
+        for user_id in [user_id for user_id, entry in cache.items() if entry[0] <= now]:
+            del cache[user_id]
+
+
+def cached_user(user_id):
+    """User row, from the in-process cache while it is fresh"""
+    entry = _users.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    try:
+        user = CustomUser.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except CustomUser.DoesNotExist:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    now = time.monotonic()
+    with _lock:
+        _prune(now)
+        _users[user_id] = (now + USER_CACHE_TTL, user)
+    return user
+
+
+def user_changed(user, deleted=False):
+    """Drop the cached row and remember the new role, called from signals"""
+    now = time.monotonic()
+    expiry = now + api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    with _lock:
+        _prune(now)
+        _users.pop(user.pk, None)
+        _changed[user.pk] = (expiry, None, False) if deleted else (expiry, user.role, user.is_active)
+
+
+def clear_user_cache():
+    global _pruned_at
+    with _lock:
+        _pruned_at = float('-inf')
+        _users.clear()
+        _changed.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with the user lookup served from claims or the cache"""
+
+    mode = MODE
+
+    def get_user(self, validated_token):
+        try:
+            user_id = CustomUser._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if self.mode == 'stateless' and ROLE_CLAIM in validated_token:
+            role = validated_token[ROLE_CLAIM]
+            if _changed.get(user_id, (None, role, True))[1:] == (role, True):
+                # Instance non sauvegardée : suffit pour les filtres et les FK
+                return CustomUser(pk=user_id, username=validated_token.get(USERNAME_CLAIM, ''),
+                                  role=role, is_active=True)
+
+        user = cached_user(user_id)
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
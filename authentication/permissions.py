@@ -17,13 +17,17 @@ class IsAdmin(permissions.BasePermission):
 class IsOwnerOrAdmin(permissions.BasePermission):
     """
     Object-level permission to only allow owners of an object or admins to access it.
-    Assumes the model instance has an `owner` attribute (e.g. ForeignKey to CustomUser).
+    Models with an OWNER_FIELD lookup (monitoring.models.OwnedQuerySet) are
+    checked by id, directly for 'owner'/'user' and with one query for
+    deeper lookups. List views should filter with owned_by() instead.
     """
     def has_object_permission(self, request, view, obj):
         if not request.user or not request.user.is_authenticated:
             return False
         if getattr(request.user, 'role', None) == 'admin':
             return True
-        # fallback: compare owner attribute (adapt if your models use a different field name)
-        owner = getattr(obj, 'owner', None)
-        return owner == request.user
+        owner_field = getattr(obj, 'OWNER_FIELD', 'owner')
+        if '__' not in owner_field:
+            # compare ids, no query for the owner row
+            return getattr(obj, f'{owner_field}_id', None) == request.user.pk
+        return type(obj)._default_manager.owned_by(request.user).filter(pk=obj.pk).exists()
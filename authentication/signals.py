@@ -0,0 +1,14 @@
+# authentication/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import user_changed
+from .models import CustomUser
+
+@receiver(post_save, sender=CustomUser)
+def custom_user_saved(sender, instance, **kwargs):
+    """Role or active flag may have changed, stop trusting the cache and old claims"""
+    user_changed(instance)
+
+@receiver(post_delete, sender=CustomUser)
+def custom_user_deleted(sender, instance, **kwargs):
+    user_changed(instance, deleted=True)
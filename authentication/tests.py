@@ -1,3 +1,106 @@
+import time
+from unittest.mock import patch
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from authentication import authentication
+from authentication.authentication import CachedJWTAuthentication, clear_user_cache
+from authentication.models import CustomUser
+from authentication.tokens import ROLE_CLAIM, tokens_for_user
+from monitoring.models import Plot, SensorReading
+
+
+class RoleChangeTests(TestCase):
+    """A role change reaches the permission checks of tokens issued before it"""
+
+    def setUp(self):
+        clear_user_cache()
+        self.user = CustomUser.objects.create_user('farmer', password='x', role='farmer')
+        other = CustomUser.objects.create_user('other', password='x', role='farmer')
+        for owner in (self.user, other):
+            plot = Plot.objects.create(user=owner, name='p', location='l', crop_type='wheat', size=1)
+            SensorReading.objects.create(plot=plot, sensor_type='soil_moisture', value=40, unit='percentage')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.user).access_token}')
+
+    def readings_seen(self):
+        response = self.client.get('/api/sensor-readings/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['count']
+
+    def promote(self):
+        self.user.role = 'admin'
+        self.user.save()
+
+    def test_cached_mode(self):
+        self.assertEqual(self.readings_seen(), 1)
+        self.promote()
+        self.assertEqual(self.readings_seen(), 2)
+
+    def test_stateless_mode_does_not_trust_the_old_role_claim(self):
+        with patch.object(CachedJWTAuthentication, 'mode', 'stateless'):
+            self.assertEqual(self.readings_seen(), 1)
+            self.promote()
+            self.assertEqual(self.readings_seen(), 2)
+
+
+class TokenRefreshTests(TestCase):
+    """Refresh re-reads the role and keeps simplejwt's rotation"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('farmer', password='x', role='farmer')
+        self.refresh = tokens_for_user(self.user)
+        self.user.role = 'admin'
+        self.user.save()
+
+    def post_refresh(self):
+        response = APIClient().post('/api/auth/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_access_token_carries_the_new_role(self):
+        data = self.post_refresh()
+        self.assertNotIn('refresh', data)
+        self.assertEqual(AccessToken(data['access'])[ROLE_CLAIM], 'admin')
+
+    def test_rotated_refresh_token_carries_the_new_role(self):
+        with patch.object(api_settings, 'ROTATE_REFRESH_TOKENS', True):
+            data = self.post_refresh()
+        rotated = RefreshToken(data['refresh'])
+        self.assertNotEqual(rotated['jti'], self.refresh['jti'])
+        self.assertEqual(rotated[ROLE_CLAIM], 'admin')
+        self.assertEqual(AccessToken(data['access'])[ROLE_CLAIM], 'admin')
+
+    def test_token_without_user_id_is_refused(self):
+        refresh = RefreshToken()
+        response = APIClient().post('/api/auth/refresh/', {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deleted_user_is_refused(self):
+        self.user.delete()
+        response = APIClient().post('/api/auth/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class UserCachePruneTests(TestCase):
+    """Expired entries leave the user cache and the change log"""
+
+    def setUp(self):
+        clear_user_cache()
+        self.user = CustomUser.objects.create_user('farmer', password='x', role='farmer')
+
+    def tearDown(self):
+        clear_user_cache()
 
-# Create your tests here.
+    def test_expired_entries_are_pruned(self):
+        authentication.cached_user(self.user.pk)
+        self.assertIn(self.user.pk, authentication._changed)
+        other = CustomUser.objects.create_user('other', password='x')
+        later = time.monotonic() + api_settings.ACCESS_TOKEN_LIFETIME.total_seconds() + authentication.USER_CACHE_TTL
+        with patch.object(authentication.time, 'monotonic', return_value=later):
+            authentication.cached_user(other.pk)
+        self.assertEqual(list(authentication._users), [other.pk])
+        self.assertEqual(list(authentication._changed), [])
@@ -0,0 +1,46 @@
+"""
+JWT helpers
+Access tokens carry the user's role and username so the stateless auth
+mode can build request.user without a query
+"""
+
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CustomUser
+
+ROLE_CLAIM = 'role'
+USERNAME_CLAIM = 'username'
+
+
+def tokens_for_user(user):
+    """Refresh token with the role claims, copied to its access tokens"""
+    refresh = RefreshToken.for_user(user)
+    refresh[ROLE_CLAIM] = user.role
+    refresh[USERNAME_CLAIM] = user.username
+    return refresh
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """Re-read the role on refresh so a role change reaches new access tokens"""
+
+    def validate(self, attrs):
+        user_id = self.token_class(attrs['refresh']).get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken('Token contained no recognizable user identification')
+        # Lu avant super() : un utilisateur supprimé y lèverait DoesNotExist
+        row = CustomUser.objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}, is_active=True
+        ).values_list('role', 'username').first()
+        if row is None:
+            raise InvalidToken('User not found or inactive')
+        # super() garde la rotation et la mise en liste noire des refresh tokens
+        data = super().validate(attrs)
+        refresh = self.token_class(data.get('refresh', attrs['refresh']))
+        refresh[ROLE_CLAIM], refresh[USERNAME_CLAIM] = row
+        data['access'] = str(refresh.access_token)
+        if 'refresh' in data:
+            data['refresh'] = str(refresh)
+        return data
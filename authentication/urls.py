@@ -1,21 +1,11 @@
-
-from django.urls import path, include
-from rest_framework.routers import DefaultRouter
-from .views import AuthViewSet
-
-router = DefaultRouter()
-router.register(r'', AuthViewSet, basename='auth')
-
-urlpatterns = [
-    path('', include(router.urls)),
-]
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from . import views
+from .tokens import RoleTokenRefreshSerializer
 
 urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('profile/', views.user_profile, name='profile'),
-    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('refresh/', TokenRefreshView.as_view(serializer_class=RoleTokenRefreshSerializer), name='token_refresh'),
 ]
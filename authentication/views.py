@@ -6,8 +6,9 @@ from django.shortcuts import render
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import cached_user
 from .serializers import LoginSerializer, RegisterSerializer, UserSerializer
+from .tokens import tokens_for_user
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -20,7 +21,7 @@ def login_view(request):
     serializer = LoginSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     user = serializer.validated_data['user']
-    refresh = RefreshToken.for_user(user)
+    refresh = tokens_for_user(user)
     return Response({
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -37,7 +38,7 @@ def register_view(request):
     serializer = RegisterSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     user = serializer.save()
-    refresh = RefreshToken.for_user(user)
+    refresh = tokens_for_user(user)
     return Response({
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -51,5 +52,6 @@ def user_profile(request):
     GET /api/auth/profile/
     returns current user info
     """
-    return Response(UserSerializer(request.user).data)
+    # request.user may be built from token claims only, serialize the full row
+    return Response(UserSerializer(cached_user(request.user.pk)).data)
 
@@ -0,0 +1,110 @@
+"""
+Logging helpers used by the LOGGING setting
+
+Request threads only put records on an in-memory queue, a QueueListener
+thread formats them and does the file/console I/O. Debug and info records
+can be sampled so hot paths stay cheap under load.
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has, anything else was passed with extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below min_level, always keep the others"""
+
+    def __init__(self, rate=1.0, min_level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.min_level = logging._checkLevel(min_level)
+
+    def filter(self, record):
+        return record.levelno >= self.min_level or self.rate >= 1 or random.random() < self.rate
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that forwards records to other configured handlers through
+    its own QueueListener, started on the first record
+
+    Targets are given as 'cfg://handlers.<name>' references, dictConfig
+    configures handlers in name order so they must sort before this one
+    """
+
+    def __init__(self, handlers=(), respect_handler_level=True):
+        super().__init__(queue.SimpleQueue())
+        # Indexing (not iterating) makes dictConfig resolve the references
+        self.targets = [handlers[i] for i in range(len(handlers))]
+        for target in self.targets:
+            if not isinstance(target, logging.Handler):
+                raise ValueError(f'{target!r} is not a configured handler')
+        self.respect_handler_level = respect_handler_level
+        self.listener = None
+        self._start_lock = threading.Lock()
+
+    def _start_listener(self):
+        with self._start_lock:
+            if self.listener is not None:
+                return
+            listener = logging.handlers.QueueListener(
+                self.queue, *self.targets, respect_handler_level=self.respect_handler_level
+            )
+            listener.start()
+            self.listener = listener
+
+    def prepare(self, record):
+        """
+        Merge args into the message in the calling thread but keep extra
+        fields and the traceback separate for the target formatters
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        if self.listener is None:
+            self._start_listener()
+        super().emit(record)
+
+    def close(self):
+        # Called by logging.shutdown() before the target handlers close
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
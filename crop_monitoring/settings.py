@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'monitoring.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -161,7 +162,7 @@ REST_FRAMEWORK = {
 
     # JWT Authentication
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ),
 
     # Permissions
@@ -176,6 +177,12 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ),
 
+    # JSONRenderer dont le temps est compté par le profiling (Server-Timing)
+    'DEFAULT_RENDERER_CLASSES': (
+        'monitoring.profiling.ProfiledJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+
     # Pagination
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -209,31 +216,67 @@ except ImportError:
 # DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
 # Configuration des logs (optionnel mais recommandé)
+# Les loggers n'écrivent que dans une file en mémoire ('queue'), un thread
+# QueueListener fait les écritures fichier/console. Les logs DEBUG/INFO du
+# chemin d'ingestion sont échantillonnés (LOG_SAMPLE_RATE).
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'crop_monitoring.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampled': {
+            '()': 'crop_monitoring.log.SamplingFilter',
+            'rate': LOG_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'debug.log',
+            'formatter': 'structured',
         },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
         },
+        'queue': {
+            '()': 'crop_monitoring.log.QueueingHandler',
+            'handlers': ['cfg://handlers.file', 'cfg://handlers.console'],
+        },
+        'queue_sampled': {
+            '()': 'crop_monitoring.log.QueueingHandler',
+            'handlers': ['cfg://handlers.file', 'cfg://handlers.console'],
+            'filters': ['sampled'],
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'authentication': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': True,
         },
+        'api': {
+            'handlers': ['queue_sampled'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'monitoring': {
+            'handlers': ['queue_sampled'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 AUTH_USER_MODEL = 'authentication.CustomUser'
@@ -243,3 +286,91 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
     'authorization',
 ]
 
+
+# Batch analysis: always a background job, plots analyzed and alerts written per chunk
+BATCH_ANALYSIS_CHUNK_SIZE = 500
+# Jobs not started, or without a heartbeat, for this many seconds were interrupted (worker restart)
+BATCH_ANALYSIS_TIMEOUT = 1800
+
+# Live updates (api/stream/): events buffered per client before the oldest are
+# dropped and the client is asked to resync, and keepalive interval
+REALTIME_QUEUE_SIZE = 100
+REALTIME_KEEPALIVE_SECONDS = 15
+
+# Async ingestion (api/sensors/async/): readings per bulk insert and max wait
+INGESTION_BATCH_SIZE = 500
+INGESTION_FLUSH_INTERVAL = 0.05
+
+# Adresses autorisées à lire /metrics (scraper Prometheus local)
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')]
+
+# Profilage des requêtes (Server-Timing + rapport /metrics/slow-endpoints),
+# désactivé par défaut, échantillonné quand il est actif
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.1'))
+PROFILING_WINDOW = 200
+
+# Cache (snapshots du Dashboard). Les invalidations (lectures, alertes,
+# parcelles) passent par ce cache : il doit être partagé par tous les
+# workers. LocMem est propre à chaque processus et ne convient qu'à un
+# worker unique ; sinon les autres servent un Dashboard périmé jusqu'à
+# DASHBOARD_CACHE_TIMEOUT. Avec plusieurs workers, définir CACHE_DIR (cache
+# fichier) ou un backend partagé (Redis, Memcached)
+if os.getenv('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# Tables compilées en mémoire (seuils, catalogue de recommandations) :
+# chaque worker compare leur empreinte (nombre de lignes, dernière
+# modification) au plus toutes les CACHE_STAMP_INTERVAL secondes
+CACHE_STAMP_INTERVAL = 5
+
+# Authentification JWT sans requête utilisateur par appel :
+# 'cached' (utilisateurs en cache AUTH_USER_CACHE_TTL secondes) ou
+# 'stateless' (utilisateur construit depuis les claims du token)
+JWT_AUTH_MODE = os.getenv('JWT_AUTH_MODE', 'cached')
+AUTH_USER_CACHE_TTL = 30
+
+# Passerelles capteurs : clés API vérifiées depuis une table en mémoire,
+# rechargée au plus tard après GATEWAY_CREDENTIALS_TTL secondes. Les
+# requêtes d'ingestion anonymes sont refusées sauf INGESTION_ALLOW_ANONYMOUS.
+GATEWAY_CREDENTIALS_TTL = 60
+# Propriétaire de chaque parcelle relu au plus tard après ce délai,
+# au plus INGESTION_PLOT_CACHE_SIZE parcelles gardées par processus
+INGESTION_PLOT_CACHE_TTL = 60
+INGESTION_PLOT_CACHE_SIZE = 10000
+INGESTION_ALLOW_ANONYMOUS = os.getenv('INGESTION_ALLOW_ANONYMOUS', 'False').lower() == 'true'
+
+# Modèle d'anomalies chargé à la première utilisation (monitoring.scoring) ;
+# ML_WARMUP le charge au démarrage des workers WSGI/ASGI
+ML_WARMUP = os.getenv('ML_WARMUP', 'False').lower() == 'true'
+
+# Dérive des entrées du modèle (monitoring.drift) : histogrammes conservés
+# DRIFT_WINDOW_DAYS jours ; check_drift réentraîne quand le PSI global
+# atteint DRIFT_PSI_ALERT ou qu'une part DRIFT_RETRAIN_PLOT_SHARE des
+# parcelles dérive
+DRIFT_WINDOW_DAYS = 7
+DRIFT_PSI_ALERT = 0.25
+DRIFT_RETRAIN_PLOT_SHARE = 0.2
+
+# Prévision de l'humidité du sol (monitoring.forecasting) : forecast_alerts
+# alerte les parcelles dont la prévision sort de leur plage sous
+# FORECAST_HORIZON_HOURS heures
+FORECAST_HORIZON_HOURS = 12
+FORECAST_CHUNK_SIZE = 2000
+
+# Indices agronomiques journaliers (monitoring.agronomy) : latitude des
+# parcelles sans coordonnées et altitude utilisées pour l'ET0 FAO-56
+AGRONOMY_DEFAULT_LATITUDE = 36.8
+AGRONOMY_ELEVATION = 0.0
@@ -8,6 +8,8 @@ urlpatterns = [
 ]
 
 from django.urls import path, include 
+from monitoring.metrics import metrics_view
+from monitoring.profiling import slow_endpoints_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -18,4 +20,8 @@ urlpatterns = [
     # URLs de l'API existante
     path('api/', include('api.urls', namespace='api')),  
     path('api/', include('monitoring.urls')),
+    
+    # Métriques Prometheus (scraper local)
+    path('metrics', metrics_view, name='metrics'),
+    path('metrics/slow-endpoints', slow_endpoints_view, name='slow-endpoints'),
 ]
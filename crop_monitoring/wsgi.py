@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crop_monitoring.settings')
 
 application = get_wsgi_application()
+
+# Chargement du modèle d'anomalies au démarrage du worker plutôt qu'à la première requête
+from django.conf import settings  # noqa: E402
+
+if settings.ML_WARMUP:
+    from monitoring.scoring import scoring
+    scoring.warm_up()
@@ -5,6 +5,7 @@ export default function Alerts() {
   const [alerts, setAlerts] = useState([]);
   const [filterSeverity, setFilterSeverity] = useState('all');
   const [loading, setLoading] = useState(true);
+  const [job, setJob] = useState(null);
 
   useEffect(() => {
     fetchAlerts();
@@ -27,11 +28,41 @@ export default function Alerts() {
     }
   };
 
+  const runAnalysis = async () => {
+    try {
+      const finished = await alertService.runBatchAnalysis(setJob);
+      if (finished.status === 'completed') fetchAlerts();
+    } catch (err) {
+      console.error('Error:', err);
+      setJob(null);
+    }
+  };
+
+  const analyzing = job && !['completed', 'failed'].includes(job.status);
+
   if (loading) return <div className="text-center py-10">Loading...</div>;
 
   return (
     <div className="space-y-6">
-      <h1 className="text-3xl font-bold">Alerts</h1>
+      <div className="flex items-center justify-between">
+        <h1 className="text-3xl font-bold">Alerts</h1>
+        <div className="flex items-center gap-3">
+          {job && (
+            <span className="text-sm text-gray-600">
+              {job.status === 'failed'
+                ? `Analysis failed: ${job.error}`
+                : `Analysis ${job.status}: ${job.plots_analyzed}/${job.plots_total} plots, ${job.alerts_created} alerts`}
+            </span>
+          )}
+          <button
+            onClick={runAnalysis}
+            disabled={analyzing}
+            className="px-4 py-2 rounded-lg font-medium bg-green-600 text-white disabled:opacity-50"
+          >
+            {analyzing ? 'Analyzing...' : 'Analyze all plots'}
+          </button>
+        </div>
+      </div>
 
       <div className="flex gap-2">
         {['all', 'critical', 'high', 'medium', 'low'].map((severity) => (
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
-import { plotService } from '../services/plotService';
-import { alertService } from '../services/alertService';
+import { dashboardService } from '../services/dashboardService';
+import { streamService } from '../services/streamService';
 
 export default function Dashboard() {
   const [plots, setPlots] = useState([]);
@@ -10,20 +10,37 @@ export default function Dashboard() {
 
   useEffect(() => {
     fetchData();
+    return streamService.subscribe({
+      alerts: applyNewAlerts,
+      resync: fetchData,
+    });
   }, []);
 
+  const applyNewAlerts = (newAlerts) => {
+    setAlerts((prev) => [...newAlerts, ...prev].slice(0, 5));
+    setAlertSummary((prev) => {
+      if (!prev) return prev;
+      const next = {
+        ...prev,
+        total_alerts: prev.total_alerts + newAlerts.length,
+        by_type: { ...prev.by_type },
+      };
+      newAlerts.forEach((alert) => {
+        next[alert.severity] = (next[alert.severity] || 0) + 1;
+        next.by_type[alert.alert_type] = (next.by_type[alert.alert_type] || 0) + 1;
+      });
+      return next;
+    });
+  };
+
   const fetchData = async () => {
     try {
       setLoading(true);
-      const [plotsRes, alertsRes, summaryRes] = await Promise.all([
-        plotService.getAll(),
-        alertService.getRecent(),
-        alertService.getSummary(),
-      ]);
+      const { data } = await dashboardService.getSnapshot();
 
-      setPlots(plotsRes.data);
-      setAlerts(alertsRes.data.slice(0, 5));
-      setAlertSummary(summaryRes.data);
+      setPlots(data.plots);
+      setAlerts(data.recent_alerts);
+      setAlertSummary(data.alert_summary);
     } catch (err) {
       console.error('Error:', err);
     } finally {
@@ -1,5 +1,11 @@
 import apiClient from './api';
 
+// Intervalle de polling des jobs d'analyse (batch_analyze répond 202)
+const JOB_POLL_INTERVAL = 2000;
+const FINISHED = ['completed', 'failed'];
+
+const wait = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
 export const alertService = {
   getAll: () =>
     apiClient.get('/alerts/'),
@@ -21,4 +27,19 @@ export const alertService = {
   
   batchAnalyze: () =>
     apiClient.post('/analysis/batch_analyze/'),
+  
+  getJobStatus: (jobId) =>
+    apiClient.get(`/analysis/jobs/${jobId}/`),
+
+  // Start a batch analysis and poll its job until it is finished, onProgress gets each status
+  runBatchAnalysis: async (onProgress) => {
+    let { data: job } = await alertService.batchAnalyze();
+    onProgress?.(job);
+    while (!FINISHED.includes(job.status)) {
+      await wait(JOB_POLL_INTERVAL);
+      ({ data: job } = await alertService.getJobStatus(job.job_id));
+      onProgress?.(job);
+    }
+    return job;
+  },
 };
\ No newline at end of file
@@ -0,0 +1,7 @@
+import apiClient from './api';
+
+export const dashboardService = {
+  // plots (with latest_readings), alert_summary and recent_alerts in one call
+  getSnapshot: () =>
+    apiClient.get('/dashboard/'),
+};
@@ -0,0 +1,16 @@
+import apiClient from './api';
+
+export const streamService = {
+  // Opens the live stream, handlers are keyed by event name
+  // (readings, alerts, resync). Returns a function that closes it.
+  subscribe: (handlers) => {
+    const token = localStorage.getItem('access_token');
+    const source = new EventSource(
+      `${apiClient.defaults.baseURL}/stream/?token=${encodeURIComponent(token)}`
+    );
+    Object.entries(handlers).forEach(([event, handler]) =>
+      source.addEventListener(event, (e) => handler(e.data ? JSON.parse(e.data) : null))
+    );
+    return () => source.close();
+  },
+};
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FarmProfile, FieldPlot, SensorReading, AnomalyEvent, AgentRecommendation, WeatherData, IrrigationLog, HarvestRecord
+from .models import FarmProfile, FieldPlot, SensorReading, AnomalyEvent, AgentRecommendation, WeatherData, IrrigationLog, HarvestRecord, ThresholdProfile, RecommendationSet, SensorGateway, DailyAgronomy
 
 @admin.register(FarmProfile)
 class FarmProfileAdmin(admin.ModelAdmin):
@@ -40,7 +40,36 @@ class IrrigationLogAdmin(admin.ModelAdmin):
     list_display = ['plot', 'irrigation_type', 'water_volume', 'irrigated_at']
     list_filter = ['irrigation_type']
 
+@admin.register(DailyAgronomy)
+class DailyAgronomyAdmin(admin.ModelAdmin):
+    """Materialized by the update_agronomy command"""
+    list_display = ['plot', 'day', 'gdd', 'gdd_cumulative', 'et0', 'water_balance_cumulative']
+    list_filter = ['day']
+    search_fields = ['plot__name']
+
 @admin.register(HarvestRecord)
 class HarvestRecordAdmin(admin.ModelAdmin):
     list_display = ['plot', 'harvest_date', 'yield_amount', 'quality_rating']
-    list_filter = ['harvest_date']
\ No newline at end of file
+    list_filter = ['harvest_date']
+
+@admin.register(ThresholdProfile)
+class ThresholdProfileAdmin(admin.ModelAdmin):
+    list_display = ['crop_type', 'growth_stage', 'alert_type', 'min_value', 'max_value', 'critical_min', 'critical_max']
+    list_filter = ['crop_type', 'growth_stage', 'alert_type']
+
+@admin.register(RecommendationSet)
+class RecommendationSetAdmin(admin.ModelAdmin):
+    list_display = ['alert_type', 'direction']
+    list_filter = ['alert_type', 'direction']
+
+@admin.register(SensorGateway)
+class SensorGatewayAdmin(admin.ModelAdmin):
+    """Keys are issued with the create_gateway command"""
+    list_display = ['name', 'owner', 'key_prefix', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'key_prefix']
+    filter_horizontal = ['plots']
+    readonly_fields = ['key_prefix']
+
+    def has_add_permission(self, request):
+        return False
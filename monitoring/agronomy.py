@@ -0,0 +1,258 @@
+"""
+Daily agronomic indices per field plot
+
+WeatherData and IrrigationLog rows are folded into one DailyAgronomy row
+per plot and UTC day: growing degree days with the base and cap
+temperatures of the plot's crop type, FAO-56 Penman-Monteith reference
+evapotranspiration (ET0), crop evapotranspiration (Kc x ET0) and the
+water balance rainfall + irrigation - ETc. Cumulative GDD and water
+balance run from the planting date.
+
+Materialization is incremental: each run recomputes a plot from its last
+stored day (which may have been partial) onwards and carries the
+cumulative values of the days before it. Raw rows are read once per plot
+batch and every index is computed on arrays of (plot, day) rows.
+
+Units: temperature in °C, humidity in %, rainfall in mm since the
+previous observation, wind speed in m/s at 2 m and solar radiation in
+W/m² (averaged over the day's observations). Days without WeatherData
+are not materialized, irrigation on those days is not counted.
+"""
+
+from datetime import date, datetime, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+
+from monitoring.features import EPOCH_SQL
+from monitoring.models import DailyAgronomy, FieldPlot, IrrigationLog, WeatherData
+
+# Température de base, plafond, Kc initial et Kc de mi-saison (FAO-56, tableau 12)
+CROP_PARAMETERS = {
+    'wheat': (0.0, 30.0, 0.3, 1.15),
+    'corn': (10.0, 30.0, 0.3, 1.2),
+    'soybean': (10.0, 30.0, 0.4, 1.15),
+    'rice': (10.0, 30.0, 1.05, 1.2),
+    'vegetables': (10.0, 30.0, 0.6, 1.05),
+    'fruits': (7.0, 30.0, 0.6, 0.95),
+}
+DEFAULT_PARAMETERS = (10.0, 30.0, 0.5, 1.0)
+# Kc initial jusqu'à la fin du stade plantule (api.thresholds)
+INITIAL_STAGE_DAYS = 21
+
+DEFAULT_LATITUDE = getattr(settings, 'AGRONOMY_DEFAULT_LATITUDE', 36.8)
+ELEVATION = getattr(settings, 'AGRONOMY_ELEVATION', 0.0)
+
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+WEATHER_FIELDS = ['temperature', 'humidity', 'rainfall', 'wind_speed', 'solar_radiation']
+STEFAN_BOLTZMANN = 4.903e-9  # MJ K⁻⁴ m⁻² jour⁻¹
+W_TO_MJ_PER_DAY = 0.0864
+
+
+def growing_degree_days(temp_min, temp_max, base, cap):
+    """Daily GDD with both temperatures clipped to [base, cap]"""
+    low = np.clip(temp_min, base, cap)
+    high = np.clip(temp_max, base, cap)
+    return (low + high) / 2 - base
+
+
+def saturation_vapour_pressure(temp):
+    """e°(T) in kPa (FAO-56 eq. 11)"""
+    return 0.6108 * np.exp(17.27 * temp / (temp + 237.3))
+
+
+def extraterrestrial_radiation(latitude, day_of_year):
+    """Daily Ra in MJ/m² (FAO-56 eq. 21), latitude in degrees"""
+    phi = np.radians(latitude)
+    angle = 2 * np.pi * day_of_year / 365
+    distance = 1 + 0.033 * np.cos(angle)
+    declination = 0.409 * np.sin(angle - 1.39)
+    sunset = np.arccos(np.clip(-np.tan(phi) * np.tan(declination), -1, 1))
+    return 24 * 60 / np.pi * 0.0820 * distance * (
+        sunset * np.sin(phi) * np.sin(declination) + np.cos(phi) * np.cos(declination) * np.sin(sunset)
+    )
+
+
+def reference_et0(temp_min, temp_max, humidity, wind_speed, radiation, latitude, day_of_year,
+                  elevation=ELEVATION):
+    """
+    Daily FAO-56 Penman-Monteith ET0 in mm (eq. 6), radiation in MJ/m²,
+    soil heat flux neglected at the daily step
+    """
+    temp = (temp_min + temp_max) / 2
+    slope = 4098 * saturation_vapour_pressure(temp) / (temp + 237.3) ** 2
+    pressure = 101.3 * ((293 - 0.0065 * elevation) / 293) ** 5.26
+    gamma = 0.000665 * pressure
+    saturation = (saturation_vapour_pressure(temp_min) + saturation_vapour_pressure(temp_max)) / 2
+    actual = np.clip(humidity, 0, 100) / 100 * saturation
+
+    clear_sky = (0.75 + 2e-5 * elevation) * extraterrestrial_radiation(latitude, day_of_year)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relative = np.where(clear_sky > 0, np.minimum(radiation / clear_sky, 1.0), 0.5)
+    net_longwave = STEFAN_BOLTZMANN * ((temp_max + 273.16) ** 4 + (temp_min + 273.16) ** 4) / 2 \
+        * (0.34 - 0.14 * np.sqrt(actual)) * (1.35 * relative - 0.35)
+    net = 0.77 * radiation - net_longwave
+
+    et0 = (0.408 * slope * net + gamma * 900 / (temp + 273) * wind_speed * (saturation - actual)) \
+        / (slope + gamma * (1 + 0.34 * wind_speed))
+    return np.maximum(et0, 0.0)
+
+
+def plot_latitude(coordinates: Optional[str]) -> float:
+    """Latitude from 'lat, lon' coordinates, DEFAULT_LATITUDE when missing or unreadable"""
+    try:
+        return float((coordinates or '').replace(';', ',').split(',')[0])
+    except ValueError:
+        return DEFAULT_LATITUDE
+
+
+def group_cumsum(values, group):
+    """Running sum of values within each group, rows sorted by group"""
+    total = np.cumsum(values)
+    first = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    offsets = total[first] - values[first]
+    return total - np.repeat(offsets, np.diff(np.r_[first, len(values)]))
+
+
+def fetch_rows(model, time_field, fields, plot_ids, start_epoch) -> np.ndarray:
+    """(plot_id, epoch, *fields) rows with epoch >= start_epoch, as a float array"""
+    meta = model._meta
+    quote = connection.ops.quote_name
+    timestamp = quote(meta.get_field(time_field).column)
+    plot = quote(meta.get_field('plot').column)
+    sql = (
+        f'SELECT {plot}, {EPOCH_SQL[connection.vendor].format(timestamp)}, '
+        f'{", ".join(quote(meta.get_field(name).column) for name in fields)} '
+        f'FROM {quote(meta.db_table)} '
+        f'WHERE {plot} IN ({", ".join(["%s"] * len(plot_ids))}) AND {timestamp} >= %s'
+    )
+    start = connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(start_epoch, tz=timezone.utc))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*plot_ids.tolist(), start])
+        rows = cursor.fetchall()
+    return np.array(rows, dtype=float).reshape(-1, 2 + len(fields))
+
+
+def compute_days(plots, start_days, weather, irrigation, gdd_base, balance_base):
+    """
+    DailyAgronomy field values of every (plot, day) with weather, as a
+    dict of arrays. plots holds (id, crop_type, planting_date, size,
+    location_coordinates) rows sorted by id, start_days the first day
+    ordinal recomputed per plot, *_base the cumulative values before it.
+    """
+    plot_ids = np.array([plot[0] for plot in plots], dtype=np.int64)
+    plot_index = np.searchsorted(plot_ids, weather[:, 0].astype(np.int64))
+    days = EPOCH_DAY + np.floor(weather[:, 1] / 86400).astype(np.int64)
+    keep = days >= start_days[plot_index]
+    keys, group = np.unique(np.column_stack([plot_index[keep], days[keep]]), axis=0, return_inverse=True)
+    group = group.reshape(-1)
+    temperature, humidity, rainfall, wind, solar = weather[keep, 2:].T
+
+    count = np.bincount(group, minlength=len(keys))
+    temp_min = np.full(len(keys), np.inf)
+    temp_max = np.full(len(keys), -np.inf)
+    np.minimum.at(temp_min, group, temperature)
+    np.maximum.at(temp_max, group, temperature)
+    mean = {name: np.bincount(group, weights=values, minlength=len(keys)) / count
+            for name, values in (('humidity', humidity), ('wind_speed', wind), ('solar', solar))}
+    rain = np.bincount(group, weights=rainfall, minlength=len(keys))
+
+    # Volumes d'irrigation ramenés en mm sur la surface de la parcelle (1 L/m² = 1 mm)
+    water = np.zeros(len(keys))
+    if len(irrigation) and len(keys):
+        irrigation_index = np.searchsorted(plot_ids, irrigation[:, 0].astype(np.int64))
+        irrigation_days = EPOCH_DAY + np.floor(irrigation[:, 1] / 86400).astype(np.int64)
+        key_codes = keys[:, 0] * 10 ** 7 + keys[:, 1]
+        codes = irrigation_index * 10 ** 7 + irrigation_days
+        position = np.searchsorted(key_codes, codes)
+        found = (position < len(keys)) & (key_codes[np.minimum(position, len(keys) - 1)] == codes)
+        area = np.array([float(plot[3] or 0) for plot in plots]) * 10000
+        litres = irrigation[found, 2]
+        np.add.at(water, position[found], litres / np.maximum(area[irrigation_index[found]], 1.0))
+
+    plot_of, day = keys[:, 0], keys[:, 1]
+    parameters = np.array([CROP_PARAMETERS.get((plot[1] or '').lower(), DEFAULT_PARAMETERS) for plot in plots])
+    base, cap, kc_initial, kc_mid = parameters[plot_of].T
+    planted = np.array([plot[2].toordinal() if plot[2] else EPOCH_DAY for plot in plots])[plot_of]
+    latitude = np.array([plot_latitude(plot[4]) for plot in plots])[plot_of]
+    day_of_year = np.array([date.fromordinal(int(d)).timetuple().tm_yday for d in np.unique(day)])[
+        np.searchsorted(np.unique(day), day)]
+
+    radiation = mean['solar'] * W_TO_MJ_PER_DAY
+    gdd = np.where(day >= planted, growing_degree_days(temp_min, temp_max, base, cap), 0.0)
+    et0 = reference_et0(temp_min, temp_max, mean['humidity'], mean['wind_speed'], radiation, latitude, day_of_year)
+    etc = np.where(day - planted < INITIAL_STAGE_DAYS, kc_initial, kc_mid) * et0
+    balance = np.where(day >= planted, rain + water - etc, 0.0)
+
+    return {
+        'plot_id': plot_ids[plot_of], 'day': day, 'observations': count,
+        'temp_min': temp_min, 'temp_max': temp_max, 'humidity': mean['humidity'],
+        'wind_speed': mean['wind_speed'], 'solar_radiation': radiation, 'rainfall': rain, 'irrigation': water,
+        'gdd': gdd, 'gdd_cumulative': gdd_base[plot_of] + group_cumsum(gdd, plot_of),
+        'et0': et0, 'etc': etc, 'water_balance': balance,
+        'water_balance_cumulative': balance_base[plot_of] + group_cumsum(balance, plot_of),
+    }
+
+
+def materialize(plot_ids: Optional[Iterable[int]] = None, since: Optional[date] = None, plot_batch=500) -> int:
+    """
+    Bring DailyAgronomy up to date for these field plots (default: all),
+    recomputing from their last stored day, or from since when given
+    (e.g. after late WeatherData). Returns the number of rows written.
+    """
+    plots = FieldPlot.objects.order_by('pk')
+    if plot_ids is not None:
+        plots = plots.filter(pk__in=list(plot_ids))
+    plots = list(plots.values_list('pk', 'crop_type', 'planting_date', 'size', 'location_coordinates'))
+    written = 0
+    for i in range(0, len(plots), plot_batch):
+        written += _materialize_batch(plots[i:i + plot_batch], since)
+    return written
+
+
+def _materialize_batch(plots, since):
+    ids = [plot[0] for plot in plots]
+    with transaction.atomic():
+        if since is not None:
+            DailyAgronomy.objects.filter(plot_id__in=ids, day__gte=since).delete()
+        latest = DailyAgronomy.objects.filter(plot_id__in=ids, day=Subquery(
+            DailyAgronomy.objects.filter(plot=OuterRef('plot')).order_by('-day').values('day')[:1]
+        )).values_list('plot_id', 'day', 'gdd', 'gdd_cumulative', 'water_balance', 'water_balance_cumulative')
+        stored = {plot_id: rest for plot_id, *rest in latest}
+
+        start_days = np.empty(len(plots), dtype=np.int64)
+        gdd_base = np.zeros(len(plots))
+        balance_base = np.zeros(len(plots))
+        for k, (plot_id, _, planting_date, _, _) in enumerate(plots):
+            if plot_id in stored:
+                day, gdd, gdd_cumulative, balance, balance_cumulative = stored[plot_id]
+                start_days[k] = day.toordinal()
+                gdd_base[k] = gdd_cumulative - gdd
+                balance_base[k] = balance_cumulative - balance
+            else:
+                start_days[k] = planting_date.toordinal() if planting_date else EPOCH_DAY
+
+        plot_ids = np.array(ids, dtype=np.int64)
+        start_epoch = (start_days.min() - EPOCH_DAY) * 86400
+        weather = fetch_rows(WeatherData, 'timestamp', WEATHER_FIELDS, plot_ids, start_epoch)
+        if not len(weather):
+            return 0
+        irrigation = fetch_rows(IrrigationLog, 'irrigated_at', ['water_volume'], plot_ids, start_epoch)
+        values = compute_days(plots, start_days, weather, irrigation, gdd_base, balance_base)
+
+        # Le dernier jour stocké est recalculé : il pouvait être incomplet
+        for day in np.unique(start_days).tolist():
+            DailyAgronomy.objects.filter(
+                plot_id__in=plot_ids[start_days == day].tolist(), day__gte=date.fromordinal(day)
+            ).delete()
+        fields = [name for name in values if name not in ('plot_id', 'day', 'observations')]
+        DailyAgronomy.objects.bulk_create([
+            DailyAgronomy(plot_id=int(plot_id), day=date.fromordinal(int(day)),
+                          observations=int(values['observations'][k]),
+                          **{name: float(values[name][k]) for name in fields})
+            for k, (plot_id, day) in enumerate(zip(values['plot_id'], values['day']))
+        ], batch_size=1000)
+    return len(values['day'])
@@ -0,0 +1,102 @@
+"""
+Explanations of flagged feature vectors
+
+explain() turns the rows a model flagged into the fields of their
+AnomalyEvent, all rows at once:
+
+    shares      part of each sensor in the anomaly, rows sum to 1: path
+                attributions of the compiled IsolationForest
+                (CompiledForest.attributions), else how far each value
+                is from the middle of its normal range, in half-ranges
+    sensor      the sensor with the largest share, which gives the
+                anomaly type and the reported value and range
+    severity    'critical' outside that sensor's critical range, 'high'
+                outside its normal range, else 'medium' or 'low' when
+                only the model flags the row, by confidence
+    confidence  0.5 - decision value, clipped to [0, 1]
+
+thresholds are (min, max, critical_min, critical_max) rows of the
+FEATURE_SENSORS, per flagged row or shared by all of them.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from monitoring.features import FEATURE_SENSORS
+from monitoring.forest import CompiledForest
+
+# Type d'anomalie et action recommandée par capteur
+SENSOR_ANOMALIES = {
+    'soil_moisture': ('moisture_drop', 'irrigation'),
+    'temperature': ('temperature_spike', 'monitoring'),
+    'humidity': ('humidity_anomaly', 'monitoring'),
+    'ph_level': ('ph_imbalance', 'fertilization'),
+}
+
+ANOMALY_TYPES = np.array([SENSOR_ANOMALIES[sensor][0] for sensor in FEATURE_SENSORS], dtype=object)
+SENSOR_LABELS = [sensor.replace('_', ' ') for sensor in FEATURE_SENSORS]
+# En dessous, une anomalie vue par le modèle seul est 'low'
+CONFIDENT = 0.55
+
+
+class Explanation(namedtuple('Explanation', [
+    'sensor', 'shares', 'anomaly_type', 'severity', 'confidence', 'value', 'normal_min', 'normal_max', 'scores',
+])):
+    """Per flagged row arrays, see the module docstring"""
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.sensor)
+
+    def descriptions(self, model_version=''):
+        """One line per row: dominant sensor, its value and range, the other sensors' shares"""
+        model = f'model {model_version}' if model_version else 'the model'
+        shares = np.round(self.shares * 100).astype(np.int64).tolist()
+        return [
+            f'{SENSOR_LABELS[s]} {value:.2f} (normal {low:g}-{high:g}) accounts for {share[s]}% of the anomaly '
+            f'flagged by {model} (score {score:.3f}; '
+            + ', '.join(f'{SENSOR_LABELS[o]} {share[o]}%' for o in range(len(share)) if o != s) + ')'
+            for s, value, low, high, share, score in zip(
+                self.sensor.tolist(), self.value.tolist(), self.normal_min.tolist(), self.normal_max.tolist(),
+                shares, self.scores.tolist(),
+            )
+        ]
+
+
+def feature_thresholds(thresholds) -> np.ndarray:
+    """FEATURE_SENSORS rows of a threshold matrix indexed by ALERT_TYPE_INDEX (api.thresholds)"""
+    from api.ai_agent_engine import ALERT_TYPE_INDEX, AlertType
+    return np.asarray(thresholds)[..., [ALERT_TYPE_INDEX[AlertType(sensor)] for sensor in FEATURE_SENSORS], :]
+
+
+def range_attributions(X, thresholds) -> np.ndarray:
+    """Shares from the distance of each value to the middle of its normal range"""
+    low, high = thresholds[..., 0], thresholds[..., 1]
+    distance = np.abs(X - (low + high) / 2) / np.maximum((high - low) / 2, 1e-9)
+    total = distance.sum(axis=1, keepdims=True)
+    return np.divide(distance, total, out=np.full_like(distance, 1.0 / X.shape[1]), where=total > 0)
+
+
+def feature_attributions(model, X, thresholds) -> np.ndarray:
+    if isinstance(model, CompiledForest) and model.has_samples:
+        return model.attributions(X)
+    return range_attributions(X, thresholds)
+
+
+def explain(model, X, scores, thresholds) -> Explanation:
+    """Explanation of flagged rows X (moisture, temp, hum) and their decision values"""
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURE_SENSORS))
+    scores = np.asarray(scores, dtype=np.float64)
+    thresholds = np.broadcast_to(np.asarray(thresholds, dtype=np.float64), X.shape + (4,))
+    shares = feature_attributions(model, X, thresholds)
+    sensor = np.argmax(shares, axis=1)
+    rows = np.arange(len(X))
+    value = X[rows, sensor]
+    low, high, critical_low, critical_high = thresholds[rows, sensor].T
+    confidence = np.clip(0.5 - scores, 0.0, 1.0)
+    severity = np.select(
+        [(value < critical_low) | (value > critical_high), (value < low) | (value > high), confidence >= CONFIDENT],
+        ['critical', 'high', 'medium'], 'low',
+    ).astype(object)
+    return Explanation(sensor, shares, ANOMALY_TYPES[sensor], severity, confidence, value, low, high, scores)
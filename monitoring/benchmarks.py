@@ -0,0 +1,41 @@
+"""
+Helpers shared by the benchmark management commands
+"""
+
+import json
+import statistics
+import time
+
+
+def measure(fn, repeat=5):
+    """Run fn repeat times and return timing statistics in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "runs": repeat,
+        "mean_s": statistics.mean(timings),
+        "p50_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+    }
+
+
+def write_results(command, results, as_json=False):
+    """Print benchmark results from a management command, as JSON or aligned text"""
+    if as_json:
+        command.stdout.write(json.dumps(results, indent=2, default=str))
+        return
+    for name, value in results.items():
+        if isinstance(value, dict):
+            command.stdout.write(command.style.MIGRATE_HEADING(name))
+            for key, item in value.items():
+                command.stdout.write(f"  {key:<28} {item}")
+        else:
+            command.stdout.write(f"{name:<30} {value}")
+
+
+class Rollback(Exception):
+    """Raised at the end of a benchmark to discard the rows it created"""
@@ -0,0 +1,279 @@
+"""
+Input drift of the anomaly model
+
+Readings of the model's sensors are counted per plot, day and value bin
+as they are ingested (one additive upsert per touched bin, like
+monitoring.feature_store). Bins are fixed: BINS equal-width bins over
+FEATURE_LIMITS plus an underflow and an overflow bin, so counts never
+need rebinning when the model is retrained.
+
+train_model() saves the binned distribution of its training data as
+the reference, per plot when trained from history: plots differ too much
+from one another to be compared to the pooled distribution. Drift of the last days is then computed from the counts
+alone, never from the readings: PSI (population stability index) and
+the KS distance between the binned CDFs, per plot and sensor and over
+all plots. The KS distance is measured on the bin grid.
+"""
+
+import os
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from monitoring.feature_store import UPSERT_SQL
+from monitoring.features import FEATURE_LIMITS, FEATURE_SENSORS, FeatureBuilder
+from monitoring.files import atomic_write
+from monitoring.models import SensorHistogram
+
+BINS = 20
+WINDOW_DAYS = getattr(settings, 'DRIFT_WINDOW_DAYS', 7)
+MIN_SAMPLES = getattr(settings, 'DRIFT_MIN_SAMPLES', 100)
+# Seuils usuels du PSI : < 0.1 stable, < 0.25 modéré, au-delà significatif
+PSI_WARNING = 0.1
+PSI_ALERT = getattr(settings, 'DRIFT_PSI_ALERT', 0.25)
+EPSILON = 1e-4
+
+# Jours UTC, en ordinal de date
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+SENSOR_INDEX = {sensor: i for i, sensor in enumerate(FEATURE_SENSORS)}
+LIMITS = np.asarray(FEATURE_LIMITS, dtype=np.float64)
+
+
+class DriftReference(namedtuple('DriftReference', ['counts', 'trained_at', 'plot_ids', 'plot_counts'])):
+    """
+    Training distribution: counts[sensor, bin] over all plots and, when the
+    model was trained from history, plot_counts[plot, sensor, bin] of each
+    plot. Sensors in FEATURE_SENSORS order.
+    """
+    __slots__ = ()
+
+    def save(self, path):
+        with atomic_write(path, suffix='.npz') as f:
+            np.savez(f, counts=self.counts, trained_at=np.array([self.trained_at]),
+                     plot_ids=self.plot_ids, plot_counts=self.plot_counts)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['counts'], float(data['trained_at'][0]), data['plot_ids'], data['plot_counts'])
+
+    @classmethod
+    def from_sample(cls, sample, counter=None):
+        """Reference from model input rows (moisture, temp, hum) and the counter fed while sampling them"""
+        sample = np.asarray(sample, dtype=np.float64)
+        counts = np.zeros((len(FEATURE_SENSORS), BINS + 2), dtype=np.int64)
+        for s in range(len(FEATURE_SENSORS)):
+            values = sample[:, s][~np.isnan(sample[:, s])]
+            counts[s] = np.bincount(bin_index(s, values), minlength=BINS + 2)
+        plot_ids = np.array(sorted(counter.counts), dtype=np.int64) if counter else np.empty(0, dtype=np.int64)
+        plot_counts = np.stack([counter.counts[plot_id] for plot_id in plot_ids.tolist()]) if len(plot_ids) \
+            else np.zeros((0,) + counts.shape, dtype=np.int64)
+        return cls(counts, time.time(), plot_ids, plot_counts)
+
+    def expected(self, plot_ids):
+        """
+        Reference of each plot, (plots, sensor, bin): its own when it had
+        MIN_SAMPLES rows at training time, else the distribution of all plots
+        """
+        position = {plot_id: i for i, plot_id in enumerate(self.plot_ids.tolist())}
+        expected = np.broadcast_to(self.counts, (len(plot_ids),) + self.counts.shape).copy()
+        own = np.zeros(len(plot_ids), dtype=bool)
+        for i, plot_id in enumerate(plot_ids):
+            slot = position.get(plot_id)
+            if slot is not None and self.plot_counts[slot].sum(axis=-1).min() >= MIN_SAMPLES:
+                expected[i] = self.plot_counts[slot]
+                own[i] = True
+        return expected, own
+
+
+class ReferenceCounter:
+    """Binned counts per plot of the aligned rows of a training run, fed batch by batch"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, plot_ids, values):
+        plots, inverse = np.unique(plot_ids, return_inverse=True)
+        counts = np.zeros((len(plots), len(FEATURE_SENSORS), BINS + 2), dtype=np.int64)
+        for s in range(len(FEATURE_SENSORS)):
+            known = ~np.isnan(values[:, s])
+            np.add.at(counts, (inverse[known], s, bin_index(s, values[known, s])), 1)
+        for plot_id, plot_counts in zip(plots.tolist(), counts):
+            if plot_id in self.counts:
+                self.counts[plot_id] += plot_counts
+            else:
+                self.counts[plot_id] = plot_counts
+
+
+def bin_index(sensor, values):
+    """Bin of each value: 0 below the limits, BINS + 1 at or above them"""
+    low, high = LIMITS[sensor]
+    index = np.floor((np.asarray(values, dtype=np.float64) - low) / (high - low) * BINS).astype(np.int64) + 1
+    return np.clip(index, 0, BINS + 1)
+
+
+def record_histograms(readings):
+    """Count readings of the model's sensors, in the caller's transaction"""
+    readings = [reading for reading in readings if reading.sensor_type in SENSOR_INDEX]
+    if not readings:
+        return
+    sensors = np.array([SENSOR_INDEX[reading.sensor_type] for reading in readings])
+    values = np.array([reading.value for reading in readings], dtype=np.float64)
+    bins = np.empty(len(readings), dtype=np.int64)
+    for s in np.unique(sensors).tolist():
+        bins[sensors == s] = bin_index(s, values[sensors == s])
+    days = np.array([reading.timestamp.timestamp() for reading in readings]) // 86400 + EPOCH_DAY
+    plots = np.array([reading.plot_id for reading in readings])
+    keys, counts = np.unique(np.column_stack([plots, sensors, days.astype(np.int64), bins]), axis=0, return_counts=True)
+    upsert_counts([
+        (plot_id, FEATURE_SENSORS[sensor], date.fromordinal(day), bin_, count)
+        for (plot_id, sensor, day, bin_), count in zip(keys.tolist(), counts.tolist())
+    ])
+
+
+def upsert_counts(rows):
+    """Add (plot_id, sensor_type, day, bin, count) rows to the stored counts"""
+    if not rows:
+        return
+    meta = SensorHistogram._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    columns = [quote(meta.get_field(name).column) for name in ['plot', 'sensor_type', 'day', 'bin', 'count']]
+    conflict, add, _, _ = UPSERT_SQL[connection.vendor]
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'{conflict.format(key=", ".join(columns[:4]))} '
+        f'{columns[-1]} = {add.format(table=table, column=columns[-1])}'
+    )
+    adapt = connection.ops.adapt_datefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(plot_id, sensor, adapt(day), bin_, count)
+                                 for plot_id, sensor, day, bin_, count in sorted(rows)])
+
+
+def prune(today=None):
+    """Drop counts older than the drift window"""
+    today = today or date.today()
+    return SensorHistogram.objects.filter(day__lt=today - timedelta(days=WINDOW_DAYS)).delete()[0]
+
+
+def current_counts(plot_ids, days=WINDOW_DAYS, today=None) -> np.ndarray:
+    """counts[plot, sensor, bin] over the last days (today included), plot_ids order"""
+    today = today or date.today()
+    plot_ids = list(plot_ids)
+    position = {plot_id: i for i, plot_id in enumerate(plot_ids)}
+    counts = np.zeros((len(plot_ids), len(FEATURE_SENSORS), BINS + 2), dtype=np.int64)
+    rows = SensorHistogram.objects.filter(
+        plot_id__in=plot_ids, day__gt=today - timedelta(days=days)
+    ).values_list('plot_id', 'sensor_type', 'bin').annotate(total=Sum('count')).order_by()
+    for plot_id, sensor_type, bin_, total in rows:
+        counts[position[plot_id], SENSOR_INDEX[sensor_type], bin_] = total
+    return counts
+
+
+def psi(expected, actual) -> np.ndarray:
+    """Population stability index over the last axis (bins), smoothed by EPSILON"""
+    p = proportions(expected)
+    q = proportions(actual)
+    return ((q - p) * np.log(q / p)).sum(axis=-1)
+
+
+def ks(expected, actual) -> np.ndarray:
+    """Largest gap between the binned CDFs"""
+    return np.abs(np.cumsum(proportions(expected), axis=-1) - np.cumsum(proportions(actual), axis=-1)).max(axis=-1)
+
+
+def proportions(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = np.where(total > 0, counts / total, 0.0)
+    shares = shares + EPSILON
+    return shares / shares.sum(axis=-1, keepdims=True)
+
+
+def status(value, samples):
+    if samples < MIN_SAMPLES:
+        return 'insufficient_data'
+    if value >= PSI_ALERT:
+        return 'drift'
+    return 'warning' if value >= PSI_WARNING else 'stable'
+
+
+def drift_report(plots, reference: DriftReference, days=WINDOW_DAYS, today=None):
+    """
+    PSI / KS of each plot and sensor against its own training distribution,
+    and of all these plots together. plots is a list of (id, name).
+    """
+    plot_ids = [plot_id for plot_id, _ in plots]
+    counts = current_counts(plot_ids, days, today)
+    expected, own = reference.expected(plot_ids)
+    plot_psi, plot_ks = psi(expected, counts), ks(expected, counts)
+    samples = counts.sum(axis=-1)
+    total = counts.sum(axis=0)
+    overall_psi, overall_ks = psi(reference.counts, total), ks(reference.counts, total)
+
+    def entry(value, distance, n):
+        ready = n >= MIN_SAMPLES
+        return {
+            'psi': round(float(value), 4) if ready else None,
+            'ks': round(float(distance), 4) if ready else None,
+            'samples': int(n),
+            'status': status(value, n),
+        }
+
+    drifting = (plot_psi >= PSI_ALERT) & (samples >= MIN_SAMPLES)
+    return {
+        'window_days': days,
+        'reference_trained_at': datetime.fromtimestamp(reference.trained_at, tz=timezone.utc).isoformat(),
+        'overall': {
+            sensor: entry(overall_psi[s], overall_ks[s], total[s].sum()) for s, sensor in enumerate(FEATURE_SENSORS)
+        },
+        'drifting_plots': int(drifting.any(axis=1).sum()),
+        'plots': [
+            {
+                'plot_id': plot_id,
+                'name': name,
+                'reference': 'plot' if own[i] else 'all_plots',
+                'sensors': {
+                    sensor: entry(plot_psi[i, s], plot_ks[i, s], samples[i, s])
+                    for s, sensor in enumerate(FEATURE_SENSORS)
+                },
+            }
+            for i, (plot_id, name) in enumerate(plots)
+        ],
+    }
+
+
+def rebuild_histograms(plot_ids, days=WINDOW_DAYS, plot_batch=200):
+    """Recount the last days of readings of these plots, after raw inserts"""
+    builder = FeatureBuilder()
+    start = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time(), tzinfo=timezone.utc)
+    plot_ids = np.unique(np.asarray(list(plot_ids), dtype=np.int64))
+    counted = 0
+    for i in range(0, len(plot_ids), plot_batch):
+        batch = plot_ids[i:i + plot_batch]
+        with transaction.atomic():
+            SensorHistogram.objects.filter(plot_id__in=batch.tolist()).delete()
+            for s, sensor in enumerate(FEATURE_SENSORS):
+                readings = builder.fetch(batch, sensor, start.timestamp() - 1e-6, time.time())
+                if not len(readings):
+                    continue
+                # Arrondi : julianday de SQLite perd quelques µs
+                days_ = np.round(readings[:, 1], 3) // 86400 + EPOCH_DAY
+                keys, counts = np.unique(np.column_stack([
+                    readings[:, 0].astype(np.int64), days_.astype(np.int64), bin_index(s, readings[:, 2])
+                ]), axis=0, return_counts=True)
+                upsert_counts([
+                    (plot_id, sensor, date.fromordinal(day), bin_, count)
+                    for (plot_id, day, bin_), count in zip(keys.tolist(), counts.tolist())
+                ])
+                counted += len(readings)
+    return counted
@@ -0,0 +1,243 @@
+"""
+Rolling per-plot window statistics
+
+Each (plot, sensor_type, window) is kept as BUCKETS_PER_WINDOW
+SensorWindowStats rows of window / BUCKETS_PER_WINDOW seconds, holding
+power sums (count, sums of value, value², time, time², time x value)
+plus min and max. These are additive: ingesting readings is one upsert
+per touched bucket that adds the sums of the batch, and the statistics
+of a rolling window are the merge of its latest buckets (accurate to one
+bucket at the old end). Mean, standard deviation, min, max and the
+least-squares slope all derive from the merged sums.
+
+Readings that bypass ingestion (raw inserts, deletions) are picked up by
+rebuild_window_stats (manage.py rebuild_window_stats). Buckets that left
+their window are ignored by reads and deleted by prune(), from
+rebuild_window_stats --prune-only in cron, never during ingestion.
+"""
+
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Iterable, Sequence
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Q
+
+from monitoring.features import EPOCH_SQL, FEATURE_SENSORS, FeatureBuilder
+from monitoring.models import SensorReading, SensorWindowStats
+
+WINDOWS = (3600, 86400, 7 * 86400)
+BUCKETS_PER_WINDOW = 12
+STATS = ['count', 'mean', 'std', 'min', 'max', 'slope']
+SENSOR_TYPES = [sensor_type for sensor_type, _ in SensorReading.SENSOR_TYPES]
+
+SUM_FIELDS = ['count', 'sum_value', 'sum_value_sq', 'sum_time', 'sum_time_sq', 'sum_time_value']
+KEY_FIELDS = ['plot', 'sensor_type', 'window', 'bucket_start']
+
+# Fusion des min/max lors d'un upsert : colonne existante et nouvelle valeur
+UPSERT_SQL = {
+    'postgresql': ('ON CONFLICT ({key}) DO UPDATE SET', '{table}.{column} + EXCLUDED.{column}',
+                   'LEAST({table}.{column}, EXCLUDED.{column})', 'GREATEST({table}.{column}, EXCLUDED.{column})'),
+    'sqlite': ('ON CONFLICT ({key}) DO UPDATE SET', '{table}.{column} + excluded.{column}',
+               'MIN({table}.{column}, excluded.{column})', 'MAX({table}.{column}, excluded.{column})'),
+    'mysql': ('ON DUPLICATE KEY UPDATE', '{column} + VALUES({column})',
+              'LEAST({column}, VALUES({column}))', 'GREATEST({column}, VALUES({column}))'),
+}
+
+
+def bucket_size(window):
+    return window // BUCKETS_PER_WINDOW
+
+
+class WindowStats(namedtuple('WindowStats', ['plot_ids', 'sensors', 'windows', 'values'])):
+    """
+    values[plot, sensor, window] holds STATS (slope in units per hour),
+    NaN where a window has no reading
+    """
+    __slots__ = ()
+
+    def stat(self, name):
+        return self.values[..., STATS.index(name)]
+
+    def matrix(self):
+        """One row per plot, (sensor, window, stat) flattened, for models"""
+        return self.values.reshape(len(self.plot_ids), -1)
+
+
+def bucket_sums(plot_ids, sensor_types, epochs, values, windows=WINDOWS):
+    """
+    Sums of a set of readings per (plot, sensor_type, window, bucket):
+    rows of (plot_id, sensor_type, window, bucket epoch, *SUM_FIELDS, min, max)
+    """
+    plot_ids = np.asarray(plot_ids, dtype=np.int64)
+    epochs = np.asarray(epochs, dtype=float)
+    values = np.asarray(values, dtype=float)
+    sensors, sensor_index = np.unique(np.asarray(sensor_types, dtype=object).astype(str), return_inverse=True)
+    rows = []
+    for window in windows:
+        size = bucket_size(window)
+        buckets = np.floor(epochs / size) * size
+        keys, group = np.unique(np.column_stack([plot_ids, sensor_index, buckets]), axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        t = epochs - buckets
+        sums = [np.bincount(group, weights=weights, minlength=len(keys))
+                for weights in (np.ones_like(values), values, values * values, t, t * t, t * values)]
+        low = np.full(len(keys), np.inf)
+        high = np.full(len(keys), -np.inf)
+        np.minimum.at(low, group, values)
+        np.maximum.at(high, group, values)
+        for k, (plot_id, sensor, bucket) in enumerate(keys.tolist()):
+            rows.append((int(plot_id), str(sensors[int(sensor)]), window, bucket, int(sums[0][k]),
+                         *(float(s[k]) for s in sums[1:]), float(low[k]), float(high[k])))
+    return rows
+
+
+def upsert_sums(rows):
+    """Add bucket sums to the stored rows, creating missing buckets"""
+    if not rows:
+        return
+    meta = SensorWindowStats._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    columns = [quote(meta.get_field(name).column) for name in KEY_FIELDS + SUM_FIELDS + ['min_value', 'max_value']]
+    conflict, add, least, greatest = UPSERT_SQL[connection.vendor]
+    updates = [f'{column} = {add.format(table=table, column=column)}' for column in columns[4:-2]]
+    updates.append(f'{columns[-2]} = {least.format(table=table, column=columns[-2])}')
+    updates.append(f'{columns[-1]} = {greatest.format(table=table, column=columns[-1])}')
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'{conflict.format(key=", ".join(columns[:4]))} {", ".join(updates)}'
+    )
+    adapt = connection.ops.adapt_datetimefield_value
+    # Ordre fixe des clés : pas d'interblocage entre écrivains concurrents
+    params = [
+        (plot_id, sensor_type, window, adapt(datetime.fromtimestamp(bucket, tz=timezone.utc)), *rest)
+        for plot_id, sensor_type, window, bucket, *rest in sorted(rows)
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def record_readings(readings: Iterable[SensorReading]):
+    """Fold saved or about-to-be-saved readings into the store, in the caller's transaction"""
+    readings = list(readings)
+    if not readings:
+        return
+    upsert_sums(bucket_sums(
+        [reading.plot_id for reading in readings],
+        [reading.sensor_type for reading in readings],
+        [reading.timestamp.timestamp() for reading in readings],
+        [reading.value for reading in readings],
+    ))
+
+
+def prune(now=None):
+    """Drop buckets that no longer fall in their window"""
+    now = now or time.time()
+    expired = Q()
+    for window in WINDOWS:
+        cutoff = datetime.fromtimestamp(oldest_bucket(window, now), tz=timezone.utc)
+        expired |= Q(window=window, bucket_start__lt=cutoff)
+    return SensorWindowStats.objects.filter(expired).delete()[0]
+
+
+def read_window_stats(plot_ids, sensors: Sequence[str] = FEATURE_SENSORS, windows: Sequence[int] = WINDOWS,
+                      now=None) -> WindowStats:
+    """Rolling statistics of many plots at once, merged from their buckets in NumPy"""
+    now = (now.timestamp() if isinstance(now, datetime) else now) or time.time()
+    plot_ids = np.unique(np.asarray(list(plot_ids), dtype=np.int64))
+    sensors, windows = list(sensors), list(windows)
+    merged = np.zeros((len(plot_ids), len(sensors), len(windows), len(SUM_FIELDS)))
+    low = np.full(merged.shape[:3], np.inf)
+    high = np.full(merged.shape[:3], -np.inf)
+
+    rows = fetch_buckets(plot_ids, sensors, windows, now)
+    if len(rows):
+        plot, sensor, window, bucket = (rows[:, i] for i in range(4))
+        sums = rows[:, 4:10]
+        window_index = np.searchsorted(np.sort(windows), window)
+        window_index = np.argsort(windows)[window_index]
+        # Buckets des BUCKETS_PER_WINDOW derniers pas de chaque fenêtre
+        keep = bucket >= oldest_bucket(window, now)
+        index = (np.searchsorted(plot_ids, plot[keep].astype(np.int64)), sensor[keep].astype(np.int64),
+                 window_index[keep])
+        # Temps ramenés à l'origin commune now - window
+        shift = bucket[keep] - (now - window[keep])
+        n, sy, syy, st, stt, sty = sums[keep].T
+        shifted = np.column_stack([
+            n, sy, syy, st + n * shift, stt + 2 * shift * st + n * shift * shift, sty + shift * sy,
+        ])
+        np.add.at(merged, index, shifted)
+        np.minimum.at(low, index, rows[keep, 10])
+        np.maximum.at(high, index, rows[keep, 11])
+
+    n, sy, syy, st, stt, sty = np.moveaxis(merged, -1, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sy / n
+        std = np.sqrt(np.maximum(syy / n - mean * mean, 0))
+        spread = stt - st * st / n
+        slope = np.where(spread > 0, (sty - st * sy / n) / spread * 3600, np.nan)
+    empty = n == 0
+    values = np.stack([n, mean, std, low, high, slope], axis=-1)
+    values[empty, 1:] = np.nan
+    return WindowStats(plot_ids, sensors, windows, values)
+
+
+def fetch_buckets(plot_ids, sensors, windows, now) -> np.ndarray:
+    """(plot, sensor index, window, bucket epoch, *SUM_FIELDS, min, max) rows as a float array"""
+    if not len(plot_ids) or not sensors or not windows:
+        return np.empty((0, 12))
+    meta = SensorWindowStats._meta
+    quote = connection.ops.quote_name
+    column = {name: quote(meta.get_field(name).column) for name in KEY_FIELDS + SUM_FIELDS + ['min_value', 'max_value']}
+    sql = (
+        f'SELECT {column["plot"]}, {column["sensor_type"]}, {column["window"]}, '
+        f'{EPOCH_SQL[connection.vendor].format(column["bucket_start"])}, '
+        f'{", ".join(column[name] for name in SUM_FIELDS)}, {column["min_value"]}, {column["max_value"]} '
+        f'FROM {quote(meta.db_table)} '
+        f'WHERE {column["plot"]} IN ({", ".join(["%s"] * len(plot_ids))}) '
+        f'AND {column["sensor_type"]} IN ({", ".join(["%s"] * len(sensors))}) '
+        f'AND {column["window"]} IN ({", ".join(["%s"] * len(windows))}) '
+        f'AND {column["bucket_start"]} >= %s'
+    )
+    oldest = oldest_bucket(max(windows), now)
+    params = [*plot_ids.tolist(), *sensors, *windows,
+              connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(oldest, tz=timezone.utc))]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    sensor_index = {sensor: i for i, sensor in enumerate(sensors)}
+    rows = np.array([(plot, sensor_index[sensor], *rest) for plot, sensor, *rest in rows], dtype=float).reshape(-1, 12)
+    # Débuts de bucket en secondes entières (julianday de SQLite perd quelques µs)
+    rows[:, 3] = np.round(rows[:, 3])
+    return rows
+
+
+def rebuild_window_stats(plot_ids, now=None, plot_batch=200):
+    """Recompute the buckets of these plots from SensorReading"""
+    now = (now.timestamp() if isinstance(now, datetime) else now) or time.time()
+    builder = FeatureBuilder(sensors=SENSOR_TYPES, plot_batch=plot_batch)
+    plot_ids = np.unique(np.asarray(list(plot_ids), dtype=np.int64))
+    written = 0
+    for i in range(0, len(plot_ids), plot_batch):
+        batch = plot_ids[i:i + plot_batch]
+        with transaction.atomic():
+            SensorWindowStats.objects.filter(plot_id__in=batch.tolist()).delete()
+            for sensor_type in SENSOR_TYPES:
+                # fetch() exclut sa borne basse, un bucket inclut son début
+                readings = builder.fetch(batch, sensor_type, oldest_bucket(max(WINDOWS), now) - 1e-6, now)
+                readings[:, 1] = np.round(readings[:, 1], 3)
+                for window in WINDOWS:
+                    rows = readings[readings[:, 1] >= oldest_bucket(window, now)]
+                    upsert_sums(bucket_sums(rows[:, 0], [sensor_type] * len(rows), rows[:, 1], rows[:, 2],
+                                            windows=(window,)))
+                written += len(readings)
+    return written
+
+
+def oldest_bucket(window, now):
+    """Start of the oldest bucket still read for this window"""
+    size = bucket_size(window)
+    return np.floor(now / size) * size - (BUCKETS_PER_WINDOW - 1) * size
@@ -0,0 +1,190 @@
+"""
+Aligned sensor features for the anomaly model
+
+SensorReading stores one row per sensor and time. The model wants one
+[moisture, temp, hum] vector per plot and time, so readings are pivoted
+onto a grid of bucket boundaries with an as-of join: the value of a
+sensor at time T is its latest reading in (T - tolerance, T].
+
+Readings are read in (plot batch, time window) chunks with one query per
+sensor, timestamps converted to epoch seconds by the database, and the
+as-of state of each plot is carried from one window to the next, so any
+history length is processed in bounded memory. Used by model training,
+batch scoring and backfills.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Iterator, List, Sequence
+
+import numpy as np
+from django.db import connection
+
+from monitoring.models import SensorReading
+
+# Capteurs et colonnes attendues par monitoring.ml (['moisture', 'temp', 'hum'])
+FEATURE_SENSORS = ['soil_moisture', 'temperature', 'humidity']
+# Plages physiques de ces capteurs (normalisation, histogrammes de dérive)
+FEATURE_LIMITS = [(0.0, 100.0), (-10.0, 50.0), (0.0, 100.0)]
+
+DEFAULT_BUCKET = 600
+DEFAULT_TOLERANCE = 1800
+DEFAULT_WINDOW = 86400
+DEFAULT_PLOT_BATCH = 200
+
+# Epoch seconds (UTC) of a timestamp column, computed by the database
+EPOCH_SQL = {
+    'postgresql': 'EXTRACT(EPOCH FROM {})',
+    'sqlite': '(julianday({}) - 2440587.5) * 86400.0',
+    'mysql': 'UNIX_TIMESTAMP({})',
+}
+
+
+class FeatureBatch(namedtuple('FeatureBatch', ['plot_ids', 'times', 'values'])):
+    """
+    Aligned rows: plot id, as-of time in epoch seconds and one column per
+    sensor (NaN where a sensor had no reading within the tolerance)
+    """
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return len(self.plot_ids)
+
+    def datetimes(self):
+        return self.times.astype('datetime64[s]')
+
+    @classmethod
+    def empty(cls, sensors=len(FEATURE_SENSORS)):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, sensors)))
+
+    @classmethod
+    def concatenate(cls, batches):
+        batches = [batch for batch in batches if batch.size]
+        if not batches:
+            return cls.empty()
+        return cls(*(np.concatenate(arrays) for arrays in zip(*batches)))
+
+
+def _epoch(value):
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+class FeatureBuilder:
+    """
+    Pivot readings of many plots into aligned vectors, bucket seconds
+    apart, streamed window by window
+    """
+
+    def __init__(self, sensors: Sequence[str] = FEATURE_SENSORS, bucket=DEFAULT_BUCKET,
+                 tolerance=DEFAULT_TOLERANCE, window=DEFAULT_WINDOW, plot_batch=DEFAULT_PLOT_BATCH,
+                 complete=True):
+        if bucket <= 0 or tolerance < 0:
+            raise ValueError('bucket must be positive and tolerance not negative')
+        self.sensors = list(sensors)
+        self.bucket = bucket
+        self.tolerance = tolerance
+        # Fenêtre arrondie à un nombre entier de buckets
+        self.window = max(1, int(window // bucket)) * bucket
+        self.plot_batch = plot_batch
+        # Only rows where every sensor has a value
+        self.complete = complete
+
+    def iter_batches(self, plot_ids, start, end) -> Iterator[FeatureBatch]:
+        """
+        Aligned rows for as-of times in (start, end], both floored to the
+        bucket, in chronological windows: no row is after end, so ranges
+        that share a bound never both hold the boundary row. Memory is
+        bounded by plot_batch x window.
+        """
+        start = np.floor(_epoch(start) / self.bucket) * self.bucket
+        end = np.floor(_epoch(end) / self.bucket) * self.bucket
+        plot_ids = np.unique(np.asarray(list(plot_ids), dtype=np.int64))
+        batches = [plot_ids[i:i + self.plot_batch] for i in range(0, len(plot_ids), self.plot_batch)]
+        carries = [None] * len(batches)
+
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + self.window, end)
+            for i, batch in enumerate(batches):
+                # First window also reads the tolerance before start to seed the as-of state
+                low = window_start - self.tolerance if carries[i] is None else window_start
+                readings = [self.fetch(batch, sensor, low, window_end) for sensor in self.sensors]
+                features, carries[i] = self.align(batch, readings, window_start, window_end, carries[i])
+                if features.size:
+                    yield features
+            window_start = window_end
+
+    def build(self, plot_ids, start, end) -> FeatureBatch:
+        """All aligned rows at once, for short ranges"""
+        return FeatureBatch.concatenate(self.iter_batches(plot_ids, start, end))
+
+    def fetch(self, plot_ids: np.ndarray, sensor_type: str, low: float, high: float) -> np.ndarray:
+        """(plot_id, epoch, value) rows of one sensor with low < epoch <= high, as a float array"""
+        meta = SensorReading._meta
+        quote = connection.ops.quote_name
+        timestamp = quote(meta.get_field('timestamp').column)
+        sql = (
+            f'SELECT {quote(meta.get_field("plot").column)}, '
+            f'{EPOCH_SQL[connection.vendor].format(timestamp)}, {quote(meta.get_field("value").column)} '
+            f'FROM {quote(meta.db_table)} '
+            f'WHERE {quote(meta.get_field("plot").column)} IN ({", ".join(["%s"] * len(plot_ids))}) '
+            f'AND {quote(meta.get_field("sensor_type").column)} = %s '
+            f'AND {timestamp} > %s AND {timestamp} <= %s'
+        )
+        low, high = (connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(bound, tz=timezone.utc))
+                     for bound in (low, high))
+        params = [*plot_ids.tolist(), sensor_type, low, high]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return np.array(rows, dtype=float).reshape(-1, 3)
+
+    def align(self, plot_ids: np.ndarray, readings: List[np.ndarray], window_start, window_end, carry=None):
+        """
+        As-of join of one window. readings holds a (plot_id, epoch, value)
+        array per sensor. Returns the aligned rows and the state to carry
+        into the next window: last (value, epoch) per plot and sensor.
+        """
+        plots, sensors = len(plot_ids), len(readings)
+        steps = int(round((window_end - window_start) / self.bucket))
+        boundaries = window_start + self.bucket * np.arange(1, steps + 1)
+
+        # Colonne 0 : état hérité de la fenêtre précédente, puis un bucket par colonne
+        values = np.full((sensors, plots, steps + 1), np.nan)
+        times = np.full((sensors, plots, steps + 1), -np.inf)
+        if carry is not None:
+            values[:, :, 0], times[:, :, 0] = carry
+
+        for s, rows in enumerate(readings):
+            if not len(rows):
+                continue
+            plot_index = np.searchsorted(plot_ids, rows[:, 0].astype(np.int64))
+            column = np.clip(np.ceil((rows[:, 1] - window_start) / self.bucket), 0, steps).astype(np.int64)
+            key = plot_index * (steps + 1) + column
+            # Dernière lecture de chaque (parcelle, bucket)
+            order = np.lexsort((rows[:, 1], key))
+            key, rows = key[order], rows[order]
+            last = np.append(key[1:] != key[:-1], True)
+            values[s].reshape(-1)[key[last]] = rows[last, 2]
+            times[s].reshape(-1)[key[last]] = rows[last, 1]
+
+        # Report de la dernière valeur connue le long des buckets
+        index = np.where(np.isfinite(times), np.arange(steps + 1), 0)
+        np.maximum.accumulate(index, axis=2, out=index)
+        values = np.take_along_axis(values, index, axis=2)
+        times = np.take_along_axis(times, index, axis=2)
+        next_carry = (values[:, :, -1].copy(), times[:, :, -1].copy())
+
+        values, times = values[:, :, 1:], times[:, :, 1:]
+        values[boundaries - times > self.tolerance] = np.nan
+
+        # (sensors, plots, steps) -> rows of (plot, boundary)
+        matrix = values.reshape(sensors, -1).T
+        keep = np.isfinite(matrix).all(axis=1) if self.complete else np.isfinite(matrix).any(axis=1)
+        features = FeatureBatch(
+            np.repeat(plot_ids, steps)[keep],
+            np.tile(boundaries, plots)[keep],
+            matrix[keep],
+        )
+        return features, next_carry
@@ -0,0 +1,25 @@
+"""
+Atomic model files
+Model files are re-read by running workers (monitoring.scoring) as soon
+as their mtime changes: they are written to a temporary file in the same
+directory and renamed over the old one, so readers see either the old
+or the new file, never a partial one.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, suffix=''):
+    """Binary file object whose content replaces path when the block succeeds"""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, tmp = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,121 @@
+"""
+Short-horizon soil moisture forecasts
+
+Each plot's recent history is read from the rolling window store
+(monitoring.feature_store): the BUCKETS_PER_WINDOW buckets of the day
+window give a mean per STEP seconds over the last day. A damped-trend
+exponential smoothing model (Holt) is fitted per plot by evaluating a
+grid of (alpha, beta) pairs on every plot at once and keeping, per plot,
+the pair with the smallest one-step-ahead squared error. Fitting is a
+loop over time steps only; plots and parameter pairs are array axes.
+
+Empty buckets are skipped: the level follows the damped trend without
+an update. A plot needs MIN_POINTS buckets for a forecast, NaN otherwise.
+"""
+
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from monitoring.feature_store import SUM_FIELDS, bucket_size, fetch_buckets, oldest_bucket
+
+WINDOW = 86400
+STEP = bucket_size(WINDOW)
+MIN_POINTS = 4
+PHI = 0.9
+ALPHAS = np.array([0.1, 0.2, 0.35, 0.5, 0.7, 0.9])
+BETAS = np.array([0.0, 0.05, 0.1, 0.2, 0.35])
+
+
+class Forecast(namedtuple('Forecast', ['plot_ids', 'last', 'level', 'trend', 'sigma', 'alpha', 'beta', 'points'])):
+    """
+    Fitted state per plot: last observed bucket mean, smoothed level and
+    trend (per STEP), one-step residual standard deviation, chosen
+    parameters and number of observed buckets
+    """
+    __slots__ = ()
+
+    def predict(self, hours) -> np.ndarray:
+        """Moisture expected hours after the last bucket, NaN for plots without enough history"""
+        steps = hours * 3600 / STEP
+        # Somme des phi^k, k = 1..h, étendue aux pas fractionnaires
+        damping = PHI * (1 - PHI ** steps) / (1 - PHI)
+        return self.level + damping * self.trend
+
+    def interval(self, hours, z=1.64) -> np.ndarray:
+        """Half width of the prediction interval (90 % by default)"""
+        return z * self.sigma * np.sqrt(np.maximum(hours * 3600 / STEP, 1.0))
+
+    def path(self, hours) -> np.ndarray:
+        """(plots, steps) forecasts at each STEP up to hours ahead"""
+        steps = np.arange(1, int(np.ceil(hours * 3600 / STEP)) + 1)
+        return np.column_stack([self.predict(step * STEP / 3600) for step in steps]) if len(steps) \
+            else np.empty((len(self.plot_ids), 0))
+
+
+def bucket_means(plot_ids, sensor='soil_moisture', now=None):
+    """(plots, BUCKETS_PER_WINDOW) bucket means of the day window, oldest first, NaN for empty buckets"""
+    now = (now.timestamp() if isinstance(now, datetime) else now) or time.time()
+    plot_ids = np.unique(np.asarray(list(plot_ids), dtype=np.int64))
+    start = oldest_bucket(WINDOW, now)
+    steps = int(round((np.floor(now / STEP) * STEP - start) / STEP)) + 1
+    counts = np.zeros((len(plot_ids), steps))
+    sums = np.zeros_like(counts)
+    rows = fetch_buckets(plot_ids, [sensor], [WINDOW], now)
+    rows = rows[rows[:, 3] >= start]
+    if len(rows):
+        index = (np.searchsorted(plot_ids, rows[:, 0].astype(np.int64)),
+                 np.round((rows[:, 3] - start) / STEP).astype(np.int64))
+        np.add.at(counts, index, rows[:, 4 + SUM_FIELDS.index('count')])
+        np.add.at(sums, index, rows[:, 4 + SUM_FIELDS.index('sum_value')])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return plot_ids, np.where(counts > 0, sums / counts, np.nan)
+
+
+def fit(plot_ids, series) -> Forecast:
+    """Fit the damped-trend model of every plot's series (plots, steps) at once"""
+    series = np.asarray(series, dtype=np.float64)
+    plots, steps = series.shape
+    alpha, beta = (grid.reshape(-1)[:, None] for grid in np.meshgrid(ALPHAS, BETAS, indexing='ij'))
+    combos = len(alpha)
+    observed = ~np.isnan(series)
+    points = observed.sum(axis=1)
+
+    # Initialisation : première valeur observée, tendance nulle
+    first = np.argmax(observed, axis=1)
+    level = np.broadcast_to(series[np.arange(plots), first], (combos, plots)).copy()
+    trend = np.zeros((combos, plots))
+    sse = np.zeros((combos, plots))
+    fitted = np.zeros((combos, plots))
+    for t in range(steps):
+        forecast = level + PHI * trend
+        seen = observed[:, t] & (t > first)
+        value = np.where(seen, series[:, t], forecast)
+        error = np.where(seen, value - forecast, 0.0)
+        sse += error * error
+        new_level = forecast + alpha * error
+        trend = np.where(seen, beta * (new_level - level) + (1 - beta) * PHI * trend, PHI * trend)
+        level = new_level
+        fitted += seen
+
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(plots)
+    last = np.full(plots, np.nan)
+    has_data = points > 0
+    last_index = steps - 1 - np.argmax(observed[:, ::-1], axis=1)
+    last[has_data] = series[columns, last_index][has_data]
+    sigma = np.sqrt(sse[best, columns] / np.maximum(fitted[best, columns], 1))
+    enough = points >= MIN_POINTS
+    return Forecast(
+        np.asarray(plot_ids), last,
+        *(np.where(enough, values, np.nan) for values in (level[best, columns], trend[best, columns], sigma)),
+        ALPHAS[best // len(BETAS)], BETAS[best % len(BETAS)], points,
+    )
+
+
+def forecast_moisture(plot_ids, now=None) -> Forecast:
+    """Fitted moisture forecasts of these plots from their rolling window buckets"""
+    plot_ids, series = bucket_means(plot_ids, 'soil_moisture', now)
+    return fit(plot_ids, series)
@@ -0,0 +1,171 @@
+"""
+Compiled IsolationForest
+
+compile_forest() flattens a fitted scikit-learn IsolationForest into
+packed NumPy arrays, one row per node of every tree:
+
+    feature    feature compared at the node (0 on leaves)
+    threshold  go right when x[feature] > threshold (+inf on leaves)
+    children   (left, right) node indexes, a leaf points to itself
+    value      on leaves: depth + average path length of its samples
+    samples    training samples that reached the node
+
+CompiledForest walks all trees of all rows at once, max_depth steps of
+array indexing, and reproduces score_samples / decision_function /
+predict of the source model. It only needs NumPy: web workers load the
+.npz export without importing pandas or scikit-learn, and skip the
+input validation that dominates single-row sklearn calls.
+
+attributions() splits each row's isolation between its features: every
+split on the row's path is credited to its feature with log2 of the
+share of the node's training samples it cut off, so the features that
+isolate the row from most of the data get most of the weight.
+
+Inputs are finite feature rows, compared in float32 like sklearn trees.
+"""
+
+import numpy as np
+
+from monitoring.files import atomic_write
+
+EULER_GAMMA = np.euler_gamma
+ARRAYS = ['feature', 'threshold', 'children', 'value', 'roots', 'samples']
+
+
+def average_path_length(n_samples):
+    """Average path length of an unsuccessful BST search in n_samples (sklearn's c(n))"""
+    n_samples = np.asarray(n_samples, dtype=float)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    n = n_samples[large]
+    lengths[large] = 2.0 * (np.log(n - 1.0) + EULER_GAMMA) - 2.0 * (n - 1.0) / n
+    return lengths
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, children, value, roots, samples, max_depth, n_features, max_samples,
+                 offset):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.children = np.asarray(children, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.samples = np.asarray(samples, dtype=np.float64)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.max_samples = int(max_samples)
+        self.offset = float(offset)
+        self.denominator = len(self.roots) * float(average_path_length([self.max_samples])[0])
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def has_samples(self):
+        """False for exports written before node sample counts were stored"""
+        return bool(self.samples.any())
+
+    def _inputs(self, X):
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got {X.shape[1]}')
+        return X
+
+    def path_lengths(self, X) -> np.ndarray:
+        """(rows, trees) adjusted path length of each row in each tree"""
+        X = self._inputs(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            right = X[rows, self.feature[node]] > self.threshold[node]
+            node = self.children[node, right.view(np.int8)]
+        return self.value[node]
+
+    def attributions(self, X) -> np.ndarray:
+        """(rows, features) share of each feature in the isolation of each row, rows sum to 1"""
+        X = self._inputs(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        weights = np.zeros((len(X), self.n_features))
+        log_samples = np.log2(np.maximum(self.samples, 1.0))
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            right = X[rows, feature] > self.threshold[node]
+            child = self.children[node, right.view(np.int8)]
+            # Une feuille pointe sur elle-même : gain nul
+            gain = log_samples[node] - log_samples[child]
+            for f in range(self.n_features):
+                weights[:, f] += np.where(feature == f, gain, 0.0).sum(axis=1)
+            node = child
+        total = weights.sum(axis=1, keepdims=True)
+        return np.divide(weights, total, out=np.full_like(weights, 1.0 / self.n_features), where=total > 0)
+
+    def score_samples(self, X) -> np.ndarray:
+        """Opposite of the anomaly score, like IsolationForest.score_samples"""
+        depths = self.path_lengths(X).sum(axis=1)
+        if self.denominator == 0:
+            return -np.ones(len(depths))
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset
+
+    def predict(self, X) -> np.ndarray:
+        """1 for inliers, -1 for anomalies"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def save(self, path):
+        with atomic_write(path, suffix='.npz') as f:
+            np.savez(f, **{name: getattr(self, name) for name in ARRAYS},
+                     meta=np.array([self.max_depth, self.n_features, self.max_samples], dtype=np.int64),
+                     offset=np.array([self.offset]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            max_depth, n_features, max_samples = data['meta'].tolist()
+            arrays = {name: data[name] for name in ARRAYS if name in data.files}
+            # Exports antérieurs sans effectifs : pas d'attributions (has_samples)
+            arrays.setdefault('samples', np.zeros(len(arrays['feature'])))
+            return cls(**arrays, max_depth=max_depth, n_features=n_features,
+                       max_samples=max_samples, offset=float(data['offset'][0]))
+
+
+def compile_forest(model) -> CompiledForest:
+    """Flatten a fitted IsolationForest (its trees and feature subsets) into a CompiledForest"""
+    features, thresholds, children, values, roots, samples = [], [], [], [], [], []
+    max_depth, start = 0, 0
+    for estimator, tree_features in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        left, right = tree.children_left, tree.children_right
+        nodes = tree.node_count
+        leaf = left == -1
+
+        # Les noeuds sont numérotés en préordre : un parent précède ses enfants
+        depth = np.zeros(nodes, dtype=np.int64)
+        for node in np.flatnonzero(~leaf).tolist():
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+        index = np.arange(nodes)
+        features.append(np.where(leaf, 0, np.asarray(tree_features)[np.where(leaf, 0, tree.feature)]))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        children.append(np.column_stack([np.where(leaf, index, left), np.where(leaf, index, right)]) + start)
+        values.append(np.where(leaf, depth + average_path_length(tree.n_node_samples), 0.0))
+        samples.append(tree.n_node_samples)
+        roots.append(start)
+        start += nodes
+
+    return CompiledForest(
+        np.concatenate(features), np.concatenate(thresholds), np.concatenate(children),
+        np.concatenate(values), roots, np.concatenate(samples), max_depth, model.n_features_in_,
+        model.max_samples_, model.offset_,
+    )
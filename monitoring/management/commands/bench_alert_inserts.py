@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, TextField
+from django.db.models.functions import Cast, Length
+import random
+import time
+
+from api.ai_agent_engine import CropMonitoringAgent
+from api.recommendations import invalidate_catalogue, to_db_alert
+from monitoring.benchmarks import Rollback, write_results
+from monitoring.models import Plot, Alert
+
+
+class Command(BaseCommand):
+    help = 'Compare alert insert throughput and storage, inline strings vs recommendation catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        results = {}
+        try:
+            with transaction.atomic():
+                results = self.run(options['alerts'], options['batch_size'])
+                raise Rollback
+        except Rollback:
+            # Catalogue rows created during the run were rolled back too
+            invalidate_catalogue()
+        write_results(self, results, options['json'])
+
+    def run(self, count, batch_size):
+        user = get_user_model().objects.create(username=f'bench-{time.time_ns()}')
+        legacy_plot, catalogue_plot = [
+            Plot.objects.create(user=user, name=name, location='bench', crop_type='wheat', size=1)
+            for name in ('legacy', 'catalogue')
+        ]
+
+        # Génère des alertes avec des valeurs hors plage
+        agent = CropMonitoringAgent()
+        alerts = []
+        while len(alerts) < count:
+            alerts.extend(agent.analyze_sensor_data(
+                sensor_data={
+                    'temperature': random.choice([5, 45]) + random.uniform(-2, 2),
+                    'soil_moisture': random.choice([10, 95]) + random.uniform(-2, 2),
+                },
+                plot_id='bench',
+                timestamp='2025-01-01T00:00:00'
+            ))
+        alerts = alerts[:count]
+
+        def legacy_rows():
+            return [
+                Alert(
+                    plot=legacy_plot,
+                    alert_type=alert.alert_type.value,
+                    severity=alert.severity.value,
+                    message=alert.message,
+                    current_value=alert.current_value,
+                    threshold_value=alert.threshold_value,
+                    recommendations=alert.recommendations
+                )
+                for alert in alerts
+            ]
+
+        def catalogue_rows():
+            return [to_db_alert(catalogue_plot, alert) for alert in alerts]
+
+        results = {}
+        for name, plot, build in [
+            ('inline', legacy_plot, legacy_rows),
+            ('catalogue', catalogue_plot, catalogue_rows),
+        ]:
+            start = time.perf_counter()
+            Alert.objects.bulk_create(build(), batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+
+            payload = Alert.objects.filter(plot=plot).aggregate(
+                bytes=Sum(Length('message') + Length(Cast('recommendations', TextField())))
+            )['bytes'] or 0
+            results[name] = {
+                'alerts': count,
+                'seconds': round(elapsed, 4),
+                'alerts_per_s': round(count / elapsed, 1),
+                'text_bytes_per_alert': round(payload / count, 1),
+            }
+        return results
@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+import time
+
+from authentication.authentication import CachedJWTAuthentication, clear_user_cache
+from authentication.tokens import tokens_for_user
+from monitoring.benchmarks import write_results
+
+
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    mode = 'stateless'
+
+
+class CachedModeJWTAuthentication(CachedJWTAuthentication):
+    mode = 'cached'
+
+
+class Command(BaseCommand):
+    help = 'Cost of authenticating a JWT request: simplejwt vs cached users vs stateless claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=20, help='Distinct users sending requests')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        prefix = f'bench-auth-{time.time_ns()}'
+        users = [User.objects.create(username=f'{prefix}-{i}') for i in range(options['users'])]
+        factory = APIRequestFactory()
+        requests = [
+            factory.get('/api/plots/', HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(user).access_token}')
+            for user in users
+        ]
+        count = options['requests']
+
+        def run(authenticator):
+            clear_user_cache()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for i in range(count):
+                    user, _ = authenticator.authenticate(Request(requests[i % len(requests)]))
+                elapsed = time.perf_counter() - start
+            return {
+                'requests': count,
+                'seconds': round(elapsed, 3),
+                'us_per_request': round(elapsed / count * 1e6, 1),
+                'queries': len(queries),
+                'queries_per_request': round(len(queries) / count, 3),
+            }
+
+        try:
+            results = {
+                'simplejwt': run(JWTAuthentication()),
+                'cached': run(CachedModeJWTAuthentication()),
+                'stateless': run(StatelessJWTAuthentication()),
+            }
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+        write_results(self, results, options['json'])
@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+from api.gateways import issue_key
+from api.ingestion import writer
+from monitoring.benchmarks import write_results
+from monitoring.models import Plot, SensorGateway, SensorReading
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for code in statuses if code >= 400),
+        'seconds': round(elapsed, 3),
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'latency_p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'latency_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync sensor_add endpoint (WSGI handler, thread pool) with the async '
+        'endpoint (ASGI handler, one event loop) at the same concurrency, in one process. '
+        'Pin the process (e.g. taskset -c 0) to compare at equal core counts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--readings', type=int, default=5, help='Readings per request')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create(username=f'bench-{time.time_ns()}')
+        plot = Plot.objects.create(user=user, name='bench', location='bench', crop_type='wheat', size=1)
+        gateway = SensorGateway(owner=user, name='bench')
+        self.key = issue_key(gateway)
+        gateway.plots.add(plot)
+        body = json.dumps({
+            'plot_id': plot.id,
+            'readings': [
+                {'sensor': sensor, 'value': 50}
+                for sensor, _ in zip(['moisture', 'temperature', 'humidity', 'ph', 'light'] * options['readings'],
+                                     range(options['readings']))
+            ],
+        })
+        try:
+            results = {
+                'wsgi': self.run_wsgi(body, options),
+                'asgi': self.run_asgi(body, options),
+                'readings_written': SensorReading.objects.filter(plot=plot).count(),
+            }
+        finally:
+            user.delete()
+        write_results(self, results, options['json'])
+
+    def run_wsgi(self, body, options):
+        url = reverse('api:sensor-add')
+        local = threading.local()
+
+        def post(_):
+            client = getattr(local, 'client', None) or Client()
+            local.client = client
+            start = time.perf_counter()
+            response = client.post(url, body, content_type='application/json', HTTP_X_GATEWAY_KEY=self.key)
+            return time.perf_counter() - start, response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(post, range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        return summarize([r[0] for r in results], [r[1] for r in results], elapsed)
+
+    def run_asgi(self, body, options):
+        url = reverse('api:sensor-add-async')
+
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def post():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(url, body, content_type='application/json',
+                                                 headers={'X-Gateway-Key': self.key})
+                    return time.perf_counter() - start, response.status_code
+
+            return await asyncio.gather(*(post() for _ in range(options['requests'])))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        writer.flush()
+        summary = summarize([r[0] for r in results], [r[1] for r in results], elapsed)
+        summary['seconds_until_written'] = round(time.perf_counter() - start, 3)
+        return summary
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+import contextlib
+import logging
+import tempfile
+import time
+
+from api.gateways import issue_key
+from api.views import sensor_add
+from crop_monitoring.log import SamplingFilter
+from monitoring.benchmarks import write_results
+from monitoring.models import Plot, SensorGateway
+
+
+def legacy_trace(data):
+    """The print tracing sensor_add used to do for every request"""
+    readings = data['readings']
+    print("\n" + "=" * 60)
+    print("🔄 sensor_add() CALLED")
+    print(f"📦 Data received: {data}")
+    print(f"📍 plot_id: {data['plot_id']}")
+    print(f"📊 readings count: {len(readings)}")
+    for i, reading in enumerate(readings):
+        print(f"\n📝 Processing reading {i}: {reading}")
+        print(f"  sensor: '{reading['sensor']}'")
+        print(f"  value: {reading['value']}")
+        print(f"  sensor_lower: '{reading['sensor'].lower()}'")
+        print("  ✅ Sensor recognized")
+        print("  ✅ SensorReading created")
+    print(f"\n📊 FINAL: {len(readings)} readings added, anomaly: False")
+    print("=" * 60)
+
+
+class Command(BaseCommand):
+    help = 'Throughput of sensor_add with the old print tracing vs queued, sampled logging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--readings', type=int, default=5, help='Readings per request')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create(username=f'bench-{time.time_ns()}')
+        plot = Plot.objects.create(user=user, name='bench', location='bench', crop_type='wheat', size=1)
+        gateway = SensorGateway(owner=user, name='bench')
+        key = issue_key(gateway)
+        gateway.plots.add(plot)
+        data = {
+            'plot_id': plot.id,
+            'readings': [{'sensor': 'humidity', 'value': 60}] * options['readings'],
+        }
+        factory = APIRequestFactory()
+        count = options['requests']
+
+        def run(trace=None):
+            start = time.perf_counter()
+            for _ in range(count):
+                if trace:
+                    trace(data)
+                sensor_add(factory.post('/api/sensors/', data, format='json', HTTP_X_GATEWAY_KEY=key))
+            elapsed = time.perf_counter() - start
+            return {'requests': count, 'seconds': round(elapsed, 3), 'requests_per_s': round(count / elapsed, 1)}
+
+        samplers = [
+            f for handler in logging.getLogger('api').handlers
+            for f in handler.filters if isinstance(f, SamplingFilter)
+        ]
+        try:
+            results = {}
+            # Avant : prints synchrones vers un fichier (comme une sortie redirigée)
+            with tempfile.TemporaryFile('w', buffering=1, encoding='utf-8') as out, \
+                    contextlib.redirect_stdout(out):
+                results['print_tracing'] = run(legacy_trace)
+            # Après : logging en file d'attente, échantillonné puis complet
+            results['queued_logging'] = run()
+            rates = [f.rate for f in samplers]
+            for f in samplers:
+                f.rate = 1.0
+            results['queued_logging_unsampled'] = run()
+            for f, rate in zip(samplers, rates):
+                f.rate = rate
+        finally:
+            user.delete()
+        write_results(self, results, options['json'])
@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+import random
+import time
+
+from authentication.tokens import tokens_for_user
+from monitoring.benchmarks import Rollback, write_results
+from monitoring.management.commands.run_benchmarks import latency_stats
+from monitoring.models import (
+    AgentRecommendation, Alert, AnomalyEvent, FarmProfile, FieldPlot, Plot, SensorReading
+)
+
+ENDPOINTS = [
+    ('plots', 'api:plot-list'),
+    ('alerts', 'api:alert-list'),
+    ('recommendations', 'api:recommendation-list'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Frontend polling workload on the plot, alert and recommendation lists: '
+        'full responses vs conditional requests answered 304 Not Modified'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--username', help='Poll the data of this existing user instead of a fixture')
+        parser.add_argument('--plots', type=int, default=50)
+        parser.add_argument('--alerts', type=int, default=5000)
+        parser.add_argument('--recommendations', type=int, default=2000)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            try:
+                user = get_user_model().objects.get(username=options['username'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['username']} not found")
+            results = self.poll(user, options)
+        else:
+            try:
+                with transaction.atomic():
+                    results = self.poll(self.create_fixture(options), options)
+                    raise Rollback
+            except Rollback:
+                pass
+        write_results(self, results, options['json'])
+
+    def create_fixture(self, options):
+        user = get_user_model().objects.create(username=f'bench-{time.time_ns()}')
+        Plot.objects.bulk_create([
+            Plot(user=user, name=f'bench-{i}', location='bench', crop_type='wheat', size=1)
+            for i in range(options['plots'])
+        ])
+        plots = list(Plot.objects.filter(user=user))
+        Alert.objects.bulk_create([
+            Alert(plot=random.choice(plots), alert_type='soil_moisture', severity='high',
+                  current_value=random.uniform(0, 20), threshold_value=30)
+            for _ in range(options['alerts'])
+        ], batch_size=1000)
+
+        farm = FarmProfile.objects.create(owner=user, name='bench', location='bench', size=1, soil_type='loam')
+        field_plot = FieldPlot.objects.create(
+            farm=farm, name='bench', crop_type='wheat', crop_variety='bench', size=1,
+            planting_date=date.today() - timedelta(days=30), expected_harvest_date=date.today() + timedelta(days=60)
+        )
+        AnomalyEvent.objects.bulk_create([
+            AnomalyEvent(plot=field_plot, anomaly_type='moisture_drop', severity='high', detected_value=10,
+                         normal_range_min=30, normal_range_max=70, model_confidence=0.9)
+            for _ in range(options['recommendations'])
+        ], batch_size=1000)
+        AgentRecommendation.objects.bulk_create([
+            AgentRecommendation(anomaly_event=event, recommended_action='irrigation', action_details='Irrigate',
+                                explanation_text='Soil moisture below range', confidence='high')
+            for event in AnomalyEvent.objects.filter(plot=field_plot)
+        ], batch_size=1000)
+        return user
+
+    def poll(self, user, options):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(user).access_token}')
+        results = {}
+        for name, view_name in ENDPOINTS:
+            url = reverse(view_name)
+            first = client.get(url)
+            if first.status_code != 200 or 'ETag' not in first:
+                raise CommandError(f'{url} answered {first.status_code} without an ETag')
+            results[name] = {
+                'full': self.run(client, url, options['polls']),
+                'revalidated': self.run(client, url, options['polls'], HTTP_IF_NONE_MATCH=first['ETag']),
+            }
+        return results
+
+    def run(self, client, url, polls, **headers):
+        latencies, statuses, size = [], set(), 0
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(polls):
+                t0 = time.perf_counter()
+                response = client.get(url, **headers)
+                latencies.append(time.perf_counter() - t0)
+                statuses.add(response.status_code)
+                size += len(response.content)
+            elapsed = time.perf_counter() - start
+        return {
+            'status': sorted(statuses),
+            'requests_per_s': round(polls / elapsed, 1),
+            **latency_stats(latencies),
+            'queries_per_request': round(len(queries) / polls, 2),
+            'bytes_per_response': size // polls,
+        }
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from monitoring.benchmarks import write_results
+
+# Exécuté dans un processus neuf : setup, première requête, premier score
+FIRST_REQUEST = '''
+import json, os, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.test import Client
+if sys.argv[2] == "warm":
+    from monitoring.scoring import scoring
+    scoring.warm_up()
+response = Client().get(sys.argv[1], HTTP_HOST="127.0.0.1")
+request_s = time.perf_counter() - started
+from monitoring.scoring import scoring
+scoring.predict([[50.0, 25.0, 60.0]])
+print(json.dumps({
+    "status": response.status_code,
+    "request_s": request_s,
+    "score_s": time.perf_counter() - started,
+    "ml_stack_loaded": "sklearn" in sys.modules or "pandas" in sys.modules,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Cold start of a fresh process: manage.py check, then setup + first request + first anomaly '
+        'score, with and without model warm-up. Reports wall time and peak RSS of each child process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/metrics', help='URL of the first request')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        manage = str(settings.BASE_DIR / 'manage.py')
+        scenarios = {
+            'check': [sys.executable, manage, 'check'],
+            'first_request': [sys.executable, '-c', FIRST_REQUEST, options['path'], 'lazy'],
+            'first_request_warm': [sys.executable, '-c', FIRST_REQUEST, options['path'], 'warm'],
+        }
+        results = {}
+        for name, command in scenarios.items():
+            runs = [self.run(command) for _ in range(options['runs'])]
+            results[name] = {
+                'wall_ms': round(statistics.median(run['wall_s'] for run in runs) * 1000, 1),
+                'max_rss_mb': round(statistics.median(run['max_rss_kb'] for run in runs) / 1024, 1),
+            }
+            output = runs[-1]['output']
+            if output:
+                results[name].update({
+                    'status': output['status'],
+                    'first_request_ms': round(statistics.median(run['output']['request_s'] for run in runs) * 1000, 1),
+                    'first_score_ms': round(statistics.median(run['output']['score_s'] for run in runs) * 1000, 1),
+                    'ml_stack_loaded': output['ml_stack_loaded'],
+                })
+        write_results(self, results, options['json'])
+
+    @staticmethod
+    def run(command):
+        """Wall time, peak RSS and JSON output (if any) of a child process"""
+        started = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        stdout = process.stdout.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - started
+        try:
+            output = json.loads(stdout.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            output = None
+        # ru_maxrss est en Ko sous Linux
+        return {'wall_s': wall, 'max_rss_kb': usage.ru_maxrss, 'output': output}
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import json
+import time
+
+from monitoring import drift, ml
+from monitoring.models import Plot
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the last days of sensor readings (SensorHistogram) to the training distribution '
+        'of the anomaly model (PSI / KS) and, with --retrain, retrain it from recent history when '
+        'the inputs drifted. Web workers pick up the new model within a minute.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=drift.WINDOW_DAYS, help='Readings compared')
+        parser.add_argument('--plots', type=int, nargs='*', help='Plot ids (default: every plot)')
+        parser.add_argument('--retrain', action='store_true',
+                            help='Retrain when drift is detected, on every plot (not with --plots)')
+        parser.add_argument('--threshold', type=float, default=drift.PSI_ALERT, help='PSI of a drifting sensor')
+        parser.add_argument('--plot-share', type=float, default=getattr(settings, 'DRIFT_RETRAIN_PLOT_SHARE', 0.2),
+                            help='Share of drifting plots that also triggers retraining')
+        parser.add_argument('--training-days', type=int, default=30, help='History of the new model')
+        parser.add_argument('--reference', default=ml.DRIFT_REFERENCE_FILE)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['retrain'] and options['plots']:
+            # Un seul modèle pour toutes les parcelles : le réentraîner sur quelques-unes le dégraderait
+            raise CommandError('--retrain retrains the shared model on every plot and cannot be combined with --plots')
+        reference = drift.DriftReference.load(options['reference'])
+        if reference is None:
+            raise CommandError(f"No drift reference at {options['reference']}, train the model first")
+        plots = Plot.objects.order_by('pk')
+        if options['plots']:
+            plots = plots.filter(pk__in=options['plots'])
+        plots = list(plots.values_list('pk', 'name'))
+
+        started = time.perf_counter()
+        # Comptes sortis de la fenêtre : supprimés ici et non pendant l'ingestion
+        drift.prune()
+        report = drift.drift_report(plots, reference, options['days'])
+        elapsed = time.perf_counter() - started
+        threshold = options['threshold']
+        drifting_sensors = [
+            sensor for sensor, entry in report['overall'].items() if entry['psi'] is not None and entry['psi'] >= threshold
+        ]
+        drifting_plots = [
+            plot for plot in report['plots']
+            if any(entry['psi'] is not None and entry['psi'] >= threshold for entry in plot['sensors'].values())
+        ]
+        share = len(drifting_plots) / max(len(plots), 1)
+        retrain = bool(drifting_sensors) or (bool(drifting_plots) and share >= options['plot_share'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(dict(report, retrain_needed=retrain), indent=2))
+        else:
+            for sensor, entry in report['overall'].items():
+                psi = '-' if entry['psi'] is None else f"{entry['psi']:.3f}"
+                ks = '-' if entry['ks'] is None else f"{entry['ks']:.3f}"
+                self.stdout.write(f"{sensor:<15} PSI {psi:>6}  KS {ks:>6}  {entry['samples']:>10,} readings  "
+                                  f"{entry['status']}")
+            self.stdout.write(
+                f"{len(drifting_plots)}/{len(plots)} plots drifting (PSI >= {threshold}), "
+                f"computed in {elapsed * 1000:.0f} ms"
+            )
+
+        # Sortie JSON : messages sur stderr
+        out = self.stderr if options['json'] else self.stdout
+        if not retrain:
+            out.write(self.style.SUCCESS('No retraining needed'))
+            return
+        if not options['retrain']:
+            out.write(self.style.WARNING('Drift detected, run with --retrain to retrain the model'))
+            return
+        end = timezone.now().timestamp()
+        start = end - options['training_days'] * 86400
+        started = time.perf_counter()
+        try:
+            ml.train_from_history([pk for pk, _ in plots], start, end)
+        except ValueError as e:
+            raise CommandError(str(e))
+        out.write(self.style.SUCCESS(
+            f"Retrained on {options['training_days']} days of {len(plots)} plots in "
+            f"{time.perf_counter() - started:.1f}s, model version {ml.model_version()}"
+        ))
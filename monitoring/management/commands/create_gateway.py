@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.gateways import issue_key
+from monitoring.models import Plot, SensorGateway
+
+
+class Command(BaseCommand):
+    help = (
+        'Create a sensor gateway bound to plots, or rotate the key of an existing one. '
+        'The key is printed once, only its hash is stored.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Gateway name (new gateway)')
+        parser.add_argument('--owner', help='Username owning the gateway and its plots (new gateway)')
+        parser.add_argument('--plots', type=int, nargs='*', default=[], help='Plot ids the gateway may write to')
+        parser.add_argument('--rotate', type=int, metavar='GATEWAY_ID', help='Issue a new key for this gateway')
+
+    def handle(self, *args, **options):
+        if options['rotate']:
+            try:
+                gateway = SensorGateway.objects.get(id=options['rotate'])
+            except SensorGateway.DoesNotExist:
+                raise CommandError(f"Gateway {options['rotate']} not found")
+        else:
+            if not options['name'] or not options['owner']:
+                raise CommandError('--name and --owner are required to create a gateway')
+            try:
+                owner = get_user_model().objects.get(username=options['owner'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['owner']} not found")
+            gateway = SensorGateway(owner=owner, name=options['name'])
+
+        if options['plots']:
+            plots = list(Plot.objects.filter(id__in=options['plots'], user=gateway.owner))
+            missing = set(options['plots']) - {plot.id for plot in plots}
+            if missing:
+                raise CommandError(f'Plots not found or not owned by {gateway.owner}: {sorted(missing)}')
+
+        key = issue_key(gateway)
+        if options['plots']:
+            gateway.plots.set(plots)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Gateway {gateway.id} "{gateway.name}": {gateway.plots.count()} plot(s)'
+        ))
+        self.stdout.write(f'Key (shown once): {key}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+import os
+
+from monitoring import ml
+
+
+class Command(BaseCommand):
+    help = (
+        'Compile the pickled IsolationForest into the NumPy export (monitoring.forest) loaded by '
+        'web workers. train_model() writes both, this converts existing models.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=ml.MODEL_FILE, help='Pickled model file')
+        parser.add_argument('--output', default=ml.COMPILED_MODEL_FILE)
+
+    def handle(self, *args, **options):
+        model = ml.load_model(options['model'])
+        if model is None:
+            raise CommandError(f"No model at {options['model']}")
+        compiled = ml.export_model(model, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {compiled.n_trees} trees, {compiled.n_nodes:,} nodes (max depth {compiled.max_depth}) "
+            f"to {options['output']} ({os.path.getsize(options['output']):,} bytes, "
+            f"pickle {os.path.getsize(options['model']):,} bytes)"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+import time
+
+from api.forecast_alerts import HORIZON_HOURS, raise_predictive_alerts
+from monitoring.models import Plot
+
+
+class Command(BaseCommand):
+    help = (
+        'Forecast soil moisture of every plot from its rolling window buckets and raise alerts '
+        'for plots expected to leave their threshold range within the horizon. Run it every '
+        'bucket (2 hours) from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=HORIZON_HOURS, help='Forecast horizon')
+        parser.add_argument('--plots', type=int, nargs='*', help='Plot ids (default: every active plot)')
+        parser.add_argument('--dry-run', action='store_true', help='Print the alerts without saving them')
+
+    def handle(self, *args, **options):
+        plots = Plot.objects.select_related('user')
+        plots = plots.filter(pk__in=options['plots']) if options['plots'] else plots.filter(status='active')
+
+        started = time.perf_counter()
+        alerts = raise_predictive_alerts(plots, options['hours'], dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - started
+
+        if options['dry_run']:
+            for alert in alerts:
+                self.stdout.write(f"{alert.plot_id:>8} {alert.severity:<8} {alert.message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(alerts)} predictive alerts {'found' if options['dry_run'] else 'raised'} "
+            f"for a {options['hours']:g}h horizon in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+
+from api.streams import stream_frames
+from monitoring.benchmarks import write_results
+from monitoring.realtime import broker
+
+
+class Command(BaseCommand):
+    help = 'Load test live streams: many concurrent subscribers, one publishing thread'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--events', type=int, default=50, help='Events published per user')
+        parser.add_argument('--slow-fraction', type=float, default=0.05,
+                            help='Share of subscribers that read slowly, to exercise backpressure')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        results = asyncio.run(self.run(options))
+        write_results(self, results, options['json'])
+
+    async def run(self, options):
+        users = list(range(1, options['users'] + 1))
+        latencies = []
+        stats = {'frames': 0, 'resyncs': 0}
+
+        async def consume(user_id, slow):
+            frames = stream_frames(user_id, keepalive=3600)
+            await frames.__anext__()
+            try:
+                while True:
+                    frame = await frames.__anext__()
+                    stats['frames'] += 1
+                    if frame.startswith(b'event: resync'):
+                        stats['resyncs'] += 1
+                        continue
+                    payload = json.loads(frame.split(b'data: ', 1)[1])
+                    latencies.append(time.perf_counter() - payload['sent'])
+                    if payload.get('done'):
+                        return
+                    if slow:
+                        await asyncio.sleep(0.01)
+            finally:
+                await frames.aclose()
+
+        consumers = [
+            asyncio.create_task(consume(users[i % len(users)], random.random() < options['slow_fraction']))
+            for i in range(options['subscribers'])
+        ]
+        while broker.subscriber_count() < options['subscribers']:
+            await asyncio.sleep(0.01)
+
+        def publisher():
+            for seq in range(options['events']):
+                for user_id in users:
+                    broker.publish(user_id, 'readings', {'seq': seq, 'sent': time.perf_counter()})
+            for user_id in users:
+                broker.publish(user_id, 'readings', {'done': True, 'sent': time.perf_counter()})
+
+        start = time.perf_counter()
+        thread = threading.Thread(target=publisher)
+        thread.start()
+        await asyncio.gather(*consumers)
+        elapsed = time.perf_counter() - start
+        thread.join()
+
+        published = (options['events'] + 1) * len(users)
+        latencies.sort()
+        return {
+            'subscribers': options['subscribers'],
+            'users': len(users),
+            'events_published': published,
+            'frames_delivered': stats['frames'],
+            'resyncs': stats['resyncs'],
+            'seconds': round(elapsed, 3),
+            'frames_per_s': round(stats['frames'] / elapsed, 1),
+            'latency_p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'latency_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        }
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+import time
+
+from monitoring import drift, feature_store
+from monitoring.drift import WINDOW_DAYS, rebuild_histograms
+from monitoring.feature_store import WINDOWS, rebuild_window_stats
+from monitoring.models import Plot
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the rolling window statistics (SensorWindowStats) and the drift histograms '
+        '(SensorHistogram) from SensorReading, '
+        'after raw inserts such as seed_scale or deletions. With --prune-only, only delete the '
+        'buckets and histogram days that left their window: run it hourly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plots', type=int, nargs='*', help='Plot ids (default: every plot)')
+        parser.add_argument('--plot-batch', type=int, default=200, help='Plots per transaction')
+        parser.add_argument('--prune-only', action='store_true', help='Delete expired rows without rebuilding')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if not options['prune_only']:
+            plots = Plot.objects.all()
+            if options['plots']:
+                plots = plots.filter(pk__in=options['plots'])
+            plot_ids = list(plots.values_list('pk', flat=True))
+            readings = rebuild_window_stats(plot_ids, plot_batch=options['plot_batch'])
+            counted = rebuild_histograms(plot_ids, plot_batch=options['plot_batch'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {len(plot_ids)} plots over the last {max(WINDOWS) // 86400} days "
+                f"from {readings:,} readings, histograms over {WINDOW_DAYS} days from {counted:,}, "
+                f"in {time.perf_counter() - started:.1f}s"
+            ))
+        buckets, days = feature_store.prune(), drift.prune()
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {buckets:,} expired window buckets and {days:,} histogram rows "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as day_start, timedelta, timezone as dt_timezone
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+import os
+import time
+
+from monitoring import ml
+from monitoring.features import DEFAULT_BUCKET, DEFAULT_TOLERANCE
+from monitoring.models import FieldPlot
+from monitoring.rescoring import rescore_chunk, time_ranges
+from monitoring.seeding import init_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-score historical sensor readings with the anomaly model and rewrite the AnomalyEvent rows '
+        'of that model version. Example: --days 365 --chunk-days 30 --workers 8'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plots', type=int, nargs='*', help='FieldPlot ids (default: every linked plot)')
+        parser.add_argument('--owner', help='Only the plots of this username')
+        parser.add_argument('--start', help='First day (YYYY-MM-DD), default --days before --end')
+        parser.add_argument('--end', help='Last day included (YYYY-MM-DD), default now')
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--chunk-days', type=int, default=7, help='Time range of one task')
+        parser.add_argument('--plots-per-task', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (SQLite always uses 1)')
+        parser.add_argument('--model', default=ml.MODEL_FILE, help='Pickled model file')
+        parser.add_argument('--model-version', help='Label stored on the anomalies (default: model file hash)')
+        parser.add_argument('--bucket', type=int, default=DEFAULT_BUCKET, help='Seconds between scored vectors')
+        parser.add_argument('--tolerance', type=int, default=DEFAULT_TOLERANCE)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per insert statement')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['model']):
+            raise CommandError(f"No model at {options['model']}, train one first")
+        if options['chunk_days'] <= 0 or options['plots_per_task'] <= 0 or options['bucket'] <= 0:
+            raise CommandError('--chunk-days, --plots-per-task and --bucket must be positive')
+        version = options['model_version'] or ml.model_version(options['model'])
+
+        start, end = self.time_range(options)
+        bucket = options['bucket']
+        # Bornes des tâches alignées sur les buckets : chaque vecteur est dans une seule tâche
+        start = start // bucket * bucket
+        ranges = time_ranges(start, end, max(bucket, options['chunk_days'] * 86400 // bucket * bucket))
+
+        field_plots = FieldPlot.objects.all()
+        if options['plots']:
+            field_plots = field_plots.filter(pk__in=options['plots'])
+        if options['owner']:
+            owner = get_user_model().objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"Unknown user {options['owner']}")
+            field_plots = field_plots.filter(farm__owner=owner)
+        unlinked = field_plots.filter(sensor_plot__isnull=True).count()
+        plots = list(field_plots.filter(sensor_plot__isnull=False).order_by('pk').values_list(
+            'sensor_plot_id', 'pk', 'crop_type', 'planting_date'))
+        if unlinked:
+            self.stdout.write(self.style.WARNING(f'Skipping {unlinked} field plot(s) without a sensor plot'))
+        if not plots:
+            raise CommandError('No field plot with a sensor plot to score')
+
+        per_task = options['plots_per_task']
+        groups = [
+            {plot_id: (field_plot_id, crop, planting) for plot_id, field_plot_id, crop, planting in plots[i:i + per_task]}
+            for i in range(0, len(plots), per_task)
+        ]
+        tasks = [
+            {
+                'index': index,
+                'plots': group,
+                'start': low,
+                'end': high,
+                'model_file': options['model'],
+                'model_version': version,
+                'bucket': bucket,
+                'tolerance': options['tolerance'],
+                'chunk_size': options['chunk_size'],
+            }
+            for index, (group, (low, high)) in enumerate(
+                (group, time_range) for group in groups for time_range in ranges
+            )
+        ]
+        self.stdout.write(
+            f'Model {version}: {len(plots)} plots, {self.day(start)} to {self.day(end)}, {len(tasks)} tasks'
+        )
+
+        workers = 1 if connection.vendor == 'sqlite' else max(1, min(options['workers'], len(tasks)))
+        totals = {'scored': 0, 'anomalies': 0, 'replaced': 0}
+        started = time.perf_counter()
+        if workers == 1:
+            results = map(rescore_chunk, tasks)
+        else:
+            # Chaque worker ouvre sa propre connexion
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers, initializer=init_worker)
+            results = executor.map(rescore_chunk, tasks)
+
+        for done, counts in enumerate(results, 1):
+            for key in totals:
+                totals[key] += counts[key]
+            elapsed = time.perf_counter() - started
+            task = tasks[counts['index']]
+            self.stdout.write(
+                f"[{done}/{len(tasks)}] {counts['plots']} plots {self.day(task['start'])}..{self.day(task['end'])}: "
+                f"{counts['scored']:,} vectors, {counts['anomalies']} anomalies "
+                f"({counts['replaced']} replaced) in {counts['seconds']:.1f}s "
+                f"({totals['scored'] / elapsed:,.0f} vectors/s)"
+            )
+        if workers > 1:
+            executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {totals['scored']:,} vectors in {elapsed:.1f}s with {workers} worker(s) "
+            f"({totals['scored'] / max(elapsed, 1e-9):,.0f}/s): {totals['anomalies']:,} anomalies written, "
+            f"{totals['replaced']:,} previous ones of model {version} replaced"
+        ))
+
+    def time_range(self, options):
+        """(start, end) in epoch seconds from --start/--end/--days"""
+        def parse(value, name):
+            try:
+                return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise CommandError(f'--{name} must be YYYY-MM-DD')
+
+        end = parse(options['end'], 'end') + timedelta(days=1) if options['end'] else timezone.now()
+        if options['start']:
+            start = parse(options['start'], 'start')
+        else:
+            start = datetime.combine((end - timedelta(days=options['days'])).date(), day_start(),
+                                     tzinfo=dt_timezone.utc)
+        if start >= end:
+            raise CommandError('The range is empty')
+        return int(start.timestamp()), int(end.timestamp())
+
+    @staticmethod
+    def day(epoch):
+        return datetime.fromtimestamp(epoch, tz=dt_timezone.utc).strftime('%Y-%m-%d %H:%M')
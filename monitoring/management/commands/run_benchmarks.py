@@ -0,0 +1,362 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+import django
+import json
+import platform
+import random
+import statistics
+import time
+
+import numpy as np
+
+from api.ai_agent_engine import ALERT_TYPES, CropMonitoringAgent, RuleEngine
+from api.analysis_jobs import run_batch_analysis
+from api.gateways import invalidate_credentials, issue_key
+from api.ingestion import forget_plot
+from api.recommendations import invalidate_catalogue, to_db_alert
+from api.views import sensor_add
+from monitoring.benchmarks import Rollback, measure, write_results
+from monitoring.management.commands.run_simulator import simulated_values
+from monitoring.models import Alert, AnalysisJob, Plot, SensorGateway, SensorReading
+
+BENCHMARKS = ['ingestion', 'anomaly_detection', 'rule_engine', 'batch_analysis', 'alert_endpoints', 'simulator',
+              'forecasting']
+
+SENSORS = ['moisture', 'temperature', 'humidity', 'ph', 'light']
+
+# Valeurs plausibles par type, avec une part hors plage pour déclencher des alertes
+VALUE_RANGES = {
+    'temperature': (5, 45),
+    'humidity': (20, 95),
+    'soil_moisture': (10, 90),
+    'ph_level': (4.5, 8.5),
+    'light_intensity': (500, 90000),
+}
+
+
+def latency_stats(latencies):
+    latencies = sorted(latencies)
+    return {
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the hot path benchmarks (ingestion, anomaly detection, rules, batch analysis, '
+        'alert endpoints, simulator, forecasting) inside a rolled back transaction and print JSON results. '
+        'Run against a freshly migrated SQLite or Postgres database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='Benchmarks to run (default all)')
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 10, 100],
+                            help='Readings per sensor_add request')
+        parser.add_argument('--requests', type=int, default=200, help='sensor_add requests per batch size')
+        parser.add_argument('--plots', nargs='+', type=int, default=[1000, 10000],
+                            help='Plot counts for batch_analyze and forecasting')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+        parser.add_argument('--text', action='store_true', help='Print aligned text instead of JSON')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.rng = np.random.default_rng(options['seed'])
+        self.options = options
+        names = options['only'] or BENCHMARKS
+
+        results = {'meta': {
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'seed': options['seed'],
+        }}
+        for name in names:
+            self.stderr.write(f'Running {name}...')
+            try:
+                with transaction.atomic():
+                    results[name] = getattr(self, f'bench_{name}')()
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                # Les caches peuvent référencer des lignes annulées
+                invalidate_catalogue()
+
+        write_results(self, results, not options['text'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, default=str)
+
+    # ------------------------------------------------------------------ setup
+
+    def create_user(self):
+        return get_user_model().objects.create(username=f'bench-{time.time_ns()}')
+
+    def create_plots(self, user, count, readings_per_sensor=1):
+        Plot.objects.bulk_create(
+            [Plot(user=user, name=f'bench-{i}', location='bench', crop_type='wheat', size=1) for i in range(count)],
+            batch_size=1000
+        )
+        plots = list(Plot.objects.filter(user=user).order_by('id'))
+        now = timezone.now()
+        rows = [
+            SensorReading(plot=plot, sensor_type=sensor_type, value=float(self.rng.uniform(low, high)),
+                          unit='', timestamp=now)
+            for plot in plots
+            for sensor_type, (low, high) in VALUE_RANGES.items()
+            for _ in range(readings_per_sensor)
+        ]
+        SensorReading.objects.bulk_create(rows, batch_size=1000)
+        return plots
+
+    # ------------------------------------------------------------ benchmarks
+
+    def bench_ingestion(self):
+        """sensor_add with N readings per request, posted by a gateway"""
+        user = self.create_user()
+        plot = Plot.objects.create(user=user, name='bench', location='bench', crop_type='wheat', size=1)
+        gateway = SensorGateway(owner=user, name='bench')
+        key = issue_key(gateway)
+        gateway.plots.add(plot)
+        factory = APIRequestFactory()
+        results = {}
+        for batch_size in self.options['batch_sizes']:
+            body = {
+                'plot_id': plot.id,
+                'readings': [
+                    {'sensor': SENSORS[i % len(SENSORS)], 'value': round(random.uniform(10, 90), 2)}
+                    for i in range(batch_size)
+                ],
+            }
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(self.options['requests']):
+                request = factory.post('/api/sensors/', body, format='json', HTTP_X_GATEWAY_KEY=key)
+                t0 = time.perf_counter()
+                response = sensor_add(request)
+                latencies.append(time.perf_counter() - t0)
+                if response.status_code != 200:
+                    raise CommandError(f'sensor_add answered {response.status_code}: {response.data}')
+            elapsed = time.perf_counter() - start
+            results[f'batch_{batch_size}'] = {
+                'requests': len(latencies),
+                'requests_per_s': round(len(latencies) / elapsed, 1),
+                'readings_per_s': round(len(latencies) * batch_size / elapsed, 1),
+                **latency_stats(latencies),
+            }
+        forget_plot(plot.id)
+        invalidate_credentials()
+        return results
+
+    def bench_anomaly_detection(self):
+        """
+        IsolationForest through detect_anomalies, one row per call vs one
+        batch, with the sklearn model and its NumPy export (monitoring.forest),
+        and the explanation of the rows the export flags
+        """
+        import pickle
+        from sklearn.ensemble import IsolationForest
+        from monitoring.forest import compile_forest
+        from monitoring.ml import detect_anomalies
+
+        train = np.column_stack([
+            self.rng.normal(50, 8, 2000), self.rng.normal(25, 4, 2000), self.rng.normal(60, 8, 2000)
+        ])
+        model = IsolationForest(contamination=0.05, random_state=42).fit(train)
+        compiled = compile_forest(model)
+        rows = train[:1000].tolist()
+
+        single_calls = 200
+        results = {}
+        for name, scorer in (('sklearn', model), ('compiled', compiled)):
+            single = measure(lambda: [detect_anomalies([row], model=scorer) for row in rows[:single_calls]],
+                             self.options['repeat'])
+            batched = measure(lambda: detect_anomalies(rows, model=scorer), self.options['repeat'])
+            results[name] = {
+                'single': {'rows': single_calls, 'rows_per_s': round(single_calls / single['p50_s'], 1),
+                           'per_call_us': round(single['p50_s'] / single_calls * 1e6, 1)},
+                'batched': {'rows': len(rows), 'rows_per_s': round(len(rows) / batched['p50_s'], 1),
+                            'per_call_ms': round(batched['p50_s'] * 1000, 3)},
+            }
+        results['sklearn']['model_bytes'] = len(pickle.dumps(model))
+        results['compiled']['model_bytes'] = sum(
+            array.nbytes for array in (compiled.feature, compiled.threshold, compiled.children, compiled.value,
+                                       compiled.samples)
+        )
+        results['compiled']['max_abs_score_diff'] = float(
+            np.abs(compiled.score_samples(rows) - model.score_samples(rows)).max()
+        )
+
+        # Explications (monitoring.attribution) d'un lot de vecteurs signalés
+        from monitoring.attribution import explain
+        outliers = train[:1000] + self.rng.choice([-1, 1], (1000, 3)) * self.rng.uniform(20, 40, (1000, 3)) \
+            * (self.rng.random((1000, 3)) < 0.4)
+        scores = compiled.decision_function(outliers)
+        flagged = outliers[scores < 0]
+        thresholds = np.array([[40, 80, 20, 90], [15, 35, 5, 45], [40, 80, 20, 95]], dtype=float)
+        explained = measure(
+            lambda: explain(compiled, flagged, scores[scores < 0], thresholds).descriptions(), self.options['repeat']
+        )
+        results['compiled']['explain'] = {
+            'rows': len(flagged), 'rows_per_s': round(len(flagged) / explained['p50_s'], 1),
+            'per_call_ms': round(explained['p50_s'] * 1000, 3),
+        }
+        return results
+
+    def bench_rule_engine(self):
+        """RuleEngine.evaluate_value and a full analyze_sensor_data per plot"""
+        engine = RuleEngine()
+        agent = CropMonitoringAgent()
+        values = [
+            (alert_type, float(self.rng.uniform(*VALUE_RANGES[alert_type.value])))
+            for alert_type in ALERT_TYPES
+            for _ in range(20000)
+        ]
+        evaluations = measure(lambda: [engine.evaluate_value(t, v) for t, v in values], self.options['repeat'])
+
+        plots = [
+            {key: float(self.rng.uniform(low, high)) for key, (low, high) in VALUE_RANGES.items()}
+            for _ in range(10000)
+        ]
+        analyses = measure(
+            lambda: [agent.analyze_sensor_data(data, plot_id='bench', timestamp='2025-01-01T00:00:00')
+                     for data in plots],
+            self.options['repeat']
+        )
+        return {
+            'evaluate_value': {'values': len(values),
+                               'values_per_s': round(len(values) / evaluations['p50_s'], 1)},
+            'analyze_sensor_data': {'plots': len(plots),
+                                    'plots_per_s': round(len(plots) / analyses['p50_s'], 1)},
+        }
+
+    def bench_batch_analysis(self):
+        """run_batch_analysis (what batch_analyze runs) over all plots of one user"""
+        results = {}
+        for count in self.options['plots']:
+            user = self.create_user()
+            self.create_plots(user, count)
+            job = AnalysisJob.objects.create(user=user, plots_total=count)
+            start = time.perf_counter()
+            job = run_batch_analysis(job)
+            elapsed = time.perf_counter() - start
+            if job.status != 'completed':
+                raise CommandError(f'Batch analysis failed: {job.error}')
+            results[f'plots_{count}'] = {
+                'plots': job.plots_analyzed,
+                'alerts_created': job.alerts_created,
+                'seconds': round(elapsed, 3),
+                'plots_per_s': round(job.plots_analyzed / elapsed, 1),
+            }
+        return results
+
+    def bench_alert_endpoints(self):
+        """GET /api/alerts/summary/ and the paginated /api/alerts/ list"""
+        user = self.create_user()
+        plots = self.create_plots(user, 100)
+        agent = CropMonitoringAgent()
+        alerts = []
+        for plot in plots:
+            for _ in range(50):
+                data = {key: float(self.rng.uniform(low, high)) for key, (low, high) in VALUE_RANGES.items()}
+                alerts.extend(
+                    to_db_alert(plot, alert)
+                    for alert in agent.analyze_sensor_data(data, plot_id=str(plot.id), timestamp='')
+                )
+        Alert.objects.bulk_create(alerts, batch_size=1000)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        results = {'alerts': len(alerts)}
+        for name, url in [('summary', reverse('api:alert-summary')), ('list', reverse('api:alert-list'))]:
+            latencies = []
+            for _ in range(20 * self.options['repeat']):
+                t0 = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - t0)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} answered {response.status_code}')
+            results[name] = {'requests': len(latencies), **latency_stats(latencies)}
+        return results
+
+    def bench_simulator(self):
+        """One run_simulator tick per iteration: values, a reading per sensor, a model prediction"""
+        from sklearn.ensemble import IsolationForest
+        import pandas as pd
+
+        user = self.create_user()
+        plots = self.create_plots(user, 50, readings_per_sensor=0)
+        ticks = 10
+        model = IsolationForest(contamination=0.05, random_state=42).fit(
+            [simulated_values(step) for step in range(200)]
+        )
+
+        def run():
+            for step in range(ticks):
+                batch = []
+                for plot in plots:
+                    moisture, temp, hum = simulated_values(step)
+                    for sensor_type, value, unit in [
+                        ('moisture', moisture, 'percentage'),
+                        ('temperature', temp, 'celsius'),
+                        ('humidity', hum, 'percentage')
+                    ]:
+                        SensorReading.objects.create(plot=plot, sensor_type=sensor_type, value=value,
+                                                     unit=unit, timestamp=timezone.now())
+                    batch.append([moisture, temp, hum])
+                model.predict(pd.DataFrame(batch, columns=['moisture', 'temp', 'hum']))
+
+        timing = measure(run, self.options['repeat'])
+        readings = ticks * len(plots) * 3
+        return {
+            'plots': len(plots),
+            'ticks': ticks,
+            'ticks_per_s': round(ticks / timing['p50_s'], 1),
+            'readings_per_s': round(readings / timing['p50_s'], 1),
+        }
+
+    def bench_forecasting(self):
+        """
+        Moisture forecasts (monitoring.forecasting): fitting alone on
+        synthetic series, then predictive alerts read from the window store
+        """
+        from api.forecast_alerts import raise_predictive_alerts
+        from monitoring.feature_store import bucket_sums, upsert_sums
+        from monitoring.forecasting import WINDOW, fit
+
+        results = {}
+        for count in self.options['plots']:
+            # Assèchement linéaire, pente et bruit propres à chaque parcelle
+            steps = np.arange(12)
+            series = self.rng.uniform(35, 70, (count, 1)) - self.rng.uniform(0, 3, (count, 1)) * steps \
+                + self.rng.normal(0, 1, (count, 12))
+            fitted = measure(lambda: fit(np.arange(count), series).path(12), self.options['repeat'])
+
+            user = self.create_user()
+            plots = self.create_plots(user, count, readings_per_sensor=0)
+            now = timezone.now()
+            epochs = now.timestamp() - np.arange(48)[::-1] * 1800
+            plot_ids = np.repeat([plot.id for plot in plots], len(epochs))
+            values = (series[:, :1] - self.rng.uniform(0, 1.5, (count, 1)) * np.arange(48) / 4).reshape(-1)
+            upsert_sums(bucket_sums(plot_ids, ['soil_moisture'] * len(plot_ids), np.tile(epochs, count), values,
+                                    windows=(WINDOW,)))
+            queryset = Plot.objects.filter(user=user)
+            alerts = []
+            raised = measure(lambda: alerts.append(len(raise_predictive_alerts(queryset, 12, now, dry_run=True))),
+                             self.options['repeat'])
+            results[f'plots_{count}'] = {
+                'fit_ms': round(fitted['p50_s'] * 1000, 3),
+                'fit_plots_per_s': round(count / fitted['p50_s'], 1),
+                'alerts_seconds': round(raised['p50_s'], 3),
+                'alerts_plots_per_s': round(count / raised['p50_s'], 1),
+                'predictive_alerts': alerts[-1],
+            }
+        return results
@@ -3,13 +3,28 @@ from monitoring.models import FieldPlot, SensorReading, AnomalyEvent, AgentRecom
 import time
 import random
 from datetime import datetime, timedelta
-import pandas as pd
-from sklearn.ensemble import IsolationForest
-import os
-import pickle
 import math
 
-MODEL_FILE = 'isolation_model.pkl'
+from api.thresholds import thresholds_for_plot
+from monitoring import ml
+from monitoring.attribution import SENSOR_ANOMALIES, explain, feature_thresholds
+from monitoring.features import FEATURE_SENSORS
+from monitoring.forest import compile_forest
+
+
+def simulated_values(time_step):
+    """Valeurs (moisture, temp, hum) d'une parcelle à un pas de temps"""
+    # Patterns réalistes
+    moisture = round(50 + 10*math.sin(time_step/5) + random.uniform(-5,5),2)
+    temp = round(25 + 5*math.sin(time_step/10) + random.uniform(-2,2),2)
+    hum = round(60 + 10*math.sin(time_step/7) + random.uniform(-5,5),2)
+
+    # Injection d'anomalies ponctuelles
+    if time_step % 10 == 0:  # toutes les 10 itérations
+        moisture = random.choice([20,85])
+        temp = random.choice([10,40])
+
+    return moisture, temp, hum
 
 class Command(BaseCommand):
     help = 'Run advanced crop simulator with anomaly injection and ML detection'
@@ -32,13 +47,15 @@ class Command(BaseCommand):
             return
 
         # Charger ou créer IsolationForest
-        if os.path.exists(MODEL_FILE):
-            with open(MODEL_FILE, 'rb') as f:
-                iso_model = pickle.load(f)
+        iso_model = ml.load_model()
+        if iso_model is not None:
             self.stdout.write('IsolationForest model loaded.')
         else:
             iso_model = None
             self.stdout.write('No model found, will train after first batch.')
+        # Évaluateur NumPy : scores et attributions par capteur
+        compiled = compile_forest(iso_model) if iso_model else None
+        thresholds = {plot.pk: feature_thresholds(thresholds_for_plot(plot)) for plot in plots}
 
         start_time = datetime.now()
         end_time = start_time + timedelta(seconds=duration) if duration > 0 else None
@@ -49,15 +66,7 @@ class Command(BaseCommand):
             batch_readings = []
 
             for plot in plots:
-                # Patterns réalistes
-                moisture = round(50 + 10*math.sin(time_step/5) + random.uniform(-5,5),2)
-                temp = round(25 + 5*math.sin(time_step/10) + random.uniform(-2,2),2)
-                hum = round(60 + 10*math.sin(time_step/7) + random.uniform(-5,5),2)
-
-                # Injection d'anomalies ponctuelles
-                if time_step % 10 == 0:  # toutes les 10 itérations
-                    moisture = random.choice([20,85])
-                    temp = random.choice([10,40])
+                moisture, temp, hum = simulated_values(time_step)
 
                 # Créer SensorReadings
                 for sensor_type, value, unit in [
@@ -77,37 +86,41 @@ class Command(BaseCommand):
                 batch_data.append([moisture,temp,hum])
                 batch_readings.append(plot)
 
-            # Entraîner IsolationForest si pas encore fait
+            # Entraîner IsolationForest si pas encore fait : pickle, export NumPy
+            # et référence de dérive sont écrits ensemble
             if iso_model is None and len(batch_data) >= 5:
-                df_train = pd.DataFrame(batch_data, columns=['moisture','temp','hum'])
-                iso_model = IsolationForest(contamination=0.05, random_state=42)
-                iso_model.fit(df_train)
-                with open(MODEL_FILE,'wb') as f:
-                    pickle.dump(iso_model,f)
+                iso_model = ml.train_model(batch_data)
+                compiled = compile_forest(iso_model)
                 self.stdout.write(self.style.SUCCESS('IsolationForest trained and saved.'))
 
             # Détection des anomalies
-            if iso_model:
-                df_batch = pd.DataFrame(batch_data, columns=['moisture','temp','hum'])
-                predictions = iso_model.predict(df_batch)
-                for i,pred in enumerate(predictions):
-                    if pred==-1:
+            if compiled:
+                scores = compiled.decision_function(batch_data)
+                flagged = [i for i, score in enumerate(scores.tolist()) if score < 0]
+                if flagged:
+                    explanation = explain(
+                        compiled, [batch_data[i] for i in flagged], scores[flagged],
+                        [thresholds[batch_readings[i].pk] for i in flagged],
+                    )
+                    descriptions = explanation.descriptions()
+                    for j, i in enumerate(flagged):
+                        sensor = FEATURE_SENSORS[explanation.sensor[j]]
                         anomaly = AnomalyEvent.objects.create(
                             plot=batch_readings[i],
-                            anomaly_type='moisture_drop',
-                            severity='high',
-                            detected_value=batch_data[i][0],
-                            normal_range_min=40,
-                            normal_range_max=80,
-                            model_confidence=0.9,
-                            description=f'Anomalous reading detected: {batch_data[i]}'
+                            anomaly_type=explanation.anomaly_type[j],
+                            severity=explanation.severity[j],
+                            detected_value=round(float(explanation.value[j]), 3),
+                            normal_range_min=float(explanation.normal_min[j]),
+                            normal_range_max=float(explanation.normal_max[j]),
+                            model_confidence=round(float(explanation.confidence[j]), 3),
+                            description=descriptions[j]
                         )
                         AgentRecommendation.objects.create(
                             anomaly_event=anomaly,
-                            recommended_action='monitoring',
-                            action_details='Increase monitoring of soil moisture',
+                            recommended_action=SENSOR_ANOMALIES[sensor][1],
+                            action_details=f"Increase monitoring of {sensor.replace('_', ' ')}",
                             explanation_text='Anomaly detected by IsolationForest',
-                            confidence='high'
+                            confidence='high' if explanation.confidence[j] >= 0.6 else 'medium'
                         )
                         self.stdout.write(f'[ML] Anomaly created: {anomaly.description} / Recommendation created.')
 
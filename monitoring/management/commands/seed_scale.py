@@ -0,0 +1,143 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+import os
+import random
+import time
+
+from api.ai_agent_engine import AlertType
+from api.recommendations import recommendation_set_id
+from monitoring.attribution import SENSOR_ANOMALIES
+from monitoring.models import FarmProfile, FieldPlot, Plot
+from monitoring.seeding import SERIES, init_worker, seed_farm
+
+CROPS = [crop for crop, _ in FieldPlot.CROP_TYPES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate farms, plots, sensor readings, anomalies, recommendations and alerts at scale. '
+        'Example: --farms 50 --plots-per-farm 100 --days 730 --interval 60 '
+        '(5k plots, 2 years of 1-minute readings)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farms', type=int, default=10)
+        parser.add_argument('--plots-per-farm', type=int, default=20)
+        parser.add_argument('--days', type=int, default=30, help='History length, ending now')
+        parser.add_argument('--interval', type=int, default=600, help='Seconds between readings')
+        parser.add_argument('--anomaly-rate', type=float, default=0.0005,
+                            help='Fraction of timestamps with an injected anomaly')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes, one farm at a time each (SQLite always uses 1)')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Rows per insert statement')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed', help='Username and farm name prefix')
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0 or options['days'] <= 0:
+            raise CommandError('--days and --interval must be positive')
+
+        random.seed(options['seed'])
+        end = int(timezone.now().timestamp()) // options['interval'] * options['interval']
+        start = end - options['days'] * 86400
+        timestamps = (end - start) // options['interval']
+        plots_total = options['farms'] * options['plots_per_farm']
+        self.stdout.write(
+            f"{options['farms']} farms, {plots_total} plots, "
+            f"{timestamps * len(SERIES) * plots_total:,} readings to write"
+        )
+
+        farms = self.create_farms(options)
+        recommendation_sets = {
+            (sensor_type, direction): recommendation_set_id(AlertType(sensor_type), direction)
+            for sensor_type in SENSOR_ANOMALIES
+            for direction in ('low', 'high')
+        }
+        tasks = [
+            {
+                'farm_id': farm_id,
+                'plots': plots,
+                'seed': options['seed'] + i,
+                'start': start,
+                'end': end,
+                'interval': options['interval'],
+                'anomaly_rate': options['anomaly_rate'],
+                'chunk_size': options['chunk_size'],
+                'recommendation_sets': recommendation_sets,
+            }
+            for i, (farm_id, plots) in enumerate(farms)
+        ]
+
+        workers = 1 if connection.vendor == 'sqlite' else max(1, min(options['workers'], len(tasks)))
+        totals = {'readings': 0, 'anomalies': 0, 'alerts': 0}
+        started = time.perf_counter()
+        if workers == 1:
+            results = map(seed_farm, tasks)
+        else:
+            # Chaque worker ouvre sa propre connexion
+            connections.close_all()
+            executor = ProcessPoolExecutor(workers, initializer=init_worker)
+            results = executor.map(seed_farm, tasks)
+
+        for done, (farm_id, counts) in enumerate(results, 1):
+            for key, value in counts.items():
+                totals[key] += value
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"[{done}/{len(tasks)}] farm {farm_id}: {counts['readings']:,} readings, "
+                f"{counts['anomalies']} anomalies ({totals['readings'] / elapsed:,.0f} readings/s)"
+            )
+        if workers > 1:
+            executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {totals['readings']:,} readings, {totals['anomalies']:,} anomalies and recommendations, "
+            f"{totals['alerts']:,} alerts in {elapsed:.1f}s with {workers} worker(s)"
+        ))
+
+    def create_farms(self, options):
+        """Users, farms and plots, returns [(farm_id, [(field_plot_id, plot_id)])]"""
+        run = time.strftime('%Y%m%d%H%M%S')
+        password = make_password(None)
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(username=f"{options['prefix']}-{run}-{i}", password=password)
+            for i in range(options['farms'])
+        ])
+        farms = FarmProfile.objects.bulk_create([
+            FarmProfile(owner=user, name=f"{options['prefix']} farm {run}-{i}", location=f'Region {i % 12}',
+                        size=options['plots_per_farm'] * 5, soil_type=random.choice(['loam', 'clay', 'sand']))
+            for i, user in enumerate(users)
+        ])
+
+        field_plots, plots = [], []
+        today = date.today()
+        for farm, user in zip(farms, users):
+            for j in range(options['plots_per_farm']):
+                crop = random.choice(CROPS)
+                planting = today - timedelta(days=random.randint(0, 120))
+                plot = Plot(user=user, name=f'{farm.name} / Plot {j}', location=farm.location,
+                            crop_type=crop, size=5)
+                plots.append(plot)
+                field_plots.append(FieldPlot(
+                    farm=farm, name=f'Plot {j}', crop_type=crop, crop_variety='synthetic', size=5,
+                    planting_date=planting, expected_harvest_date=planting + timedelta(days=120),
+                    sensor_plot=plot
+                ))
+        Plot.objects.bulk_create(plots, batch_size=1000)
+        FieldPlot.objects.bulk_create(field_plots, batch_size=1000)
+
+        per_farm = options['plots_per_farm']
+        return [
+            (farm.id, [
+                (field_plot.id, plot.id)
+                for field_plot, plot in zip(field_plots[i * per_farm:(i + 1) * per_farm],
+                                            plots[i * per_farm:(i + 1) * per_farm])
+            ])
+            for i, farm in enumerate(farms)
+        ]
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from datetime import date
+import time
+
+from api.dashboard import invalidate_dashboard
+from monitoring.agronomy import materialize
+from monitoring.models import FieldPlot
+
+
+class Command(BaseCommand):
+    help = (
+        'Materialize daily agronomic indices (DailyAgronomy: GDD, FAO-56 ET0, water balance) '
+        'from WeatherData and IrrigationLog. Each plot is recomputed from its last stored day, '
+        'run it hourly from cron; --since recomputes older days after late weather data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plots', type=int, nargs='*', help='FieldPlot ids (default: every field plot)')
+        parser.add_argument('--since', help='Recompute from this day (YYYY-MM-DD)')
+        parser.add_argument('--plot-batch', type=int, default=500, help='Plots per transaction')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+
+        started = time.perf_counter()
+        written = materialize(options['plots'] or None, since, plot_batch=options['plot_batch'])
+        elapsed = time.perf_counter() - started
+
+        plots = FieldPlot.objects.filter(sensor_plot__isnull=False)
+        if options['plots']:
+            plots = plots.filter(pk__in=options['plots'])
+        invalidate_dashboard(plots.values_list('sensor_plot__user_id', flat=True))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written:,} plot-days in {elapsed:.2f}s"))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import os
+import time
+
+import numpy as np
+
+from monitoring import ml
+from monitoring.features import DEFAULT_BUCKET, DEFAULT_TOLERANCE, FeatureBuilder
+from monitoring.models import Plot
+from monitoring.online import HalfSpaceTrees
+
+
+class Command(BaseCommand):
+    help = (
+        'Feed the readings received since the last checkpoint to the online anomaly model '
+        '(Half-Space Trees, one mass profile per plot) and checkpoint it. Run it periodically: '
+        'each run only reads the new readings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint', default=ml.ONLINE_MODEL_FILE)
+        parser.add_argument('--days', type=int, default=7, help='History read by the first run')
+        parser.add_argument('--plots', type=int, nargs='*', help='Plot ids (default: every plot)')
+        parser.add_argument('--bucket', type=int, default=DEFAULT_BUCKET, help='Seconds between vectors')
+        parser.add_argument('--tolerance', type=int, default=DEFAULT_TOLERANCE)
+        parser.add_argument('--reset', action='store_true', help='Start a new model from --days of history')
+        parser.add_argument('--trees', type=int, default=25, help='New models only')
+        parser.add_argument('--height', type=int, default=8, help='New models only')
+        parser.add_argument('--window-size', type=int, default=250, help='New models only, rows per plot window')
+
+    def handle(self, *args, **options):
+        path = options['checkpoint']
+        end = timezone.now().timestamp()
+        if os.path.exists(path) and not options['reset']:
+            model, extra = HalfSpaceTrees.load(path)
+            start = float(extra['last_time'])
+        else:
+            try:
+                model = HalfSpaceTrees(options['trees'], options['height'], options['window_size'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            start = end - options['days'] * 86400
+
+        plots = Plot.objects.all()
+        if options['plots']:
+            plots = plots.filter(pk__in=options['plots'])
+        plot_ids = list(plots.values_list('pk', flat=True))
+        builder = FeatureBuilder(bucket=options['bucket'], tolerance=options['tolerance'])
+        # Même grille que FeatureBuilder : la prochaine exécution reprend au dernier bucket complet
+        end = np.floor(end / builder.bucket) * builder.bucket
+
+        started = time.perf_counter()
+        rows = anomalies = 0
+        for batch in builder.iter_batches(plot_ids, start, end):
+            decision = model.learn(batch.values, batch.plot_ids)
+            rows += batch.size
+            anomalies += int((decision < 0).sum())
+        elapsed = time.perf_counter() - started
+        model.save(path, last_time=end)
+
+        ready = int((~np.isnan(model.offsets)).sum())
+        self.stdout.write(self.style.SUCCESS(
+            f"Learned {rows:,} vectors of {len(plot_ids)} plots in {elapsed:.1f}s "
+            f"({rows / max(elapsed, 1e-9):,.0f}/s), {anomalies:,} flagged; {ready}/{len(model.plot_ids)} plots ready; "
+            f"checkpoint {os.path.getsize(path) / 1e6:.1f} MB"
+        ))
@@ -0,0 +1,227 @@
+"""
+In-process metrics in the Prometheus text format
+Counters and latency histograms are aggregated in memory by each worker
+process and exposed at /metrics for a local scraper
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Secondes, de la requête rapide au lot lent
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+ALLOWED_IPS = set(getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterValue:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Metric:
+    """A named metric with optional labels, one value object per label set"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._values.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._values.setdefault(values, self._new_value())
+        return child
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(
+            f'{name}{_format_labels(labelnames, values, extra)} {_format_value(value)}'
+            for name, labelnames, values, extra, value in self.samples()
+        )
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def samples(self):
+        for values, child in list(self._values.items()):
+            yield self.name, self.labelnames, values, (), child.value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def samples(self):
+        for values, child in list(self._values.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket', self.labelnames, values,
+                       (('le', _format_value(float(bound))),), cumulative)
+            yield f'{self.name}_sum', self.labelnames, values, (), total
+            yield f'{self.name}_count', self.labelnames, values, (), count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
+
+# Ingestion
+INGEST_READINGS = registry.counter(
+    'crop_ingest_readings_total', 'Sensor readings written'
+)
+INGEST_REJECTED = registry.counter(
+    'crop_ingest_rejected_total', 'Sensor readings rejected by validation'
+)
+DB_WRITE_SECONDS = registry.histogram(
+    'crop_db_write_seconds', 'Time spent in bulk write transactions', ['operation']
+)
+
+# Scoring
+MODEL_LOAD_SECONDS = registry.histogram(
+    'crop_model_load_seconds', 'Time to load the anomaly model from disk'
+)
+MODEL_PREDICT_SECONDS = registry.histogram(
+    'crop_model_predict_seconds', 'Time spent in anomaly model predictions'
+)
+MODEL_PREDICTIONS = registry.counter(
+    'crop_model_predictions_total', 'Rows scored by the anomaly model', ['result']
+)
+RULE_EVALUATION_SECONDS = registry.histogram(
+    'crop_rule_evaluation_seconds', 'Time to evaluate the threshold rules for one plot'
+)
+
+# Alerting
+ALERTS_CREATED = registry.counter(
+    'crop_alerts_created_total', 'Alerts saved', ['source', 'alert_type', 'severity']
+)
+
+
+def count_alerts(source, alerts):
+    """Count saved Alert rows by type and severity"""
+    for alert in alerts:
+        ALERTS_CREATED.labels(source, alert.alert_type, alert.severity).inc()
+
+
+def metrics_view(request):
+    """GET /metrics, restricted to METRICS_ALLOWED_IPS"""
+    if request.META.get('REMOTE_ADDR') not in ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
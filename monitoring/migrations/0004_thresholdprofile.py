@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0003_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThresholdProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('crop_type', models.CharField(default='default', help_text="Crop type, or 'default' for all crops", max_length=100)),
+                ('growth_stage', models.CharField(choices=[('any', 'Any Stage'), ('seedling', 'Seedling'), ('vegetative', 'Vegetative'), ('flowering', 'Flowering'), ('maturity', 'Maturity')], default='any', max_length=20)),
+                ('alert_type', models.CharField(choices=[('temperature', 'Temperature'), ('humidity', 'Humidity'), ('soil_moisture', 'Soil Moisture'), ('ph_level', 'pH Level'), ('light_intensity', 'Light Intensity')], max_length=50)),
+                ('min_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('critical_min', models.FloatField()),
+                ('critical_max', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['crop_type', 'growth_stage', 'alert_type'],
+                'constraints': [models.UniqueConstraint(fields=('crop_type', 'growth_stage', 'alert_type'), name='unique_threshold_profile')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0004_thresholdprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='message',
+            field=models.TextField(blank=True, help_text='Empty when rendered at read time from the values'),
+        ),
+        migrations.CreateModel(
+            name='RecommendationSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(max_length=50)),
+                ('direction', models.CharField(choices=[('low', 'Below Range'), ('high', 'Above Range')], max_length=10)),
+                ('recommendations', models.JSONField(default=list)),
+            ],
+            options={
+                'ordering': ['alert_type', 'direction'],
+                'constraints': [models.UniqueConstraint(fields=('alert_type', 'direction'), name='unique_recommendation_set')],
+            },
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='recommendation_set',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='alerts', to='monitoring.recommendationset'),
+        ),
+    ]
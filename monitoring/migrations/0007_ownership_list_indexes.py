@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0006_sensorgateway'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentrecommendation',
+            index=models.Index(fields=['-generated_at'], name='agent_recom_generat_b32354_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomalyevent',
+            index=models.Index(fields=['-detected_at'], name='anomaly_eve_detecte_c2bc9c_idx'),
+        ),
+    ]
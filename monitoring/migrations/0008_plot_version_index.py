@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0007_ownership_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plot',
+            index=models.Index(fields=['user', 'updated_at'], name='monitoring__user_id_6c378b_idx'),
+        ),
+    ]
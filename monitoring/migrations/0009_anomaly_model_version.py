@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0008_plot_version_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalyevent',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='fieldplot',
+            name='sensor_plot',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='field_plot', to='monitoring.plot'),
+        ),
+    ]
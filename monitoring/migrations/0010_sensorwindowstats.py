@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0009_anomaly_model_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorWindowStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensor_type', models.CharField(choices=[('temperature', 'Temperature (°C)'), ('humidity', 'Humidity (%)'), ('soil_moisture', 'Soil Moisture (%)'), ('ph_level', 'pH Level'), ('light_intensity', 'Light Intensity (lux)')], max_length=50)),
+                ('window', models.PositiveIntegerField(help_text='Rolling window length in seconds')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum_value', models.FloatField(default=0)),
+                ('sum_value_sq', models.FloatField(default=0)),
+                ('sum_time', models.FloatField(default=0)),
+                ('sum_time_sq', models.FloatField(default=0)),
+                ('sum_time_value', models.FloatField(default=0)),
+                ('min_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('plot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='window_stats', to='monitoring.plot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', 'bucket_start'], name='monitoring__window_3e28b2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('plot', 'sensor_type', 'window', 'bucket_start'), name='unique_window_bucket')],
+            },
+        ),
+    ]
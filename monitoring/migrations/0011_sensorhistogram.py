@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0010_sensorwindowstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensor_type', models.CharField(choices=[('temperature', 'Temperature (°C)'), ('humidity', 'Humidity (%)'), ('soil_moisture', 'Soil Moisture (%)'), ('ph_level', 'pH Level'), ('light_intensity', 'Light Intensity (lux)')], max_length=50)),
+                ('day', models.DateField()),
+                ('bin', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('plot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='histograms', to='monitoring.plot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='monitoring__day_75f5a9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('plot', 'sensor_type', 'day', 'bin'), name='unique_histogram_bin')],
+            },
+        ),
+    ]
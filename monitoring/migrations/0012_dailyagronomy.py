@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0011_sensorhistogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAgronomy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('observations', models.PositiveIntegerField(default=0, help_text='WeatherData rows of the day')),
+                ('temp_min', models.FloatField()),
+                ('temp_max', models.FloatField()),
+                ('humidity', models.FloatField(help_text='Mean relative humidity in %')),
+                ('wind_speed', models.FloatField(help_text='Mean wind speed in m/s')),
+                ('solar_radiation', models.FloatField(help_text='Daily solar radiation in MJ/m²')),
+                ('rainfall', models.FloatField(help_text='Rainfall in mm')),
+                ('irrigation', models.FloatField(default=0, help_text='Irrigation in mm over the plot area')),
+                ('gdd', models.FloatField(help_text='Growing degree days')),
+                ('gdd_cumulative', models.FloatField()),
+                ('et0', models.FloatField(help_text='FAO-56 reference evapotranspiration in mm')),
+                ('etc', models.FloatField(help_text='Crop evapotranspiration (Kc x ET0) in mm')),
+                ('water_balance', models.FloatField(help_text='Rainfall + irrigation - ETc in mm')),
+                ('water_balance_cumulative', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agronomy', to='monitoring.fieldplot')),
+            ],
+            options={
+                'verbose_name': 'Daily Agronomy',
+                'verbose_name_plural': 'Daily Agronomy',
+                'db_table': 'daily_agronomy',
+                'ordering': ['plot', '-day'],
+                'constraints': [models.UniqueConstraint(fields=('plot', 'day'), name='unique_agronomy_day')],
+            },
+        ),
+    ]
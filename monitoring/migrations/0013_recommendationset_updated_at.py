@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-20 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0012_dailyagronomy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationset',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0014_alert_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agentrecommendation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
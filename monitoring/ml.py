@@ -1,29 +1,132 @@
+import hashlib
 import os
 import pickle
-import pandas as pd
-from sklearn.ensemble import IsolationForest
+import numpy as np
+
+# pandas et scikit-learn sont importés dans les fonctions qui en ont besoin :
+# les workers web notent avec l'export NumPy (monitoring.scoring) sans les charger
+from monitoring.drift import DriftReference, ReferenceCounter
+from monitoring.features import FeatureBuilder
+from monitoring.files import atomic_write
+from monitoring.forest import CompiledForest, compile_forest
+from monitoring.online import PlotModel
+from monitoring.metrics import MODEL_LOAD_SECONDS, MODEL_PREDICT_SECONDS, MODEL_PREDICTIONS
 
 MODEL_FILE = 'isolation_model.pkl'
+# Export NumPy du modèle (monitoring.forest), chargé par les workers web
+COMPILED_MODEL_FILE = 'isolation_model.npz'
+# Modèle en ligne par parcelle (monitoring.online), mis à jour par update_online_model
+ONLINE_MODEL_FILE = 'online_model.npz'
+# Distribution des données d'entraînement (monitoring.drift), écrite avec le modèle
+DRIFT_REFERENCE_FILE = 'drift_reference.npz'
+
+# Modèles qui prennent directement des tableaux NumPy (pas de DataFrame)
+NUMPY_MODELS = (CompiledForest, PlotModel)
 
-def load_model():
-    if os.path.exists(MODEL_FILE):
-        with open(MODEL_FILE,'rb') as f:
+def load_model(path=MODEL_FILE):
+    if os.path.exists(path):
+        with MODEL_LOAD_SECONDS.time(), open(path,'rb') as f:
             return pickle.load(f)
     return None
 
-def train_model(sensor_data):
+def load_compiled_model(path=COMPILED_MODEL_FILE):
+    if os.path.exists(path):
+        with MODEL_LOAD_SECONDS.time():
+            return CompiledForest.load(path)
+    return None
+
+def export_model(model, path=COMPILED_MODEL_FILE):
+    compiled = compile_forest(model)
+    compiled.save(path)
+    return compiled
+
+def model_version(path=MODEL_FILE):
+    """Short content hash of a saved model, stored on the anomalies it produced"""
+    with open(path,'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def train_model(sensor_data, counter=None):
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
     df = pd.DataFrame(sensor_data, columns=['moisture','temp','hum'])
     model = IsolationForest(contamination=0.05, random_state=42)
     model.fit(df)
-    with open(MODEL_FILE,'wb') as f:
+    with atomic_write(MODEL_FILE, suffix='.pkl') as f:
         pickle.dump(model,f)
+    export_model(model)
+    DriftReference.from_sample(df.to_numpy(), counter).save(DRIFT_REFERENCE_FILE)
     return model
 
 def detect_anomalies(sensor_data, model=None):
     if model is None:
-        model = load_model()
+        model = load_compiled_model() or load_model()
     if model is None:
         raise ValueError("No model available")
-    df = pd.DataFrame(sensor_data, columns=['moisture','temp','hum'])
-    predictions = model.predict(df)
+    if isinstance(model, NUMPY_MODELS):
+        with MODEL_PREDICT_SECONDS.time():
+            predictions = model.predict(sensor_data)
+    else:
+        import pandas as pd
+        df = pd.DataFrame(sensor_data, columns=['moisture','temp','hum'])
+        with MODEL_PREDICT_SECONDS.time():
+            predictions = model.predict(df)
+    anomalies = int((predictions == -1).sum())
+    MODEL_PREDICTIONS.labels('anomaly').inc(anomalies)
+    MODEL_PREDICTIONS.labels('normal').inc(len(predictions) - anomalies)
     return predictions  # 1=normal, -1=anomaly
+
+def anomaly_scores(sensor_data, model):
+    """Decision function of the model, negative for anomalies (predict() == -1)"""
+    if not isinstance(model, NUMPY_MODELS):
+        import pandas as pd
+        sensor_data = pd.DataFrame(sensor_data, columns=['moisture','temp','hum'])
+    with MODEL_PREDICT_SECONDS.time():
+        scores = model.decision_function(sensor_data)
+    anomalies = int((scores < 0).sum())
+    MODEL_PREDICTIONS.labels('anomaly').inc(anomalies)
+    MODEL_PREDICTIONS.labels('normal').inc(len(scores) - anomalies)
+    return scores
+
+
+# --- Historique : entrées alignées par monitoring.features ---
+
+def training_sample(plot_ids, start, end, max_rows=100_000, builder=None, seed=42, counter=None):
+    """
+    Uniform sample of aligned history rows (reservoir), whatever the range
+    length. Every row is also counted by counter (drift reference) if given.
+    """
+    builder = builder or FeatureBuilder()
+    rng = np.random.default_rng(seed)
+    sample = np.empty((0, len(builder.sensors)))
+    seen = 0
+    for batch in builder.iter_batches(plot_ids, start, end):
+        rows = batch.values
+        if counter is not None:
+            counter.add(batch.plot_ids, rows)
+        take = min(max_rows - len(sample), len(rows))
+        if take:
+            sample = np.concatenate([sample, rows[:take]])
+        rest = rows[take:]
+        if len(rest):
+            # Ligne n du flux : remplace un élément avec une probabilité max_rows / n
+            slots = (rng.random(len(rest)) * (seen + take + np.arange(1, len(rest) + 1))).astype(np.int64)
+            kept = slots < max_rows
+            sample[slots[kept]] = rest[kept]
+        seen += len(rows)
+    return sample
+
+def train_from_history(plot_ids, start, end, max_rows=100_000, builder=None):
+    counter = ReferenceCounter()
+    sample = training_sample(plot_ids, start, end, max_rows, builder, counter=counter)
+    if not len(sample):
+        raise ValueError("No aligned readings in this range")
+    return train_model(sample, counter)
+
+def score_history(plot_ids, start, end, model=None, builder=None):
+    """Yield (FeatureBatch, predictions) over historical readings, one window at a time"""
+    builder = builder or FeatureBuilder()
+    model = model or load_model()
+    if model is None:
+        raise ValueError("No model available")
+    for batch in builder.iter_batches(plot_ids, start, end):
+        yield batch, detect_anomalies(batch.values, model=model)
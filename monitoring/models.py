@@ -1,8 +1,35 @@
+import uuid
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 
+
+class OwnedQuerySet(models.QuerySet):
+    """
+    Rows a user may see, filtered in SQL through the model's OWNER_FIELD
+    lookup (joins up to the owning user) instead of per-row checks
+    """
+
+    def owned_by(self, user):
+        if not user or not user.is_authenticated:
+            return self.none()
+        if getattr(user, 'role', None) == 'admin':
+            return self
+        return self.filter(**{self.model.OWNER_FIELD: user.pk})
+
+
+class PlotQuerySet(OwnedQuerySet):
+
+    def with_planting_date(self):
+        """Planting date of the linked FieldPlot, for growth-stage thresholds (None when unlinked)"""
+        return self.annotate(planting_date=models.F('field_plot__planting_date'))
+
+
 class FarmProfile(models.Model):
+    OWNER_FIELD = 'owner'
+    objects = OwnedQuerySet.as_manager()
+
     FARM_TYPES = [
         ('organic', 'Organic'),
         ('conventional', 'Conventional'),
@@ -37,6 +64,9 @@ class FarmProfile(models.Model):
         return f'{self.name} - {self.location}'
 
 class FieldPlot(models.Model):
+    OWNER_FIELD = 'farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
     CROP_TYPES = [
         ('wheat', 'Wheat'),
         ('corn', 'Corn'),
@@ -55,6 +85,10 @@ class FieldPlot(models.Model):
     expected_harvest_date = models.DateField()
     location_coordinates = models.CharField(max_length=255, blank=True, null=True)
     irrigation_system = models.CharField(max_length=100, blank=True)
+    # Parcelle capteurs (Plot) dont les lectures alimentent les anomalies de celle-ci
+    sensor_plot = models.OneToOneField(
+        'Plot', on_delete=models.SET_NULL, null=True, blank=True, related_name='field_plot'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -111,6 +145,9 @@ class SensorReading(models.Model):
         return f'{self.plot.name} - {self.sensor_type}: {self.value}'
 
 class AnomalyEvent(models.Model):
+    OWNER_FIELD = 'plot__farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
     ANOMALY_TYPES = [
         ('moisture_drop', 'Soil Moisture Drop'),
         ('temperature_spike', 'Temperature Spike'),
@@ -139,6 +176,8 @@ class AnomalyEvent(models.Model):
     description = models.TextField(blank=True)
     is_resolved = models.BooleanField(default=False)
     resolved_at = models.DateTimeField(null=True, blank=True)
+    # Version du modèle qui a produit l'événement (vide : détection en direct ou saisie)
+    model_version = models.CharField(max_length=64, blank=True, default='')
     
     class Meta:
         db_table = 'anomaly_event'
@@ -147,6 +186,7 @@ class AnomalyEvent(models.Model):
             models.Index(fields=['plot', 'detected_at']),
             models.Index(fields=['severity', 'is_resolved']),
             models.Index(fields=['anomaly_type']),
+            models.Index(fields=['-detected_at']),
         ]
         verbose_name = 'Anomaly Event'
         verbose_name_plural = 'Anomaly Events'
@@ -155,6 +195,9 @@ class AnomalyEvent(models.Model):
         return f'{self.plot.name} - {self.anomaly_type} ({self.severity})'
 
 class AgentRecommendation(models.Model):
+    OWNER_FIELD = 'anomaly_event__plot__farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
     CONFIDENCE_LEVELS = [
         ('low', 'Low'),
         ('medium', 'Medium'),
@@ -186,6 +229,8 @@ class AgentRecommendation(models.Model):
     is_implemented = models.BooleanField(default=False)
     implemented_at = models.DateTimeField(null=True, blank=True)
     implementation_notes = models.TextField(blank=True)
+    # Toute modification (notes, détails, confiance) : version stamp de la liste
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'agent_recommendation'
@@ -193,6 +238,7 @@ class AgentRecommendation(models.Model):
         indexes = [
             models.Index(fields=['anomaly_event']),
             models.Index(fields=['is_implemented']),
+            models.Index(fields=['-generated_at']),
         ]
         verbose_name = 'Agent Recommendation'
         verbose_name_plural = 'Agent Recommendations'
@@ -203,6 +249,9 @@ class AgentRecommendation(models.Model):
 # Additional models for comprehensive crop monitoring
 
 class WeatherData(models.Model):
+    OWNER_FIELD = 'plot__farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
     plot = models.ForeignKey(FieldPlot, on_delete=models.CASCADE, related_name='weather_data')
     temperature = models.DecimalField(max_digits=5, decimal_places=2)
     humidity = models.DecimalField(max_digits=5, decimal_places=2)
@@ -221,6 +270,9 @@ class WeatherData(models.Model):
         verbose_name_plural = 'Weather Data'
 
 class IrrigationLog(models.Model):
+    OWNER_FIELD = 'plot__farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
     IRRIGATION_TYPES = [
         ('drip', 'Drip Irrigation'),
         ('sprinkler', 'Sprinkler System'),
@@ -246,6 +298,9 @@ class IrrigationLog(models.Model):
         verbose_name_plural = 'Irrigation Logs'
 
 class HarvestRecord(models.Model):
+    OWNER_FIELD = 'plot__farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
     plot = models.ForeignKey(FieldPlot, on_delete=models.CASCADE, related_name='harvest_records')
     harvest_date = models.DateField()
     yield_amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="Yield in kg")
@@ -264,17 +319,19 @@ class HarvestRecord(models.Model):
         verbose_name = 'Harvest Record'
         verbose_name_plural = 'Harvest Records'
 from django.db import models
-from django.contrib.auth.models import User
 
 # Keep existing Plot model if it exists, if not add:
 class Plot(models.Model):
+    OWNER_FIELD = 'user'
+    objects = PlotQuerySet.as_manager()
+
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('inactive', 'Inactive'),
         ('archived', 'Archived'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='plots')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='plots')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     location = models.CharField(max_length=255)
@@ -286,12 +343,19 @@ class Plot(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Version stamp des listes de parcelles (ETag)
+            models.Index(fields=['user', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.crop_type})"
 
 
 class SensorReading(models.Model):
+    OWNER_FIELD = 'plot__user'
+    objects = OwnedQuerySet.as_manager()
+
     SENSOR_TYPES = [
         ('temperature', 'Temperature (°C)'),
         ('humidity', 'Humidity (%)'),
@@ -316,7 +380,31 @@ class SensorReading(models.Model):
         return f"{self.plot.name} - {self.sensor_type}: {self.value}"
 
 
+class RecommendationSet(models.Model):
+    """Catalogue of recommendation lists, shared by every alert of the same kind"""
+    DIRECTIONS = [
+        ('low', 'Below Range'),
+        ('high', 'Above Range'),
+    ]
+
+    alert_type = models.CharField(max_length=50)
+    direction = models.CharField(max_length=10, choices=DIRECTIONS)
+    recommendations = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['alert_type', 'direction']
+        constraints = [
+            models.UniqueConstraint(fields=['alert_type', 'direction'], name='unique_recommendation_set'),
+        ]
+
+    def __str__(self):
+        return f"{self.alert_type} ({self.direction})"
+
 class Alert(models.Model):
+    OWNER_FIELD = 'plot__user'
+    objects = OwnedQuerySet.as_manager()
+
     SEVERITY_CHOICES = [
         ('low', 'Low'),
         ('medium', 'Medium'),
@@ -335,13 +423,18 @@ class Alert(models.Model):
     plot = models.ForeignKey(Plot, on_delete=models.CASCADE, related_name='alerts')
     alert_type = models.CharField(max_length=50, choices=ALERT_TYPES)
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, db_index=True)
-    message = models.TextField()
+    message = models.TextField(blank=True, help_text="Empty when rendered at read time from the values")
     current_value = models.FloatField()
     threshold_value = models.FloatField()
     recommendations = models.JSONField(default=list, blank=True)
+    recommendation_set = models.ForeignKey(
+        RecommendationSet, on_delete=models.PROTECT, null=True, blank=True, related_name='alerts'
+    )
     is_resolved = models.BooleanField(default=False)
     resolved_at = models.DateTimeField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Toute modification (résolution, édition) : version stamp de la liste
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-timestamp']
@@ -363,10 +456,198 @@ class AlertHistory(models.Model):
     ]
     
     alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='history')
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     notes = models.TextField(blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+
+
+
+class ThresholdProfile(models.Model):
+    """Sensor thresholds for a crop type at a given growth stage"""
+    DEFAULT_CROP = 'default'
+
+    GROWTH_STAGES = [
+        ('any', 'Any Stage'),
+        ('seedling', 'Seedling'),
+        ('vegetative', 'Vegetative'),
+        ('flowering', 'Flowering'),
+        ('maturity', 'Maturity'),
+    ]
+
+    crop_type = models.CharField(max_length=100, default=DEFAULT_CROP, help_text="Crop type, or 'default' for all crops")
+    growth_stage = models.CharField(max_length=20, choices=GROWTH_STAGES, default='any')
+    alert_type = models.CharField(max_length=50, choices=Alert.ALERT_TYPES)
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+    critical_min = models.FloatField()
+    critical_max = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['crop_type', 'growth_stage', 'alert_type']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['crop_type', 'growth_stage', 'alert_type'],
+                name='unique_threshold_profile'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.crop_type} / {self.growth_stage} - {self.alert_type}"
+
+class AnalysisJob(models.Model):
+    """Tracks a batch analysis run over all of a user's plots"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    plots_total = models.PositiveIntegerField(default=0)
+    plots_analyzed = models.PositiveIntegerField(default=0)
+    alerts_created = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Mis à jour à chaque lot de parcelles : un job sans battement est mort avec son worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Analysis job {self.id} ({self.status})"
+
+
+class SensorGateway(models.Model):
+    """Headless device posting readings for a fixed set of plots with an API key"""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='gateways')
+    name = models.CharField(max_length=100)
+    plots = models.ManyToManyField(Plot, related_name='gateways', blank=True)
+    # Clé "gw_<key_prefix>.<secret>" : seul un HMAC du secret est stocké
+    key_prefix = models.CharField(max_length=16, unique=True, editable=False)
+    key_hash = models.CharField(max_length=64, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.key_prefix})"
+
+
+class SensorWindowStats(models.Model):
+    """
+    Mergeable statistics of one sensor of a plot over one sub-bucket of a
+    rolling window (monitoring.feature_store). Power sums are additive, so
+    a new reading is one upsert and a window is the sum of its buckets.
+    Times are seconds from bucket_start.
+    """
+    OWNER_FIELD = 'plot__user'
+    objects = OwnedQuerySet.as_manager()
+
+    plot = models.ForeignKey(Plot, on_delete=models.CASCADE, related_name='window_stats')
+    sensor_type = models.CharField(max_length=50, choices=SensorReading.SENSOR_TYPES)
+    window = models.PositiveIntegerField(help_text="Rolling window length in seconds")
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    sum_value = models.FloatField(default=0)
+    sum_value_sq = models.FloatField(default=0)
+    sum_time = models.FloatField(default=0)
+    sum_time_sq = models.FloatField(default=0)
+    sum_time_value = models.FloatField(default=0)
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['plot', 'sensor_type', 'window', 'bucket_start'],
+                name='unique_window_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['window', 'bucket_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.plot_id} {self.sensor_type} {self.window}s @ {self.bucket_start}"
+
+
+class SensorHistogram(models.Model):
+    """
+    Readings of one sensor of a plot per day and value bin
+    (monitoring.drift), compared to the model's training distribution
+    """
+    OWNER_FIELD = 'plot__user'
+    objects = OwnedQuerySet.as_manager()
+
+    plot = models.ForeignKey(Plot, on_delete=models.CASCADE, related_name='histograms')
+    sensor_type = models.CharField(max_length=50, choices=SensorReading.SENSOR_TYPES)
+    day = models.DateField()
+    bin = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plot', 'sensor_type', 'day', 'bin'], name='unique_histogram_bin'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.plot_id} {self.sensor_type} {self.day} bin {self.bin}: {self.count}"
+
+
+class DailyAgronomy(models.Model):
+    """
+    Agronomic indices of a field plot for one UTC day, materialized from
+    WeatherData and IrrigationLog (monitoring.agronomy). Cumulative
+    values run from the planting date.
+    """
+    OWNER_FIELD = 'plot__farm__owner'
+    objects = OwnedQuerySet.as_manager()
+
+    plot = models.ForeignKey(FieldPlot, on_delete=models.CASCADE, related_name='agronomy')
+    day = models.DateField()
+    observations = models.PositiveIntegerField(default=0, help_text="WeatherData rows of the day")
+    temp_min = models.FloatField()
+    temp_max = models.FloatField()
+    humidity = models.FloatField(help_text="Mean relative humidity in %")
+    wind_speed = models.FloatField(help_text="Mean wind speed in m/s")
+    solar_radiation = models.FloatField(help_text="Daily solar radiation in MJ/m²")
+    rainfall = models.FloatField(help_text="Rainfall in mm")
+    irrigation = models.FloatField(default=0, help_text="Irrigation in mm over the plot area")
+    gdd = models.FloatField(help_text="Growing degree days")
+    gdd_cumulative = models.FloatField()
+    et0 = models.FloatField(help_text="FAO-56 reference evapotranspiration in mm")
+    etc = models.FloatField(help_text="Crop evapotranspiration (Kc x ET0) in mm")
+    water_balance = models.FloatField(help_text="Rainfall + irrigation - ETc in mm")
+    water_balance_cumulative = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_agronomy'
+        ordering = ['plot', '-day']
+        constraints = [
+            models.UniqueConstraint(fields=['plot', 'day'], name='unique_agronomy_day'),
+        ]
+        verbose_name = 'Daily Agronomy'
+        verbose_name_plural = 'Daily Agronomy'
+
+    def __str__(self):
+        return f"{self.plot_id} {self.day}: GDD {self.gdd:.1f}, ET0 {self.et0:.1f} mm"
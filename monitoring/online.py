@@ -0,0 +1,269 @@
+"""
+Streaming anomaly detection with Half-Space Trees
+
+Half-Space Trees (Tan, Ting & Liu, 2011) are random trees over the
+feature space, built without data: each node halves the range of a
+random feature. A plot's model is only the mass profile of its readings
+in these trees: 'latest' counts the current window and becomes the
+'reference' when the window is full. A row is scored by the reference
+mass of the deepest node it reaches that still holds size_limit rows,
+times 2 ** depth. Sparse regions get low scores.
+
+Trees are shared; every plot has its own fixed-size masses (uint16
+counts, window_size <= 65535), so memory is bounded by the number of
+plots and the model follows each plot's drift one window at a time
+without retraining. Rows are scored against the reference before they
+are learned. A plot's threshold is the contamination quantile of the
+scores of its last full window, so it is ready after two windows; until
+then decision_function returns NaN (predict: normal).
+
+State is checkpointed to a single .npz (save / load), which scoring
+workers memory-map rather than read whole. PlotModel exposes
+a plot's model with the predict / decision_function interface of the
+other models (monitoring.ml, monitoring.scoring).
+"""
+
+import struct
+import zipfile
+
+import numpy as np
+
+from monitoring.features import FEATURE_LIMITS
+from monitoring.files import atomic_write
+
+STATE = ['plot_ids', 'reference', 'latest', 'counts', 'windows', 'offsets', 'recent']
+STRUCTURE = ['split_feature', 'split_value', 'limits']
+# Tableaux (plots, ...) mappés par load(mmap=True)
+PER_PLOT = ['reference', 'latest', 'recent']
+
+
+class HalfSpaceTrees:
+    def __init__(self, n_trees=25, height=8, window_size=250, size_limit=None, contamination=0.05,
+                 limits=FEATURE_LIMITS, seed=42):
+        if not 0 < window_size <= np.iinfo(np.uint16).max:
+            raise ValueError('window_size must be between 1 and 65535')
+        self.n_trees = n_trees
+        self.height = height
+        self.window_size = window_size
+        self.size_limit = size_limit if size_limit is not None else max(1, int(0.1 * window_size))
+        self.contamination = contamination
+        self.limits = np.asarray(limits, dtype=np.float64)
+        self.split_feature, self.split_value = self.build_trees(np.random.default_rng(seed))
+        self.trees = np.arange(n_trees)
+        self.depth_weight = 2.0 ** np.arange(height + 1)
+        self._reset_state()
+
+    @property
+    def n_nodes(self):
+        return 2 ** (self.height + 1) - 1
+
+    @property
+    def n_features(self):
+        return len(self.limits)
+
+    def build_trees(self, rng):
+        """Split feature and value of every internal node, heap order (children 2i+1, 2i+2)"""
+        internal = 2 ** self.height - 1
+        features = rng.integers(0, self.n_features, (self.n_trees, internal))
+        values = np.empty((self.n_trees, internal))
+        # Espace de travail aléatoire par arbre autour de [0, 1]
+        centre = rng.random((self.n_trees, self.n_features))
+        width = 2 * np.maximum(centre, 1 - centre)
+        low = np.empty((self.n_trees, internal, self.n_features))
+        high = np.empty_like(low)
+        low[:, 0], high[:, 0] = centre - width, centre + width
+        trees = np.arange(self.n_trees)
+        for node in range(internal):
+            feature = features[:, node]
+            split = (low[trees, node, feature] + high[trees, node, feature]) / 2
+            values[:, node] = split
+            for child, side in ((2 * node + 1, high), (2 * node + 2, low)):
+                if child < internal:
+                    low[:, child], high[:, child] = low[:, node], high[:, node]
+                    side[trees, child, feature] = split
+        return features, values
+
+    def _reset_state(self):
+        self.plot_ids = np.empty(0, dtype=np.int64)
+        self.slot_of = {}
+        self.reference = np.zeros((0, self.n_trees, self.n_nodes), dtype=np.uint16)
+        self.latest = np.zeros_like(self.reference)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.windows = np.zeros(0, dtype=np.int64)
+        self.offsets = np.full(0, np.nan)
+        self.recent = np.zeros((0, self.window_size), dtype=np.float32)
+
+    def slots(self, plot_ids, create=False):
+        """State row of each plot id, -1 for unknown plots unless create"""
+        plot_ids = np.asarray(plot_ids, dtype=np.int64).reshape(-1)
+        if create:
+            new = [plot_id for plot_id in dict.fromkeys(plot_ids.tolist()) if plot_id not in self.slot_of]
+            if new:
+                self._grow(new)
+        return np.array([self.slot_of.get(plot_id, -1) for plot_id in plot_ids.tolist()], dtype=np.int64)
+
+    def _grow(self, new):
+        start = len(self.plot_ids)
+        for i, plot_id in enumerate(new):
+            self.slot_of[plot_id] = start + i
+        self.plot_ids = np.concatenate([self.plot_ids, np.asarray(new, dtype=np.int64)])
+        extra = len(new)
+        self.reference = np.concatenate([self.reference, np.zeros((extra,) + self.reference.shape[1:], np.uint16)])
+        self.latest = np.concatenate([self.latest, np.zeros((extra,) + self.latest.shape[1:], np.uint16)])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, np.int64)])
+        self.windows = np.concatenate([self.windows, np.zeros(extra, np.int64)])
+        self.offsets = np.concatenate([self.offsets, np.full(extra, np.nan)])
+        self.recent = np.concatenate([self.recent, np.zeros((extra, self.window_size), np.float32)])
+
+    def paths(self, X) -> np.ndarray:
+        """(height + 1, rows, trees) node reached at each depth"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got {X.shape[1]}')
+        low, high = self.limits[:, 0], self.limits[:, 1]
+        X = (X - low) / (high - low)
+        rows = np.arange(len(X))[:, None]
+        node = np.zeros((len(X), self.n_trees), dtype=np.int64)
+        paths = [node]
+        for _ in range(self.height):
+            right = X[rows, self.split_feature[self.trees, node]] > self.split_value[self.trees, node]
+            node = 2 * node + 1 + right
+            paths.append(node)
+        return np.stack(paths)
+
+    def _mass_scores(self, paths, slots):
+        """log2(1 + mass score) of rows against the reference of their plots"""
+        mass = self.reference[slots[None, :, None], self.trees, paths].astype(np.float64)
+        stop = mass < self.size_limit
+        stop[-1] = True
+        depth = np.argmax(stop, axis=0)
+        reached = np.take_along_axis(mass, depth[None], axis=0)[0]
+        return np.log2(1 + (reached * self.depth_weight[depth]).sum(axis=1))
+
+    def decision_function(self, X, plot_ids) -> np.ndarray:
+        """Score minus the plot's threshold: negative for anomalies, NaN for plots not ready"""
+        slots = self.slots(plot_ids)
+        paths = self.paths(X)
+        if len(slots) == 1 and paths.shape[1] > 1:
+            slots = np.repeat(slots, paths.shape[1])
+        decision = np.full(len(slots), np.nan)
+        known = slots >= 0
+        if known.any():
+            decision[known] = self._mass_scores(paths[:, known], slots[known]) - self.offsets[slots[known]]
+        return decision
+
+    def predict(self, X, plot_ids) -> np.ndarray:
+        return np.where(self.decision_function(X, plot_ids) < 0, -1, 1)
+
+    def learn(self, X, plot_ids) -> np.ndarray:
+        """
+        Score rows then add them to their plot's latest window, rows of a
+        plot in arrival order. Returns the decision values (NaN until ready).
+        """
+        slots = self.slots(plot_ids, create=True)
+        paths = self.paths(X)
+        if len(slots) == 1 and paths.shape[1] > 1:
+            slots = np.repeat(slots, paths.shape[1])
+        decision = np.full(len(slots), np.nan)
+        order = np.argsort(slots, kind='stable')
+        bounds = np.flatnonzero(np.diff(slots[order])) + 1
+        for rows in np.split(order, bounds):
+            slot = int(slots[rows[0]])
+            while len(rows):
+                # Jusqu'à la fin de la fenêtre courante de la parcelle
+                segment, rows = rows[:self.window_size - self.counts[slot]], rows[self.window_size - self.counts[slot]:]
+                scores = self._mass_scores(paths[:, segment], np.full(len(segment), slot))
+                decision[segment] = scores - self.offsets[slot]
+                count = self.counts[slot]
+                self.recent[slot, count:count + len(segment)] = scores
+                np.add.at(self.latest[slot], (self.trees, paths[:, segment]), 1)
+                self.counts[slot] += len(segment)
+                if self.counts[slot] == self.window_size:
+                    self._next_window(slot)
+        return decision
+
+    def _next_window(self, slot):
+        # Les scores de cette fenêtre ont été calculés contre une référence complète
+        if self.windows[slot] >= 1:
+            self.offsets[slot] = np.quantile(self.recent[slot], self.contamination)
+        self.reference[slot] = self.latest[slot]
+        self.latest[slot] = 0
+        self.counts[slot] = 0
+        self.windows[slot] += 1
+
+    def plot(self, plot_id):
+        return PlotModel(self, plot_id)
+
+    def ready(self, plot_id):
+        slot = self.slot_of.get(int(plot_id))
+        return slot is not None and not np.isnan(self.offsets[slot])
+
+    def save(self, path, **extra):
+        """Atomic checkpoint of the trees and every plot's state"""
+        params = np.array([self.n_trees, self.height, self.window_size, self.size_limit], dtype=np.int64)
+        with atomic_write(path, suffix='.npz') as f:
+            np.savez(f, params=params, contamination=np.array([self.contamination]),
+                     **{name: getattr(self, name) for name in STRUCTURE + STATE},
+                     **{f'extra_{key}': np.asarray(value) for key, value in extra.items()})
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Model and the extra values passed to save(). With mmap the per-plot
+        masses are memory-mapped from the checkpoint instead of read: a
+        plot's pages are only read when it is scored, and shared by every
+        process mapping the file. Such a model is read-only (no learn()).
+        """
+        with np.load(path, allow_pickle=False) as data:
+            n_trees, height, window_size, size_limit = data['params'].tolist()
+            model = cls(n_trees, height, window_size, size_limit, float(data['contamination'][0]),
+                        data['limits'])
+            model.split_feature, model.split_value = data['split_feature'], data['split_value']
+            for name in STATE:
+                if mmap and name in PER_PLOT:
+                    setattr(model, name, mapped_member(path, data.zip, name))
+                else:
+                    setattr(model, name, data[name])
+            model.slot_of = {plot_id: i for i, plot_id in enumerate(model.plot_ids.tolist())}
+            extra = {key[len('extra_'):]: data[key] for key in data.files if key.startswith('extra_')}
+        return model, extra
+
+
+def mapped_member(path, archive: zipfile.ZipFile, name):
+    """Array of an uncompressed .npz member as a read-only memmap of the file"""
+    info = archive.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        with archive.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+    with open(path, 'rb') as f:
+        # En-tête local du membre : 30 octets, puis nom et champ extra
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = struct.unpack('<HH', f.read(4))
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+    if not np.prod(shape):
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape, order='F' if fortran_order else 'C', offset=offset)
+
+
+class PlotModel:
+    """One plot's detector with the interface of the batch models"""
+
+    def __init__(self, forest: HalfSpaceTrees, plot_id):
+        self.forest = forest
+        self.plot_id = int(plot_id)
+
+    def decision_function(self, X):
+        return self.forest.decision_function(X, [self.plot_id])
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def learn(self, X):
+        return self.forest.learn(X, [self.plot_id])
+
@@ -0,0 +1,208 @@
+"""
+Opt-in request profiling
+For a sample of requests, records SQL query count and time, JSON
+rendering time (ProfiledJSONRenderer, the default DRF renderer), the
+rest of the view time and the total time, returns them in a
+Server-Timing header and keeps a rolling per-endpoint window to report
+the slowest endpoints. Serializer .data runs inside the view, so its
+field computation counts as view time and its queries as db time.
+"""
+
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponseForbidden, JsonResponse
+from rest_framework.renderers import JSONRenderer
+
+from monitoring.metrics import ALLOWED_IPS
+
+ENABLED = getattr(settings, 'PROFILING_ENABLED', False)
+SAMPLE_RATE = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.1)
+# Requêtes gardées par endpoint pour le rapport
+WINDOW = getattr(settings, 'PROFILING_WINDOW', 200)
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db_time', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def view_time(self, total):
+        """Time of the request outside SQL and rendering"""
+        return max(total - self.db_time - self.render_time, 0.0)
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'view;dur={self.view_time(total) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def _record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection. The profile is found
+    through a context variable, which sync_to_async copies, so queries of
+    async views and of the async ORM are counted too.
+    """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_time += time.perf_counter() - start
+        profile.queries += 1
+
+
+def _install_query_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class ProfiledJSONRenderer(JSONRenderer):
+    """JSONRenderer adding its time to the profile of sampled requests"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            profile.render_time += time.perf_counter() - start
+
+
+class SlowEndpointReport:
+    """Rolling window of the last profiled requests of each endpoint"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, total, profile):
+        sample = (total, profile.db_time, profile.queries, profile.render_time, profile.view_time(total))
+        with self._lock:
+            self._samples[endpoint].append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def slowest(self, limit=20):
+        """Endpoints ordered by 95th percentile total time, times in ms"""
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+
+        rows = []
+        for endpoint, samples in snapshot.items():
+            totals = sorted(sample[0] for sample in samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'p50_ms': round(statistics.median(totals) * 1000, 1),
+                'p95_ms': round(totals[int(0.95 * (len(totals) - 1))] * 1000, 1),
+                'max_ms': round(totals[-1] * 1000, 1),
+                'avg_queries': round(statistics.mean(sample[2] for sample in samples), 1),
+                'avg_db_ms': round(statistics.mean(sample[1] for sample in samples) * 1000, 1),
+                'avg_render_ms': round(statistics.mean(sample[3] for sample in samples) * 1000, 1),
+                'avg_view_ms': round(statistics.mean(sample[4] for sample in samples) * 1000, 1),
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows[:limit]
+
+
+report = SlowEndpointReport()
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match and match.view_name else request.path
+    return f'{request.method} {name}'
+
+
+class ProfilingMiddleware:
+    """
+    Enabled with PROFILING_ENABLED, profiles PROFILING_SAMPLE_RATE of the
+    requests. Unsampled requests only pay for a random() call.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = SAMPLE_RATE
+        connection_created.connect(_install_query_recorder)
+        for connection in connections.all():
+            _install_query_recorder(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, profile, time.perf_counter() - start)
+
+    def _finish(self, request, response, profile, total):
+        response['Server-Timing'] = profile.server_timing(total)
+        report.add(_endpoint(request), total, profile)
+        return response
+
+
+def slow_endpoints_view(request):
+    """GET /metrics/slow-endpoints?limit=20, restricted like /metrics"""
+    if request.META.get('REMOTE_ADDR') not in ALLOWED_IPS:
+        return HttpResponseForbidden()
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        limit = 20
+    return JsonResponse({
+        'enabled': ENABLED,
+        'sample_rate': SAMPLE_RATE,
+        'endpoints': report.slowest(limit),
+    })
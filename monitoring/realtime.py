@@ -0,0 +1,120 @@
+"""
+In-process pub/sub for live updates
+Publishers (ingestion, analysis) call publish() from any thread, events are
+fanned out to the asyncio queues of the user's stream subscribers
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Backpressure: a subscriber buffers at most this many events. When a slow
+# client falls behind, the oldest events are dropped and the client receives
+# a single 'resync' event, right after the next event still queued, telling
+# it to refetch the full state once.
+QUEUE_SIZE = getattr(settings, 'REALTIME_QUEUE_SIZE', 100)
+
+
+def encode_event(event_type, data):
+    """Server-Sent Events frame, encoded once and shared by every subscriber"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event_type}\ndata: {payload}\n\n".encode()
+
+
+RESYNC_EVENT = encode_event('resync', {'reason': 'too many pending events'})
+
+
+class Subscription:
+    """Events queued for one connected client"""
+
+    def __init__(self, user_id, loop, maxsize=QUEUE_SIZE):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.lagged = False
+        self._resync_next = False
+
+    def deliver(self, frame):
+        """Enqueue a frame, runs in the subscriber's event loop"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.lagged = True
+        self.queue.put_nowait(frame)
+
+    async def next_frame(self):
+        if self._resync_next:
+            self._resync_next = False
+            return RESYNC_EVENT
+        frame = await self.queue.get()
+        if self.lagged:
+            # La trame déjà retirée est envoyée, le resync suit
+            self.lagged = False
+            self._resync_next = True
+        return frame
+
+
+def _fan_out(subscriptions, frame):
+    for subscription in subscriptions:
+        subscription.deliver(frame)
+
+
+class Broker:
+    """Tracks subscriptions per user and fans published events out to them"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, maxsize=QUEUE_SIZE):
+        """Register a subscription, must be called from the consuming event loop"""
+        subscription = Subscription(user_id, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscriptions.get(user_id, ()))
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+    def publish(self, user_id, event_type, data):
+        """Send an event to every stream of a user, never blocks the caller"""
+        with self._lock:
+            subscriptions = self._subscriptions.get(user_id)
+            if not subscriptions:
+                return 0
+            by_loop = defaultdict(list)
+            for subscription in subscriptions:
+                by_loop[subscription.loop].append(subscription)
+
+        frame = encode_event(event_type, data)
+        for loop, loop_subscriptions in by_loop.items():
+            # One callback per event loop, not per subscriber
+            try:
+                loop.call_soon_threadsafe(_fan_out, loop_subscriptions, frame)
+            except RuntimeError:
+                # Loop already closed, its subscriptions are going away
+                pass
+        return sum(len(subs) for subs in by_loop.values())
+
+
+broker = Broker()
+
+
+def publish(user_id, event_type, data):
+    return broker.publish(user_id, event_type, data)
@@ -0,0 +1,127 @@
+"""
+Historical anomaly re-scoring for the rescore_anomalies command
+
+History is cut into (plot group, time range) tasks. Each task builds the
+aligned feature vectors of its plots (monitoring.features), scores them
+with the model in one vectorized call per window and replaces the
+AnomalyEvent rows that the same model version wrote for these plots and
+this range, so a task can be re-run or resumed without duplicates.
+
+Like monitoring.seeding, worker functions import Django inside the
+functions so they can run in freshly spawned processes.
+"""
+
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Modèle chargé une fois par processus worker
+_models = {}
+
+
+def cached_model(path):
+    model = _models.get(path)
+    if model is None:
+        from monitoring.forest import compile_forest
+        from monitoring.ml import load_model
+        model = load_model(path)
+        if model is None:
+            raise ValueError(f'No model at {path}')
+        # Évaluateur NumPy, mêmes scores que le modèle sklearn
+        model = _models[path] = compile_forest(model)
+    return model
+
+
+def time_ranges(start, end, step):
+    """(low, high] ranges of at most step seconds covering (start, end]"""
+    ranges = []
+    low = start
+    while low < end:
+        ranges.append((low, min(low + step, end)))
+        low += step
+    return ranges
+
+
+def anomaly_rows(batch, scores, flagged, plots, table, model_version, stamps, model=None):
+    """
+    AnomalyEvent tuples for the flagged rows of a FeatureBatch, explained
+    by monitoring.attribution against the thresholds of each plot's crop
+    and growth stage on that day
+    """
+    from api.thresholds import growth_stage
+    from monitoring.attribution import explain, feature_thresholds
+
+    days = batch.datetimes()[flagged].astype('datetime64[D]').tolist()
+    # Une recherche par (parcelle, jour) et non par ligne
+    lookups = {}
+    keys = list(zip(batch.plot_ids[flagged].tolist(), days))
+    for plot_id, day in dict.fromkeys(keys):
+        field_plot_id, crop_type, planting_date = plots[int(plot_id)]
+        lookups[plot_id, day] = feature_thresholds(table.lookup(crop_type, growth_stage(planting_date, day)))
+    thresholds = np.stack([lookups[key] for key in keys])
+
+    explanation = explain(model, batch.values[flagged], scores[flagged], thresholds)
+    return list(zip(
+        [plots[int(plot_id)][0] for plot_id, _ in keys],
+        explanation.anomaly_type.tolist(),
+        explanation.severity.tolist(),
+        np.round(explanation.value, 3).tolist(),
+        explanation.normal_min.tolist(),
+        explanation.normal_max.tolist(),
+        np.round(explanation.confidence, 3).tolist(),
+        stamps,
+        explanation.descriptions(model_version),
+        [False] * len(explanation),
+        [model_version] * len(explanation),
+    ))
+
+
+def rescore_chunk(task):
+    """
+    Score one (plot group, time range) task and replace its anomalies.
+    task is a dict built by the rescore_anomalies command, plots maps
+    Plot ids to (field_plot_id, crop_type, planting_date).
+    """
+    from django.db import connection, transaction
+    from api.thresholds import get_threshold_table
+    from monitoring.features import FeatureBuilder
+    from monitoring.ml import anomaly_scores
+    from monitoring.models import AnomalyEvent
+    from monitoring.seeding import insert_rows, timestamp_strings
+
+    started = time.perf_counter()
+    model = cached_model(task['model_file'])
+    plots = task['plots']
+    builder = FeatureBuilder(bucket=task['bucket'], tolerance=task['tolerance'], plot_batch=len(plots))
+    table = get_threshold_table()
+    version = task['model_version']
+
+    rows, scored = [], 0
+    for batch in builder.iter_batches(plots, task['start'], task['end']):
+        scores = anomaly_scores(batch.values, model)
+        scored += batch.size
+        flagged = np.flatnonzero(scores < 0)
+        if flagged.size:
+            stamps = timestamp_strings(batch.times[flagged].astype(np.int64), connection.vendor).tolist()
+            rows.extend(anomaly_rows(batch, scores, flagged, plots, table, version, stamps, model))
+
+    low, high = (datetime.fromtimestamp(bound, tz=timezone.utc) for bound in (task['start'], task['end']))
+    with transaction.atomic():
+        _, deleted = AnomalyEvent.objects.filter(
+            plot_id__in=[field_plot_id for field_plot_id, _, _ in plots.values()],
+            model_version=version, detected_at__gt=low, detected_at__lte=high,
+        ).delete()
+        insert_rows(connection, AnomalyEvent, [
+            'plot', 'anomaly_type', 'severity', 'detected_value', 'normal_range_min', 'normal_range_max',
+            'model_confidence', 'detected_at', 'description', 'is_resolved', 'model_version'
+        ], rows, task['chunk_size'])
+
+    return {
+        'index': task['index'],
+        'plots': len(plots),
+        'scored': scored,
+        'anomalies': len(rows),
+        'replaced': deleted.get(AnomalyEvent._meta.label, 0),
+        'seconds': time.perf_counter() - started,
+    }
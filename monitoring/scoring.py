@@ -0,0 +1,123 @@
+"""
+Anomaly scoring service for web workers
+
+Nothing is loaded at import time. The model is read on first use, the
+NumPy export (monitoring.forest) when it exists, otherwise the pickled
+scikit-learn model, the only path that imports pandas and sklearn.
+Workers can load it at boot instead of on their first scoring request
+with ML_WARMUP (crop_monitoring/wsgi.py and asgi.py).
+
+When a plot id is given and the online checkpoint (monitoring.online,
+written by update_online_model) has a ready model for that plot, rows
+are scored by it instead. Model files are re-read when they change
+(check_drift retrains, update_online_model checkpoints), checked at
+most every RELOAD_INTERVAL seconds.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from monitoring import ml
+from monitoring.online import HalfSpaceTrees
+
+RELOAD_INTERVAL = 30
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringService:
+    def __init__(self, compiled_path=ml.COMPILED_MODEL_FILE, model_path=ml.MODEL_FILE,
+                 online_path=ml.ONLINE_MODEL_FILE):
+        self.compiled_path = compiled_path
+        self.model_path = model_path
+        self.online_path = online_path
+        self._model = None
+        self._model_mtime = None
+        self._model_checked = 0.0
+        self._online = None
+        self._online_mtime = None
+        self._online_checked = 0.0
+        self._lock = threading.Lock()
+
+    def model(self):
+        """Loaded model, loading it once per process and again when its files change"""
+        now = time.monotonic()
+        if self._model is not None and now - self._model_checked >= RELOAD_INTERVAL:
+            with self._lock:
+                self._model_checked = now
+                if self._model_files() != self._model_mtime:
+                    self._model = None
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model_mtime = self._model_files()
+                    self._model = ml.load_compiled_model(self.compiled_path) or ml.load_model(self.model_path)
+                    self._model_checked = now
+                model = self._model
+        if model is None:
+            raise ValueError("No model available")
+        return model
+
+    def _model_files(self):
+        return mtime(self.compiled_path), mtime(self.model_path)
+
+    def online(self):
+        """Online detector memory-mapped from the checkpoint, None when there is none"""
+        now = time.monotonic()
+        if now - self._online_checked >= RELOAD_INTERVAL:
+            with self._lock:
+                self._online_checked = now
+                stamp = mtime(self.online_path)
+                if stamp != self._online_mtime:
+                    self._online = None if stamp is None else HalfSpaceTrees.load(self.online_path, mmap=True)[0]
+                    self._online_mtime = stamp
+        return self._online
+
+    def model_for(self, plot_id=None):
+        """The plot's online model when it is ready, else the batch model"""
+        if plot_id is not None:
+            online = self.online()
+            if online is not None and online.ready(plot_id):
+                return online.plot(plot_id)
+        return self.model()
+
+    def predict(self, rows, plot_id=None):
+        """1 for normal rows, -1 for anomalies"""
+        return ml.detect_anomalies(rows, model=self.model_for(plot_id))
+
+    def score(self, rows, plot_id=None):
+        """Decision function, negative for anomalies"""
+        return ml.anomaly_scores(rows, self.model_for(plot_id))
+
+    def warm_up(self):
+        """Load the model and score one row outside the prediction metrics, False when there is no model yet"""
+        try:
+            model = self.model()
+        except ValueError:
+            logger.warning("Scoring warm-up skipped: no model at %s or %s", self.compiled_path, self.model_path)
+            return False
+        rows = [[0.0, 0.0, 0.0]]
+        if not isinstance(model, ml.NUMPY_MODELS):
+            import pandas as pd
+            rows = pd.DataFrame(rows, columns=['moisture', 'temp', 'hum'])
+        model.decision_function(rows)
+        return True
+
+    def reload(self):
+        """Drop the loaded models, the next call reads the files again"""
+        self._model = self._model_mtime = None
+        self._online = self._online_mtime = None
+        self._online_checked = 0.0
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+scoring = ScoringService()
@@ -0,0 +1,192 @@
+"""
+Synthetic data at scale for the seed_scale command
+
+Series are generated per plot with NumPy and written with raw multi-row
+inserts (COPY on PostgreSQL), one worker process per farm. Raw inserts
+also keep the generated timestamps, which bulk_create would replace with
+now() on auto_now_add fields.
+
+Worker functions only import Django inside the functions, so they can be
+unpickled in freshly spawned processes before django.setup().
+"""
+
+import csv
+import io
+import itertools
+
+import numpy as np
+
+# sensor_type, unit, mean, daily amplitude (peak mid-afternoon, negative
+# for humidity which falls when it is hot), noise, clip min, clip max
+SERIES = [
+    ('temperature', 'celsius', 24.0, 6.0, 1.0, -10, 50),
+    ('humidity', 'percentage', 60.0, -10.0, 3.0, 0, 100),
+    ('soil_moisture', 'percentage', 55.0, 4.0, 2.0, 0, 100),
+    ('ph_level', 'ph', 6.7, 0.05, 0.05, 0, 14),
+    ('light_intensity', 'lux', 600.0, 350.0, 40.0, 0, 2000),
+]
+
+DAY_SECONDS = 86400
+
+
+def chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def timestamp_strings(epoch_seconds, vendor):
+    """Database literals for UTC epoch seconds, formatted like Django stores them"""
+    strings = np.char.replace(np.datetime_as_string(epoch_seconds.astype('datetime64[s]')), 'T', ' ')
+    if vendor != 'sqlite':
+        strings = np.char.add(strings, '+00:00')
+    return strings
+
+
+def generate_series(rng, epoch_seconds, anomaly_rate, rules):
+    """
+    Values of every sensor at the given times, shape (sensors, times), and
+    the injected anomalies as (sensor index, time index, value, direction)
+    """
+    # Maximum vers 15h UTC
+    daily = np.sin(2 * np.pi * ((epoch_seconds % DAY_SECONDS) / DAY_SECONDS - 0.375))
+    values = np.empty((len(SERIES), len(epoch_seconds)))
+    for i, (_, _, mean, amplitude, noise, low, high) in enumerate(SERIES):
+        drift = np.cumsum(rng.normal(0, noise / 20, len(epoch_seconds)))
+        values[i] = mean + amplitude * daily + rng.normal(0, noise, len(epoch_seconds)) \
+            + np.clip(drift, -2 * noise, 2 * noise)
+        np.clip(values[i], low, high, out=values[i])
+
+    from monitoring.attribution import SENSOR_ANOMALIES
+
+    anomalies = []
+    count = rng.binomial(len(epoch_seconds), anomaly_rate) if anomaly_rate > 0 else 0
+    if count:
+        anomaly_sensors = [i for i, series in enumerate(SERIES) if series[0] in SENSOR_ANOMALIES]
+        sensor_index = rng.choice(anomaly_sensors, count)
+        time_index = rng.choice(len(epoch_seconds), count, replace=False)
+        high_side = rng.random(count) < 0.5
+        for sensor, when, high in zip(sensor_index.tolist(), time_index.tolist(), high_side.tolist()):
+            rule = rules[SERIES[sensor][0]]
+            span = rule['max'] - rule['min']
+            if high:
+                value = rule['critical_max'] + rng.uniform(0.01, 0.2) * span
+            else:
+                value = max(SERIES[sensor][5], rule['critical_min'] - rng.uniform(0.01, 0.2) * span)
+            values[sensor, when] = value
+            anomalies.append((sensor, when, value, 'high' if high else 'low'))
+    return values, anomalies
+
+
+def insert_rows(connection, model, columns, rows, chunk_size):
+    """Raw insert of database-ready tuples, COPY on PostgreSQL"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column_sql = ', '.join(quote(model._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            raw = cursor.cursor
+            sql = f'COPY {table} ({column_sql}) FROM STDIN WITH (FORMAT csv)'
+            for chunk in chunks(rows, chunk_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(chunk)
+                buffer.seek(0)
+                if hasattr(raw, 'copy_expert'):
+                    raw.copy_expert(sql, buffer)
+                else:
+                    with raw.copy(sql) as copy:
+                        copy.write(buffer.getvalue())
+        else:
+            sql = f'INSERT INTO {table} ({column_sql}) VALUES ({", ".join(["%s"] * len(columns))})'
+            for chunk in chunks(rows, chunk_size):
+                cursor.executemany(sql, chunk)
+
+
+def init_worker():
+    import django
+    django.setup()
+    from django.db import connections
+    connections.close_all()
+
+
+def seed_farm(task):
+    """
+    Write readings, anomalies, recommendations and alerts of one farm.
+    task is a dict built by the seed_scale command.
+    """
+    from django.db import connection, transaction
+    from api.ai_agent_engine import AlertType, DEFAULT_RULES, RecommendationGenerator
+    from monitoring.attribution import SENSOR_ANOMALIES
+    from monitoring.models import Alert, AgentRecommendation, AnomalyEvent, SensorReading
+
+    rng = np.random.default_rng(task['seed'])
+    rules = {alert_type.value: rule for alert_type, rule in DEFAULT_RULES.items()}
+    vendor = connection.vendor
+    epoch_seconds = np.arange(task['start'], task['end'], task['interval'], dtype=np.int64)
+    stamps = timestamp_strings(epoch_seconds, vendor).tolist()
+    chunk_size = task['chunk_size']
+    counts = {'readings': 0, 'anomalies': 0, 'alerts': 0}
+
+    for field_plot_id, plot_id in task['plots']:
+        values, anomalies = generate_series(rng, epoch_seconds, task['anomaly_rate'], rules)
+        readings = itertools.chain.from_iterable(
+            zip(itertools.repeat(plot_id), itertools.repeat(sensor_type), np.round(values[i], 3).tolist(),
+                itertools.repeat(unit), stamps)
+            for i, (sensor_type, unit, *_) in enumerate(SERIES)
+        )
+        with transaction.atomic():
+            insert_rows(connection, SensorReading, ['plot', 'sensor_type', 'value', 'unit', 'timestamp'],
+                        readings, chunk_size)
+            counts['readings'] += values.size
+
+            if not anomalies:
+                continue
+            first_id = AnomalyEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            anomaly_rows, alert_rows = [], []
+            for sensor, when, value, direction in anomalies:
+                sensor_type = SERIES[sensor][0]
+                rule = rules[sensor_type]
+                anomaly_type, _ = SENSOR_ANOMALIES[sensor_type]
+                threshold = rule['critical_max'] if direction == 'high' else rule['critical_min']
+                anomaly_rows.append((
+                    field_plot_id, anomaly_type, 'critical', round(value, 3), rule['min'], rule['max'],
+                    round(float(rng.uniform(0.7, 0.99)), 3), stamps[when],
+                    f'Synthetic {sensor_type} anomaly: {value:.2f}', False
+                ))
+                alert_rows.append((
+                    plot_id, sensor_type, 'critical', '', round(value, 3), threshold, '[]',
+                    task['recommendation_sets'][(sensor_type, direction)], False, stamps[when], stamps[when]
+                ))
+            insert_rows(connection, AnomalyEvent, [
+                'plot', 'anomaly_type', 'severity', 'detected_value', 'normal_range_min', 'normal_range_max',
+                'model_confidence', 'detected_at', 'description', 'is_resolved'
+            ], anomaly_rows, chunk_size)
+            insert_rows(connection, Alert, [
+                'plot', 'alert_type', 'severity', 'message', 'current_value', 'threshold_value',
+                'recommendations', 'recommendation_set', 'is_resolved', 'timestamp', 'updated_at'
+            ], alert_rows, chunk_size)
+
+            # Ce worker est seul à écrire les anomalies de cette ferme
+            anomaly_ids = AnomalyEvent.objects.filter(
+                plot_id=field_plot_id, id__gt=first_id
+            ).order_by('id').values_list('id', flat=True)
+            recommendation_rows = []
+            for anomaly_id, (sensor, when, value, direction) in zip(anomaly_ids, anomalies):
+                sensor_type = SERIES[sensor][0]
+                templates = RecommendationGenerator.RECOMMENDATION_TEMPLATES[AlertType(sensor_type)][direction]
+                recommendation_rows.append((
+                    anomaly_id, SENSOR_ANOMALIES[sensor_type][1], templates[0],
+                    f'{sensor_type} {direction} outside the critical range', 'high', '', stamps[when], False, '',
+                    stamps[when]
+                ))
+            insert_rows(connection, AgentRecommendation, [
+                'anomaly_event', 'recommended_action', 'action_details', 'explanation_text', 'confidence',
+                'estimated_duration', 'generated_at', 'is_implemented', 'implementation_notes', 'updated_at'
+            ], recommendation_rows, chunk_size)
+            counts['anomalies'] += len(anomaly_rows)
+            counts['alerts'] += len(alert_rows)
+
+    return task['farm_id'], counts
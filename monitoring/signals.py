@@ -2,8 +2,31 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import SensorReading
+from .realtime import broker, publish
+
+
+def reading_event(reading):
+    """Delta sent to live streams, same shape as sensor_data_summary entries"""
+    return {
+        "plot": reading.plot_id,
+        "sensor_type": reading.sensor_type,
+        "value": reading.value,
+        "unit": reading.unit,
+        "timestamp": reading.timestamp,
+    }
+
+
+def reading_owner(reading):
+    """Owner of the reading's plot, without a query per reading"""
+    if SensorReading.plot.is_cached(reading):
+        return reading.plot.user_id
+    # Import local : api.ingestion importe ce module
+    from api.ingestion import get_plot_info
+    return get_plot_info(reading.plot_id).user_id
+
 
 @receiver(post_save, sender=SensorReading)
 def sensor_reading_post_save(sender, instance, created, **kwargs):
-    """Signal désactivé temporairement - sera implémenté en Week 3"""
-    pass
\ No newline at end of file
+    """Pousse la nouvelle lecture vers les flux live du propriétaire de la parcelle"""
+    if created and broker.subscriber_count():
+        publish(reading_owner(instance), 'readings', [reading_event(instance)])
@@ -1,3 +1,526 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import pickle
+import tempfile
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from sklearn.ensemble import IsolationForest
+
+from api import ingestion, recommendations
+from api.gateways import issue_key
+from api.ingestion import writer
+from monitoring import drift, ml, profiling
+from monitoring.agronomy import extraterrestrial_radiation, group_cumsum, growing_degree_days, reference_et0
+from monitoring.files import atomic_write
+from monitoring.features import FEATURE_SENSORS, FeatureBuilder
+from monitoring.forecasting import MIN_POINTS, STEP, fit
+from monitoring.forest import CompiledForest, compile_forest
+from monitoring.metrics import MODEL_PREDICTIONS
+from monitoring.models import AnomalyEvent, FarmProfile, FieldPlot, Plot, SensorGateway, SensorReading, SensorWindowStats
+from monitoring.online import HalfSpaceTrees
+from monitoring.realtime import RESYNC_EVENT, Broker, broker, encode_event
+from monitoring.scoring import ScoringService, scoring
+
+
+class CompiledForestTests(SimpleTestCase):
+    """The NumPy evaluator must reproduce the sklearn IsolationForest it was compiled from"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.train = np.column_stack([rng.normal(50, 8, 2000), rng.normal(25, 4, 2000), rng.normal(60, 8, 2000)])
+        # Lignes proches des données et points aberrants
+        self.rows = np.vstack([
+            self.train[:500] + rng.normal(0, 1, (500, 3)),
+            rng.uniform([0, -10, 0], [100, 50, 100], (500, 3)),
+        ])
+
+    def assert_parity(self, model, compiled):
+        np.testing.assert_allclose(compiled.score_samples(self.rows), model.score_samples(self.rows),
+                                   rtol=0, atol=1e-12)
+        np.testing.assert_allclose(compiled.decision_function(self.rows), model.decision_function(self.rows),
+                                   rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(compiled.predict(self.rows), model.predict(self.rows))
+
+    def test_matches_sklearn(self):
+        model = IsolationForest(contamination=0.05, random_state=42).fit(self.train)
+        self.assert_parity(model, compile_forest(model))
+
+    def test_feature_subsets_and_default_contamination(self):
+        model = IsolationForest(max_features=2, max_samples=100, random_state=7).fit(self.train)
+        self.assert_parity(model, compile_forest(model))
+
+    def test_single_row(self):
+        model = IsolationForest(contamination=0.05, random_state=42).fit(self.train)
+        compiled = compile_forest(model)
+        for row in self.rows[::100]:
+            self.assertAlmostEqual(compiled.score_samples(row)[0], model.score_samples([row])[0], places=12)
+
+    def test_save_and_load(self):
+        model = IsolationForest(contamination=0.05, random_state=42).fit(self.train)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.npz')
+            compile_forest(model).save(path)
+            self.assert_parity(model, CompiledForest.load(path))
+
+    def test_attributions_point_to_the_outlying_feature(self):
+        compiled = compile_forest(IsolationForest(contamination=0.05, random_state=42).fit(self.train))
+        rows = np.repeat(self.train[:1], 3, axis=0)
+        rows[[0, 1, 2], [0, 1, 2]] = [5.0, 48.0, 99.0]
+        shares = compiled.attributions(rows)
+        np.testing.assert_allclose(shares.sum(axis=1), 1.0)
+        np.testing.assert_array_equal(shares.argmax(axis=1), [0, 1, 2])
+
+
+class OnlineCheckpointTests(SimpleTestCase):
+    """A memory-mapped checkpoint scores like the model that saved it"""
+
+    def test_mapped_checkpoint_scores_like_the_model(self):
+        rng = np.random.default_rng(0)
+        model = HalfSpaceTrees(n_trees=5, height=4, window_size=50)
+        X = rng.normal([50, 25, 60], [5, 2, 5], (300, 3))
+        plot_ids = np.repeat([1, 2, 3], 100)
+        model.learn(X, plot_ids)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'online.npz')
+            model.save(path, last_time=0)
+            mapped, _ = HalfSpaceTrees.load(path, mmap=True)
+            self.assertIsInstance(mapped.reference, np.memmap)
+            self.assertTrue(mapped.ready(2))
+            np.testing.assert_array_equal(mapped.decision_function(X[:100], [2]), model.decision_function(X[:100], [2]))
+            del mapped
+
+
+class ModelFileTests(SimpleTestCase):
+    """Model files are replaced whole, and retraining always covers every plot"""
+
+    def test_failed_write_keeps_the_previous_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.pkl')
+            with atomic_write(path) as f:
+                f.write(b'old')
+            with self.assertRaises(RuntimeError), atomic_write(path) as f:
+                f.write(b'partial')
+                raise RuntimeError
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'old')
+            self.assertEqual(os.listdir(directory), ['model.pkl'])
+
+
+class DriftMathTests(SimpleTestCase):
+    """PSI and KS over binned counts"""
+
+    def setUp(self):
+        self.expected = np.array([0, 10, 40, 30, 20, 0])
+        self.shifted = np.array([20, 30, 40, 10, 0, 0])
+
+    def test_identical_histograms(self):
+        self.assertAlmostEqual(float(drift.psi(self.expected, self.expected * 3)), 0)
+        self.assertAlmostEqual(float(drift.ks(self.expected, self.expected * 3)), 0)
+
+    def test_shifted_histograms(self):
+        self.assertGreater(float(drift.psi(self.expected, self.shifted)), drift.PSI_ALERT)
+        self.assertAlmostEqual(float(drift.ks(self.expected, self.shifted)), 0.4, places=3)
+
+    def test_rows_are_compared_independently(self):
+        values = drift.psi(np.stack([self.expected, self.expected]), np.stack([self.expected, self.shifted]))
+        self.assertAlmostEqual(float(values[0]), 0)
+        self.assertGreater(float(values[1]), drift.PSI_ALERT)
+
+
+class CheckDriftCommandTests(TestCase):
+    """check_drift retrains on every plot, and only when the inputs drifted"""
+
+    def setUp(self):
+        owner = get_user_model().objects.create_user('owner', password='x')
+        self.plot = Plot.objects.create(user=owner, name='p', location='l', crop_type='wheat', size=1)
+        self.sample = np.random.default_rng(0).normal([50, 22, 60], [3, 1, 3], size=(500, 3))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.reference = os.path.join(directory.name, 'drift_reference.npz')
+        drift.DriftReference.from_sample(self.sample).save(self.reference)
+
+    def record(self, sample):
+        """Today's histogram counts of the plot, as ingestion would store them"""
+        rows = []
+        for s, sensor in enumerate(FEATURE_SENSORS):
+            counts = np.bincount(drift.bin_index(s, sample[:, s]), minlength=drift.BINS + 2)
+            rows.extend((self.plot.id, sensor, datetime.date.today(), bin_, int(count))
+                        for bin_, count in enumerate(counts.tolist()) if count)
+        drift.upsert_counts(rows)
+
+    def check(self, *args):
+        out = io.StringIO()
+        with patch.object(ml, 'train_from_history') as train, patch.object(ml, 'model_version', return_value='v2'):
+            call_command('check_drift', '--reference', self.reference, *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue(), train
+
+    def test_stable_inputs_do_not_retrain(self):
+        self.record(self.sample)
+        out, train = self.check('--retrain')
+        self.assertIn('No retraining needed', out)
+        train.assert_not_called()
+
+    def test_drift_is_reported_and_retrains_every_plot(self):
+        self.record(self.sample - [30, 0, 0])
+        report = json.loads(self.check('--json')[0])
+        self.assertTrue(report['retrain_needed'])
+        self.assertEqual(report['overall']['soil_moisture']['status'], 'drift')
+        self.assertEqual(report['overall']['temperature']['status'], 'stable')
+
+        _, train = self.check('--retrain')
+        self.assertEqual(train.call_args.args[0], [self.plot.id])
+
+    def test_retrain_refuses_a_subset_of_plots(self):
+        with self.assertRaises(CommandError):
+            call_command('check_drift', '--retrain', '--plots', '1', '2')
+
+
+class SimulatorTrainingTests(TestCase):
+    """The simulator writes the pickle, the NumPy export and the drift reference together"""
+
+    def test_first_batch_writes_every_model_file(self):
+        owner = get_user_model().objects.create_user('owner', password='x')
+        farm = FarmProfile.objects.create(owner=owner, name='f', location='l', size=1, soil_type='loam')
+        for name in 'abcde':
+            FieldPlot.objects.create(
+                farm=farm, name=name, crop_type='wheat', crop_variety='v', size=1,
+                planting_date=datetime.date(2025, 3, 1), expected_harvest_date=datetime.date(2025, 7, 1),
+            )
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                # Seul l'entraînement est vérifié ici, pas l'écriture des lectures
+                with patch('monitoring.management.commands.run_simulator.SensorReading'):
+                    call_command('run_simulator', '--plots', '5', '--duration', '1', '--interval', '1',
+                                 stdout=io.StringIO())
+                self.assertEqual(sorted(os.listdir(directory)), sorted([
+                    ml.MODEL_FILE, ml.COMPILED_MODEL_FILE, ml.DRIFT_REFERENCE_FILE,
+                ]))
+            finally:
+                os.chdir(cwd)
+
+
+class ScoringWarmUpTests(SimpleTestCase):
+    """Warming a worker up loads the model without counting a prediction"""
+
+    def test_warm_up_is_not_counted(self):
+        model = IsolationForest(n_estimators=5, random_state=0).fit(np.random.default_rng(0).normal(size=(50, 3)))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.npz')
+            compile_forest(model).save(path)
+            service = ScoringService(compiled_path=path, model_path=os.path.join(directory, 'missing.pkl'),
+                                     online_path=os.path.join(directory, 'missing.npz'))
+            before = [MODEL_PREDICTIONS.labels(label).value for label in ('anomaly', 'normal')]
+            self.assertTrue(service.warm_up())
+            self.assertEqual([MODEL_PREDICTIONS.labels(label).value for label in ('anomaly', 'normal')], before)
+
+
+class FeatureBatchBoundsTests(SimpleTestCase):
+    """iter_batches never yields rows after end, so adjacent ranges do not overlap"""
+
+    def setUp(self):
+        times = np.arange(0, 20000, 100.0)
+        readings = np.column_stack([np.ones_like(times), times, times / 100])
+
+        def fetch(plot_ids, sensor_type, low, high):
+            return readings[(readings[:, 1] > low) & (readings[:, 1] <= high)]
+
+        self.builder = FeatureBuilder(bucket=3600, tolerance=3600)
+        patcher = patch.object(self.builder, 'fetch', side_effect=fetch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rows_stop_at_end(self):
+        self.assertEqual(self.builder.build([1], 0, 9000).times.tolist(), [3600, 7200])
+
+    def test_adjacent_ranges_do_not_overlap(self):
+        split = np.concatenate([self.builder.build([1], 0, 5400).times, self.builder.build([1], 5400, 15000).times])
+        self.assertEqual(split.tolist(), self.builder.build([1], 0, 15000).times.tolist())
+
+
+class RescoreAnomaliesTests(TestCase):
+    """Re-running rescore_anomalies over a range replaces its anomalies instead of adding to them"""
+
+    def setUp(self):
+        owner = get_user_model().objects.create_user('owner', password='x')
+        farm = FarmProfile.objects.create(owner=owner, name='f', location='l', size=1, soil_type='loam')
+        plot = Plot.objects.create(user=owner, name='p', location='l', crop_type='wheat', size=1)
+        FieldPlot.objects.create(
+            farm=farm, name='fp', crop_type='wheat', crop_variety='v', size=1, sensor_plot=plot,
+            planting_date=datetime.date(2025, 3, 1), expected_harvest_date=datetime.date(2025, 7, 1),
+        )
+        start = datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc)
+        for hour in range(24):
+            # Humidité du sol effondrée toutes les six heures
+            values = {'soil_moisture': 2 if hour % 6 == 0 else 50, 'temperature': 22, 'humidity': 60}
+            for sensor_type, value in values.items():
+                reading = SensorReading.objects.create(plot=plot, sensor_type=sensor_type, value=value, unit='u')
+                SensorReading.objects.filter(pk=reading.pk).update(timestamp=start + datetime.timedelta(hours=hour))
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.model_file = os.path.join(self.directory.name, 'model.pkl')
+        rng = np.random.default_rng(0)
+        model = IsolationForest(n_estimators=20, random_state=0).fit(
+            rng.normal([50, 22, 60], [3, 1, 3], size=(200, 3))
+        )
+        with open(self.model_file, 'wb') as f:
+            pickle.dump(model, f)
+
+    def rescore(self):
+        call_command('rescore_anomalies', '--start', '2025-06-01', '--end', '2025-06-01', '--bucket', '3600',
+                     '--model', self.model_file, '--model-version', 'v1', stdout=io.StringIO())
+        return AnomalyEvent.objects.filter(model_version='v1').count()
+
+    def test_rerun_is_idempotent(self):
+        # 6h, 12h et 18h : minuit est la borne exclue du début de la plage
+        first = self.rescore()
+        self.assertEqual(first, 3)
+        self.assertEqual(self.rescore(), first)
+        self.assertEqual(AnomalyEvent.objects.count(), first)
+
+
+class ForecastTests(SimpleTestCase):
+    """Damped-trend forecasts fitted on every plot at once"""
+
+    def test_trend_is_extrapolated_per_plot(self):
+        steps = np.arange(12)
+        series = np.vstack([60 - 2.0 * steps, np.full(12, 45.0), 30 + 1.0 * steps])
+        series[0, [3, 7]] = np.nan
+        forecast = fit([1, 2, 3], series)
+        predicted = forecast.predict(3 * STEP / 3600)
+        self.assertLess(predicted[0], forecast.last[0] - 2)
+        self.assertAlmostEqual(predicted[1], 45.0, places=3)
+        self.assertGreater(predicted[2], forecast.last[2] + 1)
+        self.assertEqual(forecast.path(3 * STEP / 3600).shape, (3, 3))
+
+    def test_short_history_has_no_forecast(self):
+        series = np.full((2, 12), np.nan)
+        series[0, -(MIN_POINTS - 1):] = 40.0
+        forecast = fit([1, 2], series)
+        self.assertTrue(np.isnan(forecast.predict(6)).all())
+        self.assertEqual(forecast.last[0], 40.0)
+        self.assertTrue(np.isnan(forecast.last[1]))
+
+
+class AgronomyTests(SimpleTestCase):
+    """Daily indices checked against the FAO-56 worked examples"""
+
+    def test_extraterrestrial_radiation(self):
+        # Exemple 8 : 20°S, 3 septembre
+        self.assertAlmostEqual(float(extraterrestrial_radiation(-20, 246)), 32.2, places=1)
+
+    def test_reference_et0(self):
+        # Exemple 18 : Bruxelles, 6 juillet, ET0 de 3,9 mm (humidité moyenne au lieu de min / max)
+        et0 = reference_et0(12.3, 21.5, 73.5, 2.078, 22.07, 50.8, 187, elevation=100)
+        self.assertAlmostEqual(float(et0), 3.9, delta=0.15)
+
+    def test_growing_degree_days_and_cumulative_sums(self):
+        gdd = growing_degree_days(np.array([5.0, 12.0, 25.0]), np.array([20.0, 35.0, 40.0]), 10.0, 30.0)
+        np.testing.assert_allclose(gdd, [5.0, 11.0, 17.5])
+        np.testing.assert_allclose(group_cumsum(gdd, np.array([0, 0, 1])), [5.0, 16.0, 17.5])
+
+
+class FieldSensorReadingsTests(TestCase):
+    """add_sensor_readings writes through the batched writer to the field plot's sensor plot"""
+
+    def setUp(self):
+        owner = get_user_model().objects.create_user('owner', password='x')
+        farm = FarmProfile.objects.create(owner=owner, name='f', location='l', size=1, soil_type='loam')
+        self.plot = Plot.objects.create(user=owner, name='p', location='l', crop_type='wheat', size=1)
+        self.field_plot = FieldPlot.objects.create(
+            farm=farm, name='fp', crop_type='wheat', crop_variety='v', size=1, sensor_plot=self.plot,
+            planting_date=datetime.date(2025, 3, 1), expected_harvest_date=datetime.date(2025, 7, 1),
+        )
+        gateway = SensorGateway.objects.create(owner=owner, name='g')
+        self.key = issue_key(gateway)
+        gateway.plots.add(self.plot)
+
+    def post(self, plot_id, moisture=40):
+        return self.client.post(
+            reverse('field-sensor-add'), {'plot_id': plot_id, 'moisture': moisture, 'temperature': 20, 'humidity': 60},
+            content_type='application/json', HTTP_X_GATEWAY_KEY=self.key,
+        )
+
+    def test_readings_go_to_the_sensor_plot(self):
+        with patch.object(writer, 'submit') as submit, patch.object(scoring, 'model_for') as model_for:
+            model_for.return_value.decision_function.return_value = np.array([0.1])
+            response = self.post(self.field_plot.pk)
+        self.assertEqual(response.status_code, 202)
+        model_for.assert_called_once_with(self.plot.pk)
+        self.assertIs(response.json()['is_anomaly'], False)
+        plot, readings = submit.call_args.args
+        self.assertEqual(plot.id, self.plot.pk)
+        self.assertEqual(readings, [('soil_moisture', 40.0, 'percentage'), ('temperature', 20.0, 'celsius'),
+                                    ('humidity', 60.0, 'percentage')])
+
+    def test_anomalies_are_explained_against_the_plot_thresholds(self):
+        with patch.object(writer, 'submit'), patch.object(scoring, 'model_for') as model_for:
+            model_for.return_value.decision_function.return_value = np.array([-0.2])
+            response = self.post(self.field_plot.pk, moisture=2)
+        self.assertIs(response.json()['is_anomaly'], True)
+        anomaly = AnomalyEvent.objects.get(plot=self.field_plot)
+        self.assertEqual((anomaly.anomaly_type, anomaly.severity), ('moisture_drop', 'critical'))
+        self.assertEqual(float(anomaly.detected_value), 2.0)
+        self.assertAlmostEqual(float(anomaly.model_confidence), 0.7)
+        self.assertEqual(anomaly.recommendation.recommended_action, 'irrigation')
+
+    def test_scoring_runs_outside_the_event_loop(self):
+        def model_for(plot_id):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            raise ValueError('no model')
+
+        with patch.object(writer, 'submit'), patch.object(scoring, 'model_for', side_effect=model_for) as mocked:
+            response = self.post(self.field_plot.pk)
+        mocked.assert_called_once()
+        self.assertIsNone(response.json()['is_anomaly'])
+
+    def test_unknown_and_unlinked_field_plots_are_refused(self):
+        with patch.object(writer, 'submit') as submit:
+            self.assertEqual(self.post(self.field_plot.pk + 1000).status_code, 403)
+            FieldPlot.objects.filter(pk=self.field_plot.pk).update(sensor_plot=None)
+            self.assertEqual(self.post(self.field_plot.pk).status_code, 403)
+        submit.assert_not_called()
+
+
+class BrokerTests(SimpleTestCase):
+    """Events reach every stream of their user only, slow streams are told to resync"""
+
+    async def test_fan_out_per_user(self):
+        local = Broker()
+        streams = [local.subscribe(1), local.subscribe(1)]
+        other = local.subscribe(2)
+        self.assertEqual(local.publish(1, 'readings', [{'value': 40}]), 2)
+        await asyncio.sleep(0)
+        frame = encode_event('readings', [{'value': 40}])
+        self.assertEqual([await stream.next_frame() for stream in streams], [frame, frame])
+        self.assertTrue(other.queue.empty())
+        for stream in streams + [other]:
+            local.unsubscribe(stream)
+        self.assertEqual(local.subscriber_count(), 0)
+
+    async def test_overflow_drops_the_oldest_and_resyncs_once(self):
+        stream = Broker().subscribe(1, maxsize=2)
+        frames = [encode_event('readings', [index]) for index in range(3)]
+        for frame in frames:
+            stream.deliver(frame)
+        received = [await stream.next_frame() for _ in range(3)]
+        self.assertEqual(received, [frames[1], RESYNC_EVENT, frames[2]])
+        self.assertEqual(stream.dropped, 1)
+
+
+class MetricsEndpointTests(TestCase):
+    """/metrics exposes what an ingestion wrote, in the Prometheus text format"""
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        samples = {}
+        for line in text.splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return text, samples
+
+    def test_ingestion_is_counted(self):
+        user = get_user_model().objects.create_user('owner', password='x')
+        plot = Plot.objects.create(user=user, name='p', location='l', crop_type='wheat', size=1)
+        recommendations.invalidate_catalogue()
+        ingestion._plot_cache.clear()
+        _, before = self.scrape()
+        ingestion.store_readings([
+            (ingestion.get_plot_info(plot.id), [('soil_moisture', 2.0, 'percentage'), ('humidity', 60.0, 'percentage')])
+        ])
+        text, after = self.scrape()
+
+        def delta(name):
+            return after[name] - before.get(name, 0)
+
+        self.assertIn('# TYPE crop_ingest_readings_total counter', text)
+        self.assertIn('# TYPE crop_db_write_seconds histogram', text)
+        self.assertEqual(delta('crop_ingest_readings_total'), 2)
+        self.assertEqual(delta('crop_db_write_seconds_count{operation="ingestion"}'), 1)
+        self.assertEqual(after['crop_db_write_seconds_bucket{operation="ingestion",le="+Inf"}'],
+                         after['crop_db_write_seconds_count{operation="ingestion"}'])
+        self.assertEqual(
+            delta('crop_alerts_created_total{source="ingestion",alert_type="soil_moisture",severity="critical"}'), 1
+        )
+
+    def test_other_addresses_are_refused(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+
+class LiveReadingOwnerTests(TestCase):
+    """Publishing a saved reading to live streams does not query its plot"""
+
+    def test_owner_comes_from_the_plot_cache(self):
+        user = get_user_model().objects.create_user('owner', password='x')
+        plot = Plot.objects.create(user=user, name='p', location='l', crop_type='wheat', size=1)
+        ingestion.get_plot_info(plot.id)
+
+        def save(subscribers):
+            with patch.object(broker, 'subscriber_count', return_value=subscribers), \
+                    patch('monitoring.signals.publish') as publish, CaptureQueriesContext(connection) as queries:
+                SensorReading.objects.create(plot_id=plot.id, sensor_type='soil_moisture', value=40, unit='percentage')
+            return publish, len(queries)
+
+        _, without_subscribers = save(0)
+        publish, with_subscribers = save(1)
+        self.assertEqual(with_subscribers, without_subscribers)
+        self.assertEqual(publish.call_args.args[0], user.id)
+
+
+class WindowStatsPruneTests(TestCase):
+    """Ingestion leaves expired buckets alone, rebuild_window_stats --prune-only deletes them"""
+
+    def test_prune_runs_from_the_command(self):
+        user = get_user_model().objects.create_user('owner', password='x')
+        plot = Plot.objects.create(user=user, name='p', location='l', crop_type='wheat', size=1)
+        SensorReading.objects.create(plot=plot, sensor_type='soil_moisture', value=40, unit='percentage')
+        SensorWindowStats.objects.update(bucket_start=timezone.now() - datetime.timedelta(days=30))
+        SensorReading.objects.create(plot=plot, sensor_type='soil_moisture', value=41, unit='percentage')
+        self.assertEqual(SensorWindowStats.objects.count(), 6)
+        call_command('rebuild_window_stats', '--prune-only', stdout=io.StringIO())
+        self.assertEqual(SensorWindowStats.objects.count(), 3)
+
+
+class ProfilingTests(TestCase):
+    """Sampled requests get db, render, view and total timings without patching DRF"""
+
+    def test_server_timing(self):
+        serializer_data = BaseSerializer.__dict__['data']
+
+        def view(request):
+            Plot.objects.count()
+            response = Response({'plots': 0})
+            response.accepted_renderer = profiling.ProfiledJSONRenderer()
+            response.accepted_media_type = 'application/json'
+            response.renderer_context = {}
+            return response.render()
+
+        with patch.object(profiling, 'ENABLED', True):
+            middleware = profiling.ProfilingMiddleware(view)
+        middleware.sample_rate = 1
+        response = middleware(RequestFactory().get('/api/plots/'))
+
+        timings = dict(part.split(';')[0:2] for part in response['Server-Timing'].split(', '))
+        self.assertEqual(list(timings), ['db', 'render', 'view', 'total'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIs(BaseSerializer.__dict__['data'], serializer_data)
@@ -2,5 +2,6 @@ from django.urls import path
 from monitoring.views import add_sensor_readings
 
 urlpatterns = [
-    path('sensors/', add_sensor_readings, name='sensor-add'),
+    # api/sensors/ est le batch endpoint de api.urls : lectures d'une FieldPlot ici
+    path('sensors/field/', add_sensor_readings, name='field-sensor-add'),
 ]
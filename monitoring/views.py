@@ -1,16 +1,42 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
-from monitoring.models import FieldPlot, SensorReading, AnomalyEvent, AgentRecommendation
-from monitoring.ml import detect_anomalies
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+import json
 
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
+from api.gateways import aauthorized_plots, aget_credentials, authenticate_caller, authorize_plots, gateway_key
+from api.ingestion import SENSOR_MAP, IngestionError, writer
+from api.thresholds import get_threshold_table, thresholds_for_plot
+from monitoring import ml
+from monitoring.attribution import SENSOR_ANOMALIES, explain, feature_thresholds
+from monitoring.features import FEATURE_SENSORS
+from monitoring.models import FieldPlot, AnomalyEvent, AgentRecommendation
+from monitoring.scoring import scoring
 
+# Champs du POST, dans l'ordre des colonnes du modèle
+FIELDS = ['moisture', 'temperature', 'humidity']
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def add_sensor_readings(request):
+
+def score_readings(plot_id, field_plot, values, table):
+    """
+    (is_anomaly, explanation) of a reading, is_anomaly is None without a
+    model. Blocking (model load, NumPy), run in a worker thread.
+    """
+    # Modèle en ligne de la parcelle, sinon modèle batch
+    try:
+        model = scoring.model_for(plot_id)
+    except ValueError:
+        return None, None
+    scores = ml.anomaly_scores([values], model)
+    if scores[0] >= 0:
+        return False, None
+    return True, explain(model, [values], scores, feature_thresholds(thresholds_for_plot(field_plot, table)))
+
+
+@csrf_exempt
+@require_POST
+async def add_sensor_readings(request):
     """
     Exemple JSON POST :
     {
@@ -19,48 +45,68 @@ def add_sensor_readings(request):
         "temperature": 24.7,
         "humidity": 60.1
     }
+    plot_id est une FieldPlot : les lectures vont à sa parcelle capteurs
+    (sensor_plot) par le writer batché, le score est calculé tout de suite.
     """
 
-    data = request.data
-
     # --- 1. Vérification ---
-    if not all(key in data for key in ['plot_id', 'moisture', 'temperature', 'humidity']):
-        return Response({"error": "Missing fields"}, status=400)
-
-    plot = FieldPlot.objects.get(id=data['plot_id'])
-
-    moisture = float(data['moisture'])
-    temp = float(data['temperature'])
-    hum = float(data['humidity'])
-
-    # --- 2. Stocker lecture dans SensorReading ---
-    SensorReading.objects.create(
-        field_plot=plot,
-        value=moisture,         # tu peux changer dans ton modèle plus tard
-        timestamp=None          # Django met auto_now_add si configuré
-    )
+    try:
+        key = gateway_key(request)
+        caller = authenticate_caller(key, credentials=await aget_credentials() if key else None)
+        data = json.loads(request.body)
+        if not isinstance(data, dict) or not all(field in data for field in ['plot_id'] + FIELDS):
+            raise IngestionError('Missing fields')
+        try:
+            plot_id = int(data['plot_id'])
+            values = [float(data[field]) for field in FIELDS]
+        except (TypeError, ValueError):
+            raise IngestionError('plot_id and sensor values must be numbers')
 
-    # --- 3. Préparer données vers ML ---
-    ml_input = [[moisture, temp, hum]]   # format attendu par detect_anomalies()
+        field_plot = await FieldPlot.objects.only('sensor_plot_id', 'crop_type', 'planting_date').filter(
+            pk=plot_id).afirst()
+        if field_plot is None or field_plot.sensor_plot_id is None:
+            # FieldPlot inconnue ou sans capteurs : refusée comme une parcelle étrangère
+            authorize_plots(caller, [], unknown=[plot_id])
+        plot, = await aauthorized_plots(caller, [field_plot.sensor_plot_id])
+    except IngestionError as e:
+        return JsonResponse({'error': e.message}, status=e.status)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
-    predictions = detect_anomalies(ml_input)
+    # --- 2. Lectures confiées au writer batché ---
+    writer.submit(plot, [
+        (SENSOR_MAP[field][0], value, SENSOR_MAP[field][1]) for field, value in zip(FIELDS, values)
+    ])
 
-    is_anomaly = (predictions[0] == -1)
+    # --- 3. Score et explication hors de la boucle d'événements (chargement du modèle, NumPy) ---
+    table = await sync_to_async(get_threshold_table)()
+    is_anomaly, explanation = await sync_to_async(score_readings, thread_sensitive=False)(
+        plot.id, field_plot, values, table)
 
-    # --- 4. Enregistrer une anomalie ---
+    # --- 4. Enregistrer l'anomalie, expliquée contre les seuils de la parcelle ---
     if is_anomaly:
-        anomaly = AnomalyEvent.objects.create(
-            field_plot=plot,
-            description=f"Anomaly detected: moisture={moisture} temp={temp} hum={hum}",
+        sensor = FEATURE_SENSORS[explanation.sensor[0]]
+        anomaly = await AnomalyEvent.objects.acreate(
+            plot_id=plot_id,
+            anomaly_type=explanation.anomaly_type[0],
+            severity=explanation.severity[0],
+            detected_value=round(float(explanation.value[0]), 3),
+            normal_range_min=float(explanation.normal_min[0]),
+            normal_range_max=float(explanation.normal_max[0]),
+            model_confidence=round(float(explanation.confidence[0]), 3),
+            description=explanation.descriptions()[0],
         )
 
-        AgentRecommendation.objects.create(
-            field_plot=plot,
-            message="⚠️ Check this plot. ML model detected unusual sensor behavior.",
+        await AgentRecommendation.objects.acreate(
+            anomaly_event=anomaly,
+            recommended_action=SENSOR_ANOMALIES[sensor][1],
+            action_details=f"Increase monitoring of {sensor.replace('_', ' ')}",
+            explanation_text='Anomaly detected by the ML model on live readings',
+            confidence='high' if explanation.confidence[0] >= 0.6 else 'medium',
         )
 
     # --- 5. Réponse JSON ---
-    return Response({
-        "status": "success",
+    return JsonResponse({
+        "status": "accepted",
         "is_anomaly": is_anomaly
-    })
+    }, status=202)